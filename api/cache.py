@@ -0,0 +1,224 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from flask import current_app
+
+from database.routing import primary_reads
+
+
+class CacheBackend(ABC):
+    """Interface of the storage behind the lookup cache.
+
+    'get' returns a (found, value) pair, so that None can be cached as a value.
+    """
+
+    @abstractmethod
+    def get(self, key):
+        pass
+
+    @abstractmethod
+    def set(self, key, value):
+        pass
+
+    @abstractmethod
+    def delete_many(self, keys):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    @abstractmethod
+    def stats(self):
+        pass
+
+
+class LRUCache(CacheBackend):
+    """Thread-safe in-process cache holding at most 'max_size' entries for 'ttl' seconds each."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "size": len(self._entries),
+                "max-size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+class CacheLibBackend(CacheBackend):
+    """Adapter for a shared cachelib cache (e.g. cachelib.RedisCache) used by every worker.
+
+    Evictions and expirations happen inside the shared store and are not counted here.
+    """
+
+    def __init__(self, cache, ttl):
+        self.cache = cache
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        # Values are wrapped in a list, since cachelib returns None for a missing key
+        entry = self.cache.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        return True, entry[0]
+
+    def set(self, key, value):
+        self.cache.set(key, [value], timeout=self.ttl)
+
+    def delete_many(self, keys):
+        self.cache.delete_many(*keys)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": type(self.cache).__name__,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class LookupCache(object):
+    """Read-through cache for vessel and equipment lookups.
+
+    Configured by LOOKUP_CACHE_ENABLED, LOOKUP_CACHE_MAX_SIZE and LOOKUP_CACHE_TTL. Setting
+    LOOKUP_CACHE_BACKEND to a cachelib cache instance shares the cache between workers.
+    Misses are loaded from the primary: a lagging replica could cache a value older than the
+    last invalidation.
+    """
+
+    def init_app(self, app):
+        backend = None
+        if app.config["LOOKUP_CACHE_ENABLED"]:
+            shared_cache = app.config["LOOKUP_CACHE_BACKEND"]
+            if shared_cache is None:
+                backend = LRUCache(app.config["LOOKUP_CACHE_MAX_SIZE"], app.config["LOOKUP_CACHE_TTL"])
+            else:
+                backend = CacheLibBackend(shared_cache, app.config["LOOKUP_CACHE_TTL"])
+        app.extensions["lookup_cache"] = backend
+
+    @staticmethod
+    def _backend():
+        return current_app.extensions.get("lookup_cache", None)
+
+    def get_or_load(self, key, load):
+        """Return the cached value of 'key', calling 'load()' and caching its result on a miss."""
+        backend = self._backend()
+        if backend is None:
+            return load()
+        found, value = backend.get(key)
+        if not found:
+            with primary_reads():
+                value = load()
+            backend.set(key, value)
+        return value
+
+    def get_many_or_load(self, keys, load_many):
+        """Return {key: value} of 'keys', calling 'load_many(missing_keys)' once for all the misses.
+
+        'load_many' returns {key: value} of the keys it found; the others are cached as None.
+        """
+        backend = self._backend()
+        values = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            found, value = backend.get(key) if backend is not None else (False, None)
+            if found:
+                values[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            if backend is None:
+                loaded = load_many(missing)
+            else:
+                with primary_reads():
+                    loaded = load_many(missing)
+            for key in missing:
+                values[key] = loaded.get(key, None)
+                if backend is not None:
+                    backend.set(key, values[key])
+        return values
+
+    def invalidate(self, keys):
+        backend = self._backend()
+        keys = list(keys)
+        if backend is not None and keys:
+            backend.delete_many(keys)
+
+    def clear(self):
+        """Drop every cached lookup, e.g. after a bulk import."""
+        backend = self._backend()
+        if backend is not None:
+            backend.clear()
+
+    def stats(self):
+        backend = self._backend()
+        return backend.stats() if backend is not None else None
+
+
+def vessel_key(vessel_code):
+    return f"vessel:{vessel_code}"
+
+
+def equipment_key(equipment_code):
+    return f"equipment:{equipment_code}"
+
+
+lookup_cache = LookupCache()
@@ -0,0 +1,39 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from database.database import db
+
+from api.cache import lookup_cache
+from api.services import transfer
+
+
+data_cli = AppGroup('data', help="Export and import vessels, equipments and operation orders as CSV.")
+
+
+@data_cli.command('export')
+@click.argument('table', type=click.Choice(list(transfer.TABLES)))
+@click.option('--output', '-o', type=click.File('wb'), default='-', help="CSV file to write (default: stdout).")
+def export_table(table, output):
+    """Write a table as CSV, with a header row."""
+    for chunk in transfer.export_csv(table, current_app.config["NDJSON_BATCH_SIZE"]):
+        output.write(chunk)
+
+
+@data_cli.command('import')
+@click.argument('table', type=click.Choice(list(transfer.TABLES)))
+@click.option('--input', '-i', 'source', type=click.File('rb'), default='-',
+              help="CSV file to read (default: stdin).")
+def import_table(table, source):
+    """Insert or update the rows of a CSV file, whose header names the columns, into a table."""
+    try:
+        merged = transfer.import_csv(table, source, current_app.config["BULK_CHUNK_SIZE"])
+        db.session.commit()
+    except transfer.TransferError as err:
+        db.session.rollback()
+        raise click.ClickException(f"{err}")
+    except Exception:
+        db.session.rollback()
+        raise
+    lookup_cache.clear()
+    click.echo(f"Imported {merged} rows into '{table}'.", err=True)
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from database.database import db
+
+from api.services import partitions, versions
+
+
+partitions_cli = AppGroup('partitions', help="Maintain the monthly partitions of the operation orders.")
+
+
+@partitions_cli.command('list')
+def list_partitions():
+    """Show the partitions of operation_orders and their estimated rows."""
+    strategy = partitions.strategy()
+    if strategy is None:
+        click.echo("operation_orders is not partitioned.")
+        return
+    click.echo(f"operation_orders is partitioned by {strategy}:")
+    for partition in partitions.list_partitions():
+        click.echo(f"  {partition['name']}: {partition['bound']} (~{partition['rows']} rows)")
+
+
+@partitions_cli.command('create')
+@click.option('--ahead', type=click.IntRange(min=0), default=None,
+              help="Months to create after the current one (default: PARTITIONS_MONTHS_AHEAD).")
+def create_partitions(ahead):
+    """Create the monthly partitions of the current and upcoming months."""
+    if ahead is None:
+        ahead = current_app.config["PARTITIONS_MONTHS_AHEAD"]
+    try:
+        created = partitions.create_partitions(ahead)
+        db.session.commit()
+    except partitions.PartitionError as err:
+        db.session.rollback()
+        raise click.ClickException(f"{err}")
+    except Exception:
+        db.session.rollback()
+        raise
+    click.echo(f"Created {len(created)} partitions" + (f": {', '.join(created)}." if created else "."))
+
+
+@partitions_cli.command('detach')
+@click.option('--older-than', 'months', type=click.IntRange(min=1), default=None,
+              help="Detach the months before the last N ones (default: PARTITIONS_RETENTION_MONTHS).")
+@click.option('--archive-schema', default=None,
+              help="Schema the detached partitions are moved to (default: PARTITIONS_ARCHIVE_SCHEMA).")
+@click.option('--drop', is_flag=True, help="Drop the detached partitions instead of archiving them.")
+def detach_partitions(months, archive_schema, drop):
+    """Detach the partitions of old months, and take their orders out of the cost rollups."""
+    config = current_app.config
+    if months is None:
+        months = config["PARTITIONS_RETENTION_MONTHS"]
+    archive_schema = None if drop else archive_schema or config["PARTITIONS_ARCHIVE_SCHEMA"]
+    before = partitions.add_months(partitions.month_start(datetime.now(timezone.utc)), -months)
+    try:
+        detached = partitions.detach_partitions(before, archive_schema)
+        if detached:
+            versions.bump([versions.GLOBAL_KEY])
+        db.session.commit()
+    except partitions.PartitionError as err:
+        db.session.rollback()
+        raise click.ClickException(f"{err}")
+    except Exception:
+        db.session.rollback()
+        raise
+    destination = "dropped" if archive_schema is None else f"moved to schema '{archive_schema}'"
+    click.echo(f"Detached {len(detached)} partitions of orders created before {before:%Y-%m-%d}"
+               + (f" ({destination}): {', '.join(detached)}." if detached else "."))
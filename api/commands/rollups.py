@@ -0,0 +1,39 @@
+import click
+from flask.cli import AppGroup
+
+from database.database import db
+
+from api.services import rollups, versions
+
+
+rollups_cli = AppGroup('rollups', help="Maintain the operation order cost rollups.")
+
+
+@rollups_cli.command('rebuild')
+def rebuild_rollups():
+    """Recompute the cost rollups from the operation orders."""
+    try:
+        equipments, vessels = rollups.rebuild()
+        versions.bump([versions.GLOBAL_KEY])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    click.echo(f"Rebuilt {equipments} equipment and {vessels} vessel cost rollups.")
+
+
+@rollups_cli.command('check')
+def check_rollups():
+    """Verify that the cost rollups match the operation orders."""
+    mismatches = rollups.check()
+    for mismatch in mismatches:
+        click.echo(
+            f"{mismatch['scope']} '{mismatch['key']}': "
+            f"expected (total-cost, count) {mismatch['expected']}, found {mismatch['actual']}"
+        )
+    if mismatches:
+        raise click.ClickException(
+            f"{len(mismatches)} cost rollups do not match the operation orders. "
+            f"Run 'flask rollups rebuild' to fix them."
+        )
+    click.echo("Cost rollups match the operation orders.")
@@ -0,0 +1,193 @@
+import zlib
+from abc import ABC, abstractmethod
+
+from flask import current_app, request
+
+from api.metrics import registry
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, 'br' is not offered without it
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, 'zstd' is not offered without it
+    zstandard = None
+
+
+UNCOMPRESSED_BYTES = registry.counter(
+    "http_response_uncompressed_bytes_total", "Bytes of the compressed response bodies before compression.",
+    ("encoding",)
+)
+COMPRESSED_BYTES = registry.counter(
+    "http_response_compressed_bytes_total", "Bytes of the compressed response bodies after compression.",
+    ("encoding",)
+)
+
+
+class Compressor(ABC):
+    """Incremental compressor of one response body for a content coding."""
+
+    def __init__(self, level):
+        self.level = level
+
+    @abstractmethod
+    def compress(self, data):
+        """Return the compressed bytes available after feeding 'data'."""
+
+    @abstractmethod
+    def flush(self):
+        """Return the bytes needed for the client to decode everything fed so far; the stream stays open."""
+
+    @abstractmethod
+    def finish(self):
+        """Return the end of the compressed stream."""
+
+
+class ZlibCompressor(Compressor):
+    # zlib window bits of the gzip container; the 'deflate' coding is the zlib container
+    wbits = 16 + zlib.MAX_WBITS
+
+    def __init__(self, level):
+        super().__init__(level)
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, self.wbits)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class DeflateCompressor(ZlibCompressor):
+    wbits = zlib.MAX_WBITS
+
+
+class BrotliCompressor(Compressor):
+    def __init__(self, level):
+        super().__init__(level)
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCompressor(Compressor):
+    def __init__(self, level):
+        super().__init__(level)
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+CODINGS = {"gzip": ZlibCompressor, "deflate": DeflateCompressor, "br": BrotliCompressor, "zstd": ZstdCompressor}
+
+
+def available_codings():
+    """The content codings whose library is installed."""
+    missing = {"br": brotli is None, "zstd": zstandard is None}
+    return [coding for coding in CODINGS if not missing.get(coding, False)]
+
+
+def compress(coding, level, data):
+    """Compress a whole body."""
+    compressor = CODINGS[coding](level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def _compressible(response):
+    config = current_app.config
+    if request.method == "HEAD" or response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if response.direct_passthrough or "Content-Encoding" in response.headers:
+        return False
+    if "no-transform" in response.headers.get("Cache-Control", ""):
+        return False
+    return response.mimetype in config["COMPRESSION_MIMETYPES"]
+
+
+def _stream(body, charset, compressor, coding, flush_size):
+    # Chunks are fed as they come and flushed every 'flush_size' bytes, so the client receives
+    # the stream progressively without one flush per (possibly tiny) chunk
+    pending = 0
+    try:
+        for chunk in body:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            UNCOMPRESSED_BYTES.inc(len(chunk), encoding=coding)
+            output = compressor.compress(chunk)
+            pending += len(chunk)
+            if pending >= flush_size:
+                output += compressor.flush()
+                pending = 0
+            if output:
+                COMPRESSED_BYTES.inc(len(output), encoding=coding)
+                yield output
+        output = compressor.finish()
+        COMPRESSED_BYTES.inc(len(output), encoding=coding)
+        yield output
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+
+
+def _compress_response(response):
+    if not _compressible(response):
+        return response
+    response.vary.add("Accept-Encoding")
+    config = current_app.config
+    offered = [coding for coding in config["COMPRESSION_CODINGS"] if coding in current_app.extensions["compression"]]
+    coding = request.accept_encodings.best_match(offered)
+    if coding is None:
+        return response
+    level = config["COMPRESSION_LEVELS"][coding]
+    if response.is_streamed:
+        response.response = _stream(response.response, response.charset, CODINGS[coding](level), coding,
+                                    config["COMPRESSION_STREAM_FLUSH_SIZE"])
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < config["COMPRESSION_MIN_SIZE"]:
+            return response
+        compressed = compress(coding, level, data)
+        UNCOMPRESSED_BYTES.inc(len(data), encoding=coding)
+        COMPRESSED_BYTES.inc(len(compressed), encoding=coding)
+        response.set_data(compressed)
+    response.headers["Content-Encoding"] = coding
+    # The compressed body is another representation: its validator can only match weakly
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    """Compress the responses negotiated with Accept-Encoding, when COMPRESSION_ENABLED is set.
+
+    Bodies of the COMPRESSION_MIMETYPES of at least COMPRESSION_MIN_SIZE bytes are compressed
+    with the first of COMPRESSION_CODINGS the client accepts (with the best quality) and whose
+    library is installed, at its COMPRESSION_LEVELS level. Streamed responses are compressed
+    chunk by chunk, whatever their size.
+    """
+    unknown = set(app.config["COMPRESSION_CODINGS"]) - set(CODINGS)
+    if unknown:
+        raise ValueError(f"Unknown COMPRESSION_CODINGS {sorted(unknown)}, expected some of {sorted(CODINGS)}")
+    app.extensions["compression"] = available_codings()
+    if app.config["COMPRESSION_ENABLED"]:
+        app.after_request(_compress_response)
@@ -0,0 +1,301 @@
+import json
+import logging
+import queue
+import select
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+
+from flask import current_app
+from sqlalchemy import event, text
+
+from database.database import db
+from database.routing import RoutingSession
+
+from api.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+PUBLISHED = registry.counter("events_published_total", "Change events published to the subscribers.", ("type",))
+OVERFLOWS = registry.counter(
+    "events_subscriber_overflows_total", "Subscriptions closed because the client read slower than the events came."
+)
+
+# Types of the change events, and the event sent to a client whose Last-Event-ID is no longer in the history
+EQUIPMENT_CREATED = "equipment-created"
+EQUIPMENT_STATUS = "equipment-status"
+ORDER_CREATED = "order-created"
+RESET = "reset"
+# NOTIFY payloads must stay below 8000 bytes: the events of a transaction are sent in chunks
+NOTIFY_PAYLOAD_MAX_SIZE = 7000
+
+Event = namedtuple("Event", ("id", "vessel_code", "type", "data"))
+
+
+class Subscription(object):
+    """The events of one vessel for one client, in a buffer of at most 'buffer_size' events.
+
+    A client that lets its buffer fill up is dropped: its stream ends, and it resumes from the
+    history when it reconnects with its Last-Event-ID.
+    """
+
+    def __init__(self, broker, vessel_code, buffer_size, backlog):
+        self.broker = broker
+        self.vessel_code = vessel_code
+        self.backlog = backlog
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.overflowed = False
+
+    def push(self, change):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(change)
+        except queue.Full:
+            self.overflowed = True
+            OVERFLOWS.inc()
+
+    def get(self, timeout):
+        """Return the next event, None after 'timeout' seconds without one, or raise queue.Empty once dropped."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            if self.overflowed:
+                raise
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker(object):
+    """In-process fan-out of the change events to the subscribers of each vessel.
+
+    The last 'history_size' events are kept to replay the events a reconnecting client missed.
+    Events reach the subscribers of this process only.
+    """
+
+    def __init__(self, app):
+        self.history = deque(maxlen=app.config["EVENTS_HISTORY_SIZE"])
+        self.buffer_size = app.config["EVENTS_CLIENT_BUFFER_SIZE"]
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, vessel_code, last_event_id=None):
+        with self.lock:
+            backlog = []
+            if last_event_id is not None:
+                ids = [change.id for change in self.history]
+                if last_event_id in ids:
+                    backlog = [change for change in list(self.history)[ids.index(last_event_id) + 1:]
+                               if change.vessel_code == vessel_code]
+                else:
+                    backlog = [Event(None, vessel_code, RESET, {})]
+            subscription = Subscription(self, vessel_code, self.buffer_size, backlog)
+            self.subscribers.setdefault(vessel_code, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.vessel_code, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self.subscribers.pop(subscription.vessel_code, None)
+
+    def subscriber_count(self):
+        with self.lock:
+            return sum(len(subscribers) for subscribers in self.subscribers.values())
+
+    def dispatch(self, changes):
+        with self.lock:
+            for change in changes:
+                self.history.append(change)
+                for subscription in self.subscribers.get(change.vessel_code, ()):
+                    subscription.push(change)
+                PUBLISHED.inc(type=change.type)
+
+    def reset(self):
+        """Forget the history and end every subscription, e.g. after events may have been missed."""
+        with self.lock:
+            self.history.clear()
+            for subscribers in self.subscribers.values():
+                for subscription in subscribers:
+                    subscription.overflowed = True
+
+    def before_commit(self, session, changes):
+        pass
+
+    def after_commit(self, changes):
+        self.dispatch(changes)
+
+
+class PostgresEventBroker(EventBroker):
+    """EventBroker shared by every worker through PostgreSQL's LISTEN/NOTIFY.
+
+    The events are sent with NOTIFY in the transaction that makes the changes, so they are
+    delivered when, and only if, it commits. Each process LISTENs on EVENTS_CHANNEL from a
+    thread started by its first subscriber, on a connection of its own, and dispatches what it
+    receives, its own events included.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.channel = app.config["EVENTS_CHANNEL"]
+        self.thread = None
+        self.thread_lock = threading.Lock()
+
+    def subscribe(self, vessel_code, last_event_id=None):
+        self._start()
+        return super().subscribe(vessel_code, last_event_id)
+
+    def before_commit(self, session, changes):
+        session.execute(text(
+            "SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"
+        ), {"channel": self.channel, "payloads": list(_payloads(changes))})
+
+    def after_commit(self, changes):
+        pass
+
+    def _start(self):
+        if self.thread is not None:
+            return
+        with self.thread_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._listen, name="events-listener", daemon=True)
+                self.thread.start()
+
+    def _connect(self):
+        with self.app.app_context():
+            engine = db.engine
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        connection = engine.dialect.dbapi.connect(*cargs, **cparams)
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return connection
+
+    def _listen(self):
+        delay = 1
+        while True:
+            connection = None
+            try:
+                connection = self._connect()
+                delay = 1
+                while True:
+                    if select.select([connection], [], [], 5) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self.dispatch([Event(*change) for change in json.loads(connection.notifies.pop(0).payload)])
+            except Exception:
+                logger.exception("Listening to the '%s' channel failed, reconnecting in %d s", self.channel, delay)
+                # Events were missed: the clients reconnect and get a reset event
+                self.reset()
+                if connection is not None:
+                    connection.close()
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+def _payloads(changes):
+    chunk, size = [], 2
+    for change in changes:
+        encoded = json.dumps(change, separators=(",", ":"))
+        if chunk and size + len(encoded) + 1 > NOTIFY_PAYLOAD_MAX_SIZE:
+            yield f"[{','.join(chunk)}]"
+            chunk, size = [], 2
+        chunk.append(encoded)
+        size += len(encoded) + 1
+    if chunk:
+        yield f"[{','.join(chunk)}]"
+
+
+BACKENDS = {"memory": EventBroker, "postgres": PostgresEventBroker}
+
+
+class EventFeed(object):
+    """Change events of the vessels, published when the transaction that made the changes commits.
+
+    EVENTS_BACKEND picks the broker: 'memory' serves the subscribers of the process that made
+    the change, 'postgres' those of every worker through LISTEN/NOTIFY.
+    """
+
+    def init_app(self, app):
+        name = app.config["EVENTS_BACKEND"]
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown EVENTS_BACKEND '{name}', expected one of {sorted(BACKENDS)}")
+        app.extensions["events"] = BACKENDS[name](app)
+
+    @staticmethod
+    def _broker():
+        return current_app.extensions["events"]
+
+    def stage(self, vessel_code, event_type, data):
+        """Add an event to the current transaction: it is published if the transaction commits."""
+        db.session().info.setdefault("events", []).append(Event(uuid.uuid4().hex, vessel_code, event_type, data))
+
+    def stage_order(self, vessel_code, order):
+        """Stage the event of a new order, given as an operation_orders row (see ingestion.parse_order)."""
+        performed_at = order.get("performed_at", None)
+        self.stage(vessel_code, ORDER_CREATED, {
+            "id": str(order["id"]),
+            "code": order["equipment_code"],
+            "type": order["type"],
+            "cost": order["cost"],
+            "performed_at": performed_at.isoformat() if performed_at is not None else None
+        })
+
+    def stage_equipment(self, vessel_code, equipment):
+        """Stage the event of a new equipment, given as a dict with its 'code', 'name' and 'location'."""
+        self.stage(vessel_code, EQUIPMENT_CREATED, {
+            "code": equipment["code"],
+            "name": equipment["name"],
+            "location": equipment["location"],
+            "status": "active"
+        })
+
+    def stage_status(self, vessel_code, equipment_code, equipment_status):
+        self.stage(vessel_code, EQUIPMENT_STATUS, {"code": equipment_code, "status": equipment_status})
+
+    def subscribe(self, vessel_code, last_event_id=None):
+        """Return a Subscription to the events of a vessel, with the events after 'last_event_id' as its backlog."""
+        return self._broker().subscribe(vessel_code, last_event_id)
+
+
+event_feed = EventFeed()
+
+
+def _staged(session):
+    return session.info.get("events", None)
+
+
+@event.listens_for(RoutingSession, "before_commit")
+def _before_commit(session):
+    changes = _staged(session)
+    if changes:
+        session.app.extensions["events"].before_commit(session, changes)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _after_commit(session):
+    changes = session.info.pop("events", None)
+    if changes:
+        session.app.extensions["events"].after_commit(changes)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("events", None)
+
+
+@registry.collector
+def _subscriber_samples():
+    broker = current_app.extensions.get("events", None)
+    if broker is None:
+        return []
+    return [
+        ("events_subscribers", "gauge", "Clients subscribed to the change events.", [({}, broker.subscriber_count())])
+    ]
@@ -0,0 +1,253 @@
+import threading
+import time
+
+from flask import g, request, has_request_context, current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from database.database import db
+from database.pool import pool_stats
+from api.cache import lookup_cache
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+# Statements kept per request for the slow request log
+SLOW_LOG_MAX_STATEMENTS = 50
+POOL_COUNTERS = ("acquisitions", "acquire-timeouts", "acquire-wait-seconds-total")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}")
+        return lines
+
+
+class Histogram(object):
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(tuple(labels[name] for name in self.labelnames), ([0], 0))
+        return counts[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                labels = list(zip(self.labelnames, key))
+                for bound, count in zip(self.buckets, counts):
+                    bucket_labels = _format_labels(labels + [("le", _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {counts[-1]}")
+        return lines
+
+
+class Registry(object):
+    """Holds the metrics of the process and renders them in the Prometheus text format.
+
+    Collectors are functions called at render time that return (name, type, help,
+    [(labels dict, value)]) tuples, for values owned by other components (pool, cache).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect):
+        self._collectors.append(collect)
+        return collect
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, metric_type, documentation, samples in collect():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by endpoint, method and status code.", ("endpoint", "method", "status")
+)
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests.", ("endpoint", "method")
+)
+REQUEST_STATEMENTS = registry.histogram(
+    "http_request_sql_statements", "SQL statements executed per HTTP request.", ("endpoint", "method"),
+    buckets=STATEMENT_BUCKETS
+)
+REQUEST_SQL_LATENCY = registry.histogram(
+    "http_request_sql_duration_seconds", "Time spent in SQL statements per HTTP request.", ("endpoint", "method")
+)
+STATEMENTS = registry.counter("db_statements_total", "SQL statements executed by the process.")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Statements of a connection do not nest: one start time is enough, and a failed statement leaves nothing behind
+    conn.info["query_start_time"] = time.perf_counter()
+
+
+def _handle_error(exception_context):
+    if exception_context.connection is not None:
+        exception_context.connection.info.pop("query_start_time", None)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("query_start_time", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    STATEMENTS.inc()
+    if has_request_context():
+        sql = g.get("sql_stats", None)
+        if sql is not None:
+            sql["count"] += 1
+            sql["seconds"] += elapsed
+            if sql["statements"] is not None and len(sql["statements"]) < SLOW_LOG_MAX_STATEMENTS:
+                sql["statements"].append((elapsed, statement))
+
+
+event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+event.listen(Engine, "handle_error", _handle_error)
+
+
+@registry.collector
+def _pool_samples():
+    pools = {"primary": pool_stats(db.engine)}
+    replica = db.replica_engine()
+    if replica is not None:
+        pools["replica"] = pool_stats(replica)
+    names = [name for name, value in pools["primary"].items() if isinstance(value, (int, float))]
+    return [
+        (f"db_pool_{name.replace('-', '_')}", "counter" if name in POOL_COUNTERS else "gauge",
+         f"Connection pool {name.replace('-', ' ')}.",
+         [({"pool": pool}, stats[name]) for pool, stats in pools.items() if name in stats])
+        for name in names
+    ]
+
+
+@registry.collector
+def _cache_samples():
+    stats = lookup_cache.stats()
+    if stats is None:
+        return []
+    labels = {"backend": stats["backend"]}
+    return [
+        (f"lookup_cache_{name.replace('-', '_')}" + ("" if name in ("size", "max-size") else "_total"),
+         "gauge" if name in ("size", "max-size") else "counter",
+         f"Lookup cache {name.replace('-', ' ')}.", [(labels, value)])
+        for name, value in stats.items() if isinstance(value, (int, float))
+    ]
+
+
+def _endpoint():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def _start_request():
+    g.request_start_time = time.perf_counter()
+    g.sql_stats = {
+        "count": 0,
+        "seconds": 0.0,
+        "statements": [] if current_app.config["SLOW_REQUEST_LOG_MS"] is not None else None
+    }
+
+
+def _finish_request(response):
+    start = g.get("request_start_time", None)
+    sql = g.get("sql_stats", None)
+    if start is None or sql is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint, method = _endpoint(), request.method
+    REQUESTS.inc(endpoint=endpoint, method=method, status=str(response.status_code))
+    REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=method)
+    REQUEST_STATEMENTS.observe(sql["count"], endpoint=endpoint, method=method)
+    REQUEST_SQL_LATENCY.observe(sql["seconds"], endpoint=endpoint, method=method)
+
+    threshold = current_app.config["SLOW_REQUEST_LOG_MS"]
+    if threshold is not None and elapsed * 1000 >= threshold:
+        statements = "".join(f"\n  [{seconds * 1000:.1f} ms] {statement}" for seconds, statement in sql["statements"])
+        current_app.logger.warning(
+            "Slow request: %s %s took %.1f ms (%d SQL statements, %.1f ms in SQL)%s",
+            method, request.full_path, elapsed * 1000, sql["count"], sql["seconds"] * 1000, statements
+        )
+    return response
+
+
+def init_app(app):
+    """Record latency, status code and SQL usage of every request handled by the app.
+
+    Streamed responses are measured until the view returns, not until the body is sent.
+    SLOW_REQUEST_LOG_MS enables a warning log, with the SQL statements that ran, for the
+    requests slower than that many milliseconds.
+    """
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,36 @@
+from database.database import db
+
+
+class EquipmentCostRollup(db.Model):
+    __tablename__ = 'equipment_cost_rollups'
+    __table_args__ = {'extend_existing': True}
+
+    equipment_code = db.Column(db.String, db.ForeignKey('vessel_equipments.code', ondelete='CASCADE'),
+                               primary_key=True)
+    total_cost = db.Column(db.BigInteger, nullable=False, default=0)
+    orders_count = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __init__(self, equipment_code, total_cost=0, orders_count=0):
+        self.equipment_code = equipment_code
+        self.total_cost = total_cost
+        self.orders_count = orders_count
+
+    def __repr__(self):
+        return f"<EquipmentCostRollup {self.equipment_code}>"
+
+
+class VesselCostRollup(db.Model):
+    __tablename__ = 'vessel_cost_rollups'
+    __table_args__ = {'extend_existing': True}
+
+    vessel_code = db.Column(db.String, db.ForeignKey('vessels.code', ondelete='CASCADE'), primary_key=True)
+    total_cost = db.Column(db.BigInteger, nullable=False, default=0)
+    orders_count = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __init__(self, vessel_code, total_cost=0, orders_count=0):
+        self.vessel_code = vessel_code
+        self.total_cost = total_cost
+        self.orders_count = orders_count
+
+    def __repr__(self):
+        return f"<VesselCostRollup {self.vessel_code}>"
@@ -1,21 +1,30 @@
 import uuid
-from sqlalchemy.dialects.postgresql import UUID
 from database.database import db
+from database.types import GUID
 
 
 class OperationOrder(db.Model):
     __tablename__ = 'operation_orders'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Orders of an equipment; covers the cost for the per-equipment aggregates
+        db.Index('ix_operation_orders_equipment_code', 'equipment_code', postgresql_include=['cost']),
+        # Time ranges of the analytics; orders are appended in created_at order, so a BRIN index stays tiny
+        db.Index('ix_operation_orders_created_at', 'created_at', postgresql_using='brin'),
+        {'extend_existing': True}
+    )
 
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
     equipment_code = db.Column(db.String, db.ForeignKey('vessel_equipments.code'))
     type = db.Column(db.String)
     cost = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+    performed_at = db.Column(db.DateTime(timezone=True))
 
-    def __init__(self, equipment_code, operation_type, operation_cost):
+    def __init__(self, equipment_code, operation_type, operation_cost, performed_at=None):
         self.equipment_code = equipment_code
         self.type = operation_type
         self.cost = operation_cost
+        self.performed_at = performed_at
 
     def __repr__(self):
         return f"<OperationOrder {self.id}>"
@@ -0,0 +1,16 @@
+from database.database import db
+
+
+class ResourceVersion(db.Model):
+    __tablename__ = 'resource_versions'
+    __table_args__ = {'extend_existing': True}
+
+    key = db.Column(db.String, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __init__(self, key, version=0):
+        self.key = key
+        self.version = version
+
+    def __repr__(self):
+        return f"<ResourceVersion {self.key}>"
@@ -1,9 +1,25 @@
+from sqlalchemy import DDL, event
+
 from database.database import db
 
 
 class VesselEquipment(db.Model):
     __tablename__ = 'vessel_equipments'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Equipments of a vessel in code order; covers the status for the status filter and updates
+        db.Index('ix_vessel_equipments_vessel_code_code', 'vessel_code', 'code', postgresql_include=['status']),
+        # Active equipments of a vessel, the most frequent listing, answered from the index alone
+        db.Index('ix_vessel_equipments_active_by_vessel', 'vessel_code', 'code',
+                 postgresql_include=['name', 'location'], postgresql_where=db.text("status = 'active'")),
+        # Total cost by equipment name
+        db.Index('ix_vessel_equipments_name', 'name', postgresql_include=['code']),
+        # Substring searches (ILIKE '%...%') on the name and location, with pg_trgm
+        db.Index('ix_vessel_equipments_name_trgm', 'name',
+                 postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_vessel_equipments_location_trgm', 'location',
+                 postgresql_using='gin', postgresql_ops={'location': 'gin_trgm_ops'}),
+        {'extend_existing': True}
+    )
 
     code = db.Column(db.String, primary_key=True)
     vessel_code = db.Column(db.String, db.ForeignKey('vessels.code'))
@@ -22,3 +38,14 @@ class VesselEquipment(db.Model):
 
     def __repr__(self):
         return f"<VesselEquipment {self.code}>"
+
+
+# Case-insensitive prefix searches (lower(column) LIKE '...%'), which trigrams serve poorly for short prefixes
+db.Index('ix_vessel_equipments_name_prefix', db.func.lower(VesselEquipment.name).label('name_lower'),
+         postgresql_ops={'name_lower': 'text_pattern_ops'})
+db.Index('ix_vessel_equipments_location_prefix', db.func.lower(VesselEquipment.location).label('location_lower'),
+         postgresql_ops={'location_lower': 'text_pattern_ops'})
+
+# The trigram operator classes come with the pg_trgm extension
+event.listen(VesselEquipment.__table__, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
@@ -0,0 +1,172 @@
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, jsonify, make_response, request
+from flask_api import status
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from database.routing import RoutingSession
+
+from api.metrics import registry, LATENCY_BUCKETS
+
+
+# SQLSTATE of a statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+
+QUEUE_TIME = registry.histogram(
+    "admission_queue_seconds", "Time requests waited for a slot of their route class.", ("route_class",),
+    buckets=LATENCY_BUCKETS
+)
+REJECTED = registry.counter(
+    "admission_rejected_total", "Requests answered 503 because their route class was saturated.",
+    ("route_class", "reason")
+)
+STATEMENT_TIMEOUTS = registry.counter(
+    "admission_statement_timeouts_total", "Requests answered 503 because a statement hit the statement timeout.",
+    ("route_class",)
+)
+
+
+class Saturated(Exception):
+    """No slot of a route class could be had: 'reason' is 'queue-full' or 'timeout'."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Limiter(object):
+    """At most 'limit' concurrent requests, and at most 'queue_size' more waiting for a slot, in arrival order."""
+
+    def __init__(self, limit, queue_size):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, timeout):
+        """Take a slot, waiting at most 'timeout' seconds. Raises Saturated when none is available."""
+        with self.condition:
+            # A free slot goes to the waiting requests first
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                return
+            if self.waiting >= self.queue_size:
+                raise Saturated("queue-full")
+            self.waiting += 1
+            try:
+                if not self.condition.wait_for(lambda: self.active < self.limit, timeout):
+                    raise Saturated("timeout")
+                self.active += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+
+def init_app(app):
+    """Create a Limiter for each route class of ADMISSION_LIMITS (limits of 0 or None disable the class)."""
+    app.extensions["admission"] = {
+        route_class: Limiter(limit, app.config["ADMISSION_QUEUE_SIZE"])
+        for route_class, limit in app.config["ADMISSION_LIMITS"].items() if limit
+    }
+
+
+def _unavailable(message):
+    return jsonify({"error": message}), status.HTTP_503_SERVICE_UNAVAILABLE, {
+        "Retry-After": str(current_app.config["ADMISSION_RETRY_AFTER"])
+    }
+
+
+def _release_after(body, release):
+    # Streamed responses keep their slot (and their connection) until the body is sent or closed
+    try:
+        yield from body
+    finally:
+        release()
+
+
+def admit(route_class, methods=None):
+    """Limit the concurrent requests of a view to the slots of its route class.
+
+    A request waits up to ADMISSION_QUEUE_TIMEOUT_MS for a slot, behind at most
+    ADMISSION_QUEUE_SIZE others, and gets a 503 with Retry-After otherwise. On PostgreSQL the
+    statements of the request are limited to ADMISSION_STATEMENT_TIMEOUTS_MS[route_class]
+    milliseconds, and a request whose statement was cancelled also gets a 503. 'methods'
+    restricts the limit to some of the view's methods.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter = current_app.extensions["admission"].get(route_class, None)
+            if limiter is None or (methods is not None and request.method not in methods):
+                return view(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                limiter.acquire(current_app.config["ADMISSION_QUEUE_TIMEOUT_MS"] / 1000)
+            except Saturated as err:
+                REJECTED.inc(route_class=route_class, reason=err.reason)
+                return _unavailable(f"Too many {route_class} requests are running. Retry later.")
+            QUEUE_TIME.observe(time.perf_counter() - start, route_class=route_class)
+
+            released = threading.Event()
+
+            def release():
+                if not released.is_set():
+                    released.set()
+                    limiter.release()
+
+            timeout = current_app.config["ADMISSION_STATEMENT_TIMEOUTS_MS"].get(route_class, None)
+            g.statement_timeout_ms = timeout
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                release()
+                raise
+            if g.get("statement_timed_out", False):
+                release()
+                STATEMENT_TIMEOUTS.inc(route_class=route_class)
+                return _unavailable(f"The query took longer than {timeout} ms. Retry later or narrow it down.")
+            if response.is_streamed:
+                response.response = _release_after(response.response, release)
+            else:
+                release()
+            return response
+        return wrapper
+    return decorator
+
+
+@event.listens_for(RoutingSession, "after_begin")
+def _set_statement_timeout(session, transaction, connection):
+    timeout = g.get("statement_timeout_ms", None) if has_request_context() else None
+    if timeout and connection.dialect.name == 'postgresql':
+        # Local to the transaction: the connection goes back to the pool with its own timeout
+        connection.execute(text("SELECT set_config('statement_timeout', :timeout, true)"), {
+            "timeout": f"{int(timeout)}ms"
+        })
+
+
+@event.listens_for(Engine, "handle_error")
+def _record_statement_timeout(context):
+    # The views turn database errors into responses: flag the request for admit()
+    if getattr(context.original_exception, "pgcode", None) == QUERY_CANCELED and has_request_context():
+        g.statement_timed_out = True
+
+
+@registry.collector
+def _limiter_samples():
+    limiters = current_app.extensions.get("admission", {})
+    return [
+        ("admission_active_requests", "gauge", "Requests holding a slot of their route class.",
+         [({"route_class": name}, limiter.active) for name, limiter in limiters.items()]),
+        ("admission_waiting_requests", "gauge", "Requests waiting for a slot of their route class.",
+         [({"route_class": name}, limiter.waiting) for name, limiter in limiters.items()]),
+        ("admission_limit", "gauge", "Concurrent requests allowed per route class.",
+         [({"route_class": name}, limiter.limit) for name, limiter in limiters.items()]),
+    ] if limiters else []
@@ -0,0 +1,44 @@
+import hashlib
+from functools import wraps
+
+from flask import request, current_app, make_response
+
+from api.services import versions
+
+
+def _etag(version_keys):
+    validator = repr((
+        request.path,
+        sorted(request.args.items(multi=True)),
+        request.headers.get("Accept", ""),
+        versions.current(version_keys)
+    ))
+    return hashlib.sha1(validator.encode()).hexdigest()
+
+
+def conditional(version_keys):
+    """Answer conditional GETs of a view from version counters, without running the view.
+
+    'version_keys' receives the request and view arguments and returns the keys of the
+    version counters the response depends on, or None when it cannot be validated. The
+    ETag hashes the request URL and Accept header with the current counters, so it
+    changes as soon as a write bumps one of them.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            keys = version_keys(request, **kwargs)
+            if keys is None:
+                return view(*args, **kwargs)
+            etag = _etag(keys)
+            # Weak comparison: compressed responses carry the weak form of the ETag
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,42 @@
+import os
+
+from flask.helpers import get_root_path
+
+
+def swag_from(specs, methods=None):
+    """Attach a Swagger YAML file, relative to the view's module, to a view.
+
+    It sets the attributes read by flasgger.swag_from without importing flasgger or
+    wrapping the view: the file is only read when the spec is first requested, and the
+    API runs without flasgger installed when SWAGGER_ENABLED is off.
+    """
+    def decorator(function):
+        path = os.path.join(get_root_path(function.__module__), specs)
+        function.swag_type = "yml"
+        if methods is None:
+            function.swag_path = path
+        else:
+            if not hasattr(function, "swag_paths"):
+                function.swag_paths = {}
+            for method in methods:
+                function.swag_paths[method.lower()] = path
+        return function
+
+    return decorator
+
+
+def init_app(app):
+    """Serve the Swagger UI at /apidocs/ and the spec at /apispec_1.json when SWAGGER_ENABLED is set.
+
+    The spec is built from the YAML files on the first request and then kept by flasgger
+    (rebuilt on every request in debug mode).
+    """
+    if not app.config["SWAGGER_ENABLED"]:
+        return
+    from flasgger import Swagger
+
+    app.config['SWAGGER'] = {
+        'title': 'FPSO Management - API Documentation',
+        'uiversion': 3
+    }
+    Swagger(app)
@@ -0,0 +1,69 @@
+from flask import request, current_app, Response, stream_with_context
+
+from api import serialization
+
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def get_page_args(cursor_type=str):
+    """Read the 'limit' and 'after' query arguments of a paginated request.
+
+    'cursor_type' converts the 'after' cursor to the type of the keyset column.
+    Raises ValueError if 'limit' is not a positive integer or 'after' is not a valid cursor.
+    """
+    limit = request.args.get("limit", None)
+    if limit is None:
+        limit = current_app.config["PAGE_LIMIT_DEFAULT"]
+    else:
+        if not limit.isdigit() or int(limit) == 0:
+            raise ValueError("'limit' must be a positive integer")
+        limit = min(int(limit), current_app.config["PAGE_LIMIT_MAX"])
+    after = request.args.get("after", None)
+    if after is not None:
+        try:
+            after = cursor_type(after)
+        except ValueError:
+            raise ValueError(f"'{after}' is not a valid 'after' cursor")
+    return limit, after
+
+
+def keyset(query, column, after):
+    """Order a query by its keyset column and start it right after the 'after' cursor."""
+    if after is not None:
+        query = query.filter(column > after)
+    return query.order_by(column)
+
+
+def split_page(rows, limit, cursor):
+    """Split the 'limit + 1' rows fetched for a page into the page and the next cursor.
+
+    'cursor' extracts the keyset value from the last row of the page.
+    """
+    rows = list(rows)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, cursor(rows[-1])
+    return rows, None
+
+
+def wants_ndjson():
+    """Whether the client asked for a streamed NDJSON response instead of a JSON page."""
+    if request.args.get("format", None) == "ndjson":
+        return True
+    return request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def ndjson_response(query, serialize):
+    """Stream every row of a query as newline-delimited JSON.
+
+    Rows are fetched through a server-side cursor in batches of NDJSON_BATCH_SIZE, so
+    the memory used does not depend on the number of rows.
+    """
+    rows = query.execution_options(stream_results=True).yield_per(current_app.config["NDJSON_BATCH_SIZE"])
+
+    def generate():
+        for row in rows:
+            yield serialization.dumps(serialize(row)) + b"\n"
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
@@ -1,20 +1,152 @@
-from flasgger import swag_from
-from flask import request, jsonify, Blueprint
+import uuid
+from collections import namedtuple
+
+from flask import request, jsonify, Blueprint, current_app, json, Response, stream_with_context
 from flask_api import status
 
 from sqlalchemy.exc import IntegrityError, DataError
 from sqlalchemy import and_
-from sqlalchemy.orm.exc import StaleDataError
 
-from database.database import db
+from database.database import db, matches_any
+from database.pool import pool_stats
 
 from api.models.operation_orders import OperationOrder
 from api.models.vessels import Vessel
 from api.models.vessel_equipments import VesselEquipment
+from api.cache import lookup_cache, vessel_key, equipment_key
+from api.events import event_feed
+from api.metrics import registry
+from api.serialization import json_response
+from api.write_behind import order_queue, QueueFull
+from api.services import analytics, costs, ingestion, registration, search, statuses, transfer, versions
+from api.services.timestamps import parse_timestamp
+from api.routes.admission import admit
+from api.routes.conditional import conditional
+from api.routes.docs import swag_from
+from api.routes.sse import event_stream_response
+from api.routes.pagination import get_page_args, keyset, split_page, wants_ndjson, ndjson_response, NDJSON_MIMETYPE
 
 
 api = Blueprint('api', __name__)
 ERROR_RESP_JSON_FORMAT = {"error": "The request payload is not in JSON format"}
+TRUE_VALUES = ("1", "true", "yes")
+
+
+def _get_bool_arg(name):
+    return request.args.get(name, "").lower() in TRUE_VALUES
+
+
+def _get_created_range(values):
+    # Optional 'start' and 'end' of the creation dates of the orders summed by the cost routes
+    start = parse_timestamp(values["start"]) if values.get("start") else None
+    end = parse_timestamp(values["end"]) if values.get("end") else None
+    if start is not None and end is not None and start >= end:
+        raise ValueError("'start' must be before 'end'")
+    return start, end
+
+
+def _total_cost_versions(request):
+    if request.method != 'GET':
+        return None
+    if request.args.get("code", None):
+        return [versions.for_equipment(request.args["code"])]
+    if request.args.get("name", None):
+        return [versions.for_equipment_name(request.args["name"])]
+    return None
+
+
+def _get_status_targets(data):
+    # One or a list of equipment codes (set to inactive) or of {"code", "status"} objects
+    if isinstance(data, (str, dict)):
+        data = [data]
+    if not isinstance(data, list) or not data:
+        raise ValueError("Pass one or a list of equipment codes")
+    targets = {}
+    for item in data:
+        if isinstance(item, str):
+            code, equipment_status = item, "inactive"
+        elif isinstance(item, dict) and isinstance(item.get("code"), str):
+            code, equipment_status = item["code"], item.get("status", "inactive")
+        else:
+            raise ValueError("Every item must be an equipment code or an object with a 'code' and a 'status'")
+        if equipment_status not in statuses.EQUIPMENT_STATUSES:
+            raise ValueError(f"Invalid status '{equipment_status}'.")
+        targets[code] = equipment_status
+    return targets
+
+
+def _read_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield ValueError("The line is not valid JSON")
+
+
+def _load_vessel(vessel_code):
+    vessel = Vessel.query.filter(Vessel.code == vessel_code).first()
+    return _vessel_to_dict(vessel) if vessel is not None else None
+
+
+def _load_equipment(equipment_code):
+    equipment = VesselEquipment.query.filter(VesselEquipment.code == equipment_code).first()
+    if equipment is None:
+        return None
+    return {"vessel_code": equipment.vessel_code, "equipment": _equipment_to_dict(equipment)}
+
+
+def _load_equipments(codes):
+    # Load many equipments with one query, as {code: cached value} of the codes found
+    equipments = VesselEquipment.query.with_entities(*SEARCH_COLUMNS).filter(matches_any(VesselEquipment.code, codes))
+    return {equipment.code: {
+        "vessel_code": equipment.vessel_code,
+        "equipment": _equipment_to_dict(equipment)
+    } for equipment in equipments}
+
+
+# Columns selected by the list routes: they fetch plain rows instead of hydrating ORM instances
+VESSEL_COLUMNS = (Vessel.code,)
+EQUIPMENT_COLUMNS = (VesselEquipment.code, VesselEquipment.name, VesselEquipment.location, VesselEquipment.status)
+SEARCH_COLUMNS = EQUIPMENT_COLUMNS + (VesselEquipment.vessel_code,)
+ORDER_COLUMNS = (OperationOrder.id, OperationOrder.equipment_code, OperationOrder.type, OperationOrder.cost,
+                 OperationOrder.created_at, OperationOrder.performed_at)
+# Shape of the rows of ORDER_COLUMNS, for rows built by hand (tests, benchmarks)
+OrderRow = namedtuple("OrderRow", [column.key for column in ORDER_COLUMNS])
+
+
+def _vessel_to_dict(vessel):
+    return {"code": vessel.code}
+
+
+def _equipment_to_dict(equipment):
+    return {
+        "code": equipment.code,
+        "name": equipment.name,
+        "location": equipment.location,
+        "status": equipment.status
+    }
+
+
+def _found_equipment_to_dict(equipment):
+    return {**_equipment_to_dict(equipment), "vessel_code": equipment.vessel_code}
+
+
+def _isoformat(timestamp):
+    return timestamp.isoformat() if timestamp is not None else None
+
+
+def _order_to_dict(order):
+    return {
+        "id": order.id,
+        "code": order.equipment_code,
+        "type": order.type,
+        "cost": order.cost,
+        "created_at": _isoformat(order.created_at),
+        "performed_at": _isoformat(order.performed_at)
+    }
 
 
 @api.route('/ping', methods=['GET'])
@@ -23,14 +155,70 @@ def ping():
     return jsonify({"message": "PONG"}), status.HTTP_200_OK
 
 
+@api.route('/cache/stats', methods=['GET'])
+@swag_from('./routes_docs/cache/cache_stats.yml')
+def cache_stats():
+    stats = lookup_cache.stats()
+    if stats is None:
+        return jsonify({"message": "The lookup cache is disabled."}), status.HTTP_404_NOT_FOUND
+    return jsonify(stats), status.HTTP_200_OK
+
+
+@api.route('/db/pool', methods=['GET'])
+@swag_from('./routes_docs/db/db_pool.yml')
+def database_pool_stats():
+    pools = {"primary": pool_stats(db.engine)}
+    replica = db.replica_engine()
+    if replica is not None:
+        pools["replica"] = pool_stats(replica)
+    return jsonify(pools), status.HTTP_200_OK
+
+
+@api.route('/metrics', methods=['GET'])
+@swag_from('./routes_docs/metrics/metrics.yml')
+def metrics():
+    return Response(registry.render(), status=status.HTTP_200_OK, mimetype="text/plain; version=0.0.4")
+
+
+@api.route('/data/<table>.csv', methods=['GET', 'POST'])
+@swag_from('./routes_docs/data/data_get_csv.yml', methods=['GET'])
+@swag_from('./routes_docs/data/data_post_csv.yml', methods=['POST'])
+@admit("export", methods=['GET'])
+def handle_table_csv(table):
+    if table not in transfer.TABLES:
+        return jsonify({"message": f"Table '{table}' cannot be exported or imported."}), status.HTTP_404_NOT_FOUND
+    # Handle POST requests
+    # Insert or update the rows of the CSV body, read as it is received
+    if request.method == 'POST':
+        if request.mimetype != "text/csv":
+            return jsonify({"error": "The request payload must be CSV (text/csv)"}), status.HTTP_400_BAD_REQUEST
+        try:
+            merged = transfer.import_csv(table, request.stream, current_app.config["BULK_CHUNK_SIZE"])
+            db.session.commit()
+        except (transfer.TransferError, IntegrityError, DataError) as err:
+            db.session.rollback()
+            return jsonify({"error": f"{getattr(err, 'orig', None) or err}"}), status.HTTP_400_BAD_REQUEST
+        lookup_cache.clear()
+        return jsonify({"message": f"Imported {merged} rows into '{table}'.", "rows": merged}), status.HTTP_200_OK
+    # Handle GET requests
+    # Stream the whole table as CSV
+    chunks = transfer.export_csv(table, current_app.config["NDJSON_BATCH_SIZE"])
+    return Response(stream_with_context(chunks), mimetype="text/csv", headers={
+        "Content-Disposition": f"attachment; filename={table}.csv"
+    })
+
+
 @api.route('/vessels', methods=['POST', 'GET'])
 @swag_from('./routes_docs/vessels/vessels_get_no_code.yml', methods=['GET'])
 @swag_from('./routes_docs/vessels/vessels_post_no_code.yml', methods=['POST'])
+@admit("list", methods=['GET'])
 def handle_vessels():
     # Handle POST requests
     if request.method == 'POST':
         if request.is_json:
             data = request.get_json()
+            if isinstance(data, list):
+                return _register_vessels(data)
             new_vessel = Vessel(code=data['code'])
             try:
                 db.session.add(new_vessel)
@@ -40,26 +228,85 @@ def handle_vessels():
                 return jsonify({
                            "error": f"{err.orig}"
                        }), status.HTTP_400_BAD_REQUEST
+            lookup_cache.invalidate([vessel_key(new_vessel.code)])
             return jsonify({
                        "message": f"Vessel '{new_vessel.code}' has been successfully created."
                    }), status.HTTP_201_CREATED
         return ERROR_RESP_JSON_FORMAT, status.HTTP_400_BAD_REQUEST
     # Handle GET requests
+    # Return a page of vessels, or stream all of them as NDJSON
+    try:
+        limit, after = get_page_args()
+    except ValueError as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
     try:
-        vessels = Vessel.query.all()
-        results = [{"code": vessel.code} for vessel in vessels]
-        return jsonify({"count": len(results), "vessels": results}), status.HTTP_200_OK
+        vessels = keyset(Vessel.query.with_entities(*VESSEL_COLUMNS), Vessel.code, after)
+        if wants_ndjson():
+            return ndjson_response(vessels, _vessel_to_dict)
+        vessels, next_cursor = split_page(vessels.limit(limit + 1).all(), limit, lambda vessel: vessel.code)
+        results = [_vessel_to_dict(vessel) for vessel in vessels]
+        return json_response({"count": len(results), "vessels": results, "next": next_cursor}, status.HTTP_200_OK)
     except Exception as err:
         return jsonify({"error": f"{err}"}), status.HTTP_500_INTERNAL_SERVER_ERROR
 
 
+def _register_vessels(data):
+    # Create all new vessels of the payload in one transaction, reporting the codes that already existed
+    if not all(isinstance(vessel, dict) and isinstance(vessel.get("code"), str) for vessel in data):
+        return jsonify({"error": "Every vessel must be an object with a 'code'"}), status.HTTP_400_BAD_REQUEST
+    try:
+        created, existing = registration.register_vessels([vessel["code"] for vessel in data])
+        db.session.commit()
+    except IntegrityError as err:
+        db.session.rollback()
+        return jsonify({
+                   "error": f"{err.orig}"
+               }), status.HTTP_400_BAD_REQUEST
+    lookup_cache.invalidate(vessel_key(code) for code in created)
+    return jsonify({
+               "created": created,
+               "existing": existing
+           }), status.HTTP_201_CREATED if created else status.HTTP_200_OK
+
+
+def _register_equipments(vessel_code, data):
+    # Create all new equipments of the payload in one transaction, reporting the codes that already existed
+    keys = ("code", "name", "location")
+    if not all(isinstance(equipment, dict) and all(key in equipment for key in keys) for equipment in data):
+        return jsonify({
+            "error": "Every equipment must be an object with a 'code', a 'name' and a 'location'"
+        }), status.HTTP_400_BAD_REQUEST
+    try:
+        if Vessel.query.filter(Vessel.code == vessel_code).first() is None:
+            return jsonify({"message": f"Vessel '{vessel_code}' not found."}), status.HTTP_404_NOT_FOUND
+        created, existing = registration.register_equipments(vessel_code, data)
+        if created:
+            versions.bump([versions.for_vessel(vessel_code)])
+            equipments = {}
+            for equipment in data:
+                equipments.setdefault(equipment["code"], equipment)
+            for code in created:
+                event_feed.stage_equipment(vessel_code, equipments[code])
+        db.session.commit()
+    except IntegrityError as err:
+        db.session.rollback()
+        return jsonify({
+                   "error": f"{err.orig}"
+               }), status.HTTP_400_BAD_REQUEST
+    lookup_cache.invalidate(equipment_key(code) for code in created)
+    return jsonify({
+               "created": created,
+               "existing": existing
+           }), status.HTTP_201_CREATED if created else status.HTTP_200_OK
+
+
 @api.route('/vessels/<vessel_code>', methods=['GET'])
 @swag_from('./routes_docs/vessels/vessels_get_with_code.yml', methods=['GET'])
 def handle_vessels_with_code(vessel_code):
     try:
-        vessel = Vessel.query.filter(Vessel.code == vessel_code).first()
+        vessel = lookup_cache.get_or_load(vessel_key(vessel_code), lambda: _load_vessel(vessel_code))
         if vessel is not None:
-            return jsonify({"code": vessel.code}), status.HTTP_200_OK
+            return jsonify(vessel), status.HTTP_200_OK
         return jsonify({"message": f"Vessel '{vessel_code}' not found."}), status.HTTP_404_NOT_FOUND
     except Exception as err:
         return jsonify({"error": f"{err}"}), status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -68,11 +315,15 @@ def handle_vessels_with_code(vessel_code):
 @api.route('/vessels/<vessel_code>/equipments', methods=['POST', 'GET'])
 @swag_from('./routes_docs/vessels/vessels_get_equip_with_vessel_code.yml', methods=['GET'])
 @swag_from('./routes_docs/vessels/vessels_post_equip_with_vessel_code.yml', methods=['POST'])
+@admit("list", methods=['GET'])
+@conditional(lambda request, vessel_code: [versions.for_vessel(vessel_code)] if request.method == 'GET' else None)
 def handle_vessels_equipments(vessel_code):
     # Handle POST requests
     if request.method == 'POST':
         if request.is_json:
             data = request.get_json()
+            if isinstance(data, list):
+                return _register_equipments(vessel_code, data)
             new_equipment = VesselEquipment(
                 code=data['code'],
                 vessel_code=vessel_code,
@@ -81,36 +332,58 @@ def handle_vessels_equipments(vessel_code):
             )
             try:
                 db.session.add(new_equipment)
+                versions.bump([versions.for_vessel(vessel_code)])
+                event_feed.stage_equipment(vessel_code, data)
                 db.session.commit()
             except IntegrityError as err:
                 db.session.rollback()
                 return jsonify({
                            "error": f"{err.orig}"
                        }), status.HTTP_400_BAD_REQUEST
+            lookup_cache.invalidate([equipment_key(new_equipment.code)])
             return jsonify({
                        "message": f"Equipment '{new_equipment.code}' has been successfully created."
                    }), status.HTTP_201_CREATED
         else:
             return ERROR_RESP_JSON_FORMAT, status.HTTP_400_BAD_REQUEST
     # Handle GET requests
-    # Return all equipments in a vessel (filter status is optional)
+    # Return a page of the equipments in a vessel (filter status is optional), or stream all of them as NDJSON
+    try:
+        limit, after = get_page_args()
+    except ValueError as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
     equipment_status = request.args.get("status", None)
     if equipment_status:
-        equipments = VesselEquipment.query.filter(and_(
+        equipments = VesselEquipment.query.with_entities(*EQUIPMENT_COLUMNS).filter(and_(
             VesselEquipment.vessel_code == vessel_code,
             VesselEquipment.status == equipment_status
         ))
     else:
-        equipments = VesselEquipment.query.filter(
+        equipments = VesselEquipment.query.with_entities(*EQUIPMENT_COLUMNS).filter(
             VesselEquipment.vessel_code == vessel_code
         )
-    results = [{
-        "code": equipment.code,
-        "name": equipment.name,
-        "location": equipment.location,
-        "status": equipment.status
-    } for equipment in equipments]
-    return jsonify({"count": len(results), "equipments": results}), status.HTTP_200_OK
+    equipments = keyset(equipments, VesselEquipment.code, after)
+    if wants_ndjson():
+        return ndjson_response(equipments, _equipment_to_dict)
+    equipments, next_cursor = split_page(
+        equipments.limit(limit + 1).all(), limit, lambda equipment: equipment.code
+    )
+    results = [_equipment_to_dict(equipment) for equipment in equipments]
+    return json_response({"count": len(results), "equipments": results, "next": next_cursor}, status.HTTP_200_OK)
+
+
+@api.route('/vessels/<vessel_code>/events', methods=['GET'])
+@swag_from('./routes_docs/vessels/vessels_get_events.yml', methods=['GET'])
+def handle_vessel_events(vessel_code):
+    # Stream the equipment and order changes of a vessel as Server-Sent Events, from the Last-Event-ID if given
+    try:
+        vessel = lookup_cache.get_or_load(vessel_key(vessel_code), lambda: _load_vessel(vessel_code))
+    except Exception as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_500_INTERNAL_SERVER_ERROR
+    if vessel is None:
+        return jsonify({"message": f"Vessel '{vessel_code}' not found."}), status.HTTP_404_NOT_FOUND
+    subscription = event_feed.subscribe(vessel_code, request.headers.get("Last-Event-ID", None))
+    return event_stream_response(subscription)
 
 
 @api.route('/vessels/<vessel_code>/equipments/<equipment_code>', methods=['GET'])
@@ -118,17 +391,9 @@ def handle_vessels_equipments(vessel_code):
 def handle_vessel_equipment_with_code(vessel_code, equipment_code):
     # Return equipment with given equipment_code
     try:
-        equipment = VesselEquipment.query.filter(and_(
-            VesselEquipment.vessel_code == vessel_code,
-            VesselEquipment.code == equipment_code
-        )).first()
-        if equipment is not None:
-            return jsonify({
-                "code": equipment.code,
-                "name": equipment.name,
-                "location": equipment.location,
-                "status": equipment.status
-            }), status.HTTP_200_OK
+        equipment = lookup_cache.get_or_load(equipment_key(equipment_code), lambda: _load_equipment(equipment_code))
+        if equipment is not None and equipment["vessel_code"] == vessel_code:
+            return jsonify(equipment["equipment"]), status.HTTP_200_OK
         return jsonify({"message": f"Equipment '{equipment_code}' not found."}), status.HTTP_404_NOT_FOUND
     except Exception as err:
         return jsonify({"error": f"{err}"}), status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -137,39 +402,150 @@ def handle_vessel_equipment_with_code(vessel_code, equipment_code):
 @api.route('/equipments/status', methods=['PATCH'])
 @swag_from('./routes_docs/equipments/equipments_patch_status.yml', methods=['PATCH'])
 def update_equipment_status():
+    if not request.is_json:
+        return ERROR_RESP_JSON_FORMAT, status.HTTP_400_BAD_REQUEST
     data = request.get_json()
+    # Set the status of every equipment of a vessel
+    if isinstance(data, dict) and "vessel_code" in data:
+        equipment_status = data.get("status", "inactive")
+        if equipment_status not in statuses.EQUIPMENT_STATUSES:
+            return jsonify({"error": f"Invalid status '{equipment_status}'."}), status.HTTP_400_BAD_REQUEST
+        try:
+            updated = statuses.update_vessel_status(data["vessel_code"], equipment_status)
+            if updated:
+                versions.bump([versions.for_vessel(data["vessel_code"])] +
+                              [versions.for_equipment(code) for code in updated])
+            for code in updated:
+                event_feed.stage_status(data["vessel_code"], code, equipment_status)
+            db.session.commit()
+        except DataError:
+            db.session.rollback()
+            return jsonify({"error": "Invalid input value. Check values."}), status.HTTP_400_BAD_REQUEST
+        lookup_cache.invalidate(equipment_key(code) for code in updated)
+        return jsonify({"message": "Status updated!", "updated": updated}), status.HTTP_200_OK
+    # Set the status of the given equipment codes
     try:
-        db.session.bulk_update_mappings(
-            VesselEquipment,
-            data
-        )
+        targets = _get_status_targets(data)
+    except ValueError as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
+    try:
+        results, vessel_codes = statuses.update_statuses(targets, current_app.config["STATUS_UPDATE_CHUNK_SIZE"])
+        versions.bump([versions.for_equipment(code) for code in vessel_codes] +
+                      [versions.for_vessel(vessel_code) for vessel_code in vessel_codes.values()])
+        for code, vessel_code in vessel_codes.items():
+            event_feed.stage_status(vessel_code, code, targets[code])
         db.session.commit()
-        return jsonify({"message": "Status updated!"}), 200
-    except StaleDataError as err:
-        db.session.rollback()
-        print(type(err))
-        return jsonify({"error": "Invalid code were passed. Check input."}), status.HTTP_400_BAD_REQUEST
-    except DataError as err:
+    except DataError:
         db.session.rollback()
-        print(type(err))
         return jsonify({"error": "Invalid input value. Check values."}), status.HTTP_400_BAD_REQUEST
+    lookup_cache.invalidate(equipment_key(code) for code in results["updated"])
+    return jsonify({"message": "Status updated!", **results}), status.HTTP_200_OK
+
+
+@api.route('/equipments/lookup', methods=['POST'])
+@swag_from('./routes_docs/equipments/equipments_post_lookup.yml', methods=['POST'])
+def lookup_equipments():
+    # Return many equipments by code at once: the cache misses are loaded with one query
+    if not request.is_json:
+        return ERROR_RESP_JSON_FORMAT, status.HTTP_400_BAD_REQUEST
+    data = request.get_json()
+    codes = data.get("codes", None) if isinstance(data, dict) else None
+    if not isinstance(codes, list) or not codes or not all(isinstance(code, str) for code in codes):
+        return jsonify({"error": "'codes' must be a non-empty list of strings"}), status.HTTP_400_BAD_REQUEST
+    max_keys = current_app.config["BATCH_MAX_KEYS"]
+    if len(codes) > max_keys:
+        return jsonify({"error": f"At most {max_keys} codes can be passed per request"}), status.HTTP_400_BAD_REQUEST
+    keys = {equipment_key(code): code for code in codes}
+    try:
+        found = lookup_cache.get_many_or_load(keys, lambda missing: {
+            equipment_key(code): equipment
+            for code, equipment in _load_equipments([keys[key] for key in missing]).items()
+        })
+    except Exception as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_500_INTERNAL_SERVER_ERROR
+    results, not_found = [], []
+    for key, code in keys.items():
+        equipment = found[key]
+        if equipment is None:
+            not_found.append(code)
+        else:
+            results.append({**equipment["equipment"], "vessel_code": equipment["vessel_code"]})
+    return json_response({"count": len(results), "equipments": results, "not-found": not_found}, status.HTTP_200_OK)
+
+
+@api.route('/equipments/search', methods=['GET'])
+@swag_from('./routes_docs/equipments/equipments_get_search.yml', methods=['GET'])
+@admit("list")
+def search_equipments():
+    # Return a page of the equipments whose name and/or location match the given terms, or stream them as NDJSON
+    terms = {field: request.args[field] for field in search.SEARCH_FIELDS if request.args.get(field)}
+    if not terms:
+        return jsonify({
+            "error": "No search terms were passed. Try to search by 'name' or 'location'"
+        }), status.HTTP_400_BAD_REQUEST
+    match = request.args.get("match", "prefix")
+    if match not in search.MATCHES:
+        return jsonify({
+            "error": f"Invalid match '{match}', expected one of {', '.join(search.MATCHES)}"
+        }), status.HTTP_400_BAD_REQUEST
+    min_length = current_app.config["SEARCH_MIN_SUBSTRING_LENGTH"]
+    if match == "substring" and any(len(term) < min_length for term in terms.values()):
+        return jsonify({
+            "error": f"Substring searches need terms of at least {min_length} characters"
+        }), status.HTTP_400_BAD_REQUEST
+    equipment_status = request.args.get("status", None) or None
+    if equipment_status is not None and equipment_status not in statuses.EQUIPMENT_STATUSES:
+        return jsonify({"error": f"Invalid status '{equipment_status}'."}), status.HTTP_400_BAD_REQUEST
+    try:
+        limit, after = get_page_args()
+    except ValueError as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
+    equipments = search.search_equipments(SEARCH_COLUMNS, terms, match, request.args.get("vessel_code", None) or None,
+                                          equipment_status)
+    equipments = keyset(equipments, VesselEquipment.code, after)
+    if wants_ndjson():
+        return ndjson_response(equipments, _found_equipment_to_dict)
+    equipments, next_cursor = split_page(
+        equipments.limit(limit + 1).all(), limit, lambda equipment: equipment.code
+    )
+    results = [_found_equipment_to_dict(equipment) for equipment in equipments]
+    return json_response({"count": len(results), "equipments": results, "next": next_cursor}, status.HTTP_200_OK)
 
 
 @api.route('/equipments/orders', methods=['POST', 'GET'])
 @swag_from('./routes_docs/equipments/equipments_post_operation_orders.yml', methods=['POST'])
 @swag_from('./routes_docs/equipments/equipments_get_operation_orders.yml', methods=['GET'])
+@admit("list", methods=['GET'])
 def handle_operation_orders():
     # Handle POST requests
     if request.method == 'POST':
         if request.is_json:
-            data = request.get_json()
+            # Both modes validate the order the same way
+            try:
+                order = ingestion.parse_order(request.get_json())
+            except ValueError as err:
+                return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
+            if order_queue.enabled:
+                return _queue_operation_order(order)
             new_order = OperationOrder(
-                equipment_code=data["code"],
-                operation_type=data["type"],
-                operation_cost=data["cost"]
+                equipment_code=order["equipment_code"],
+                operation_type=order["type"],
+                operation_cost=order["cost"],
+                performed_at=order["performed_at"]
             )
+            new_order.id = order["id"]
             try:
                 db.session.add(new_order)
+                equipments = ingestion.orders_written([(new_order.equipment_code, new_order.cost)])
+                if new_order.equipment_code in equipments:
+                    # The order was flushed by the lookup of its equipment, its id is set
+                    event_feed.stage_order(equipments[new_order.equipment_code][0], {
+                        "id": new_order.id,
+                        "equipment_code": new_order.equipment_code,
+                        "type": new_order.type,
+                        "cost": new_order.cost,
+                        "performed_at": new_order.performed_at
+                    })
                 db.session.commit()
             except IntegrityError as err:
                 db.session.rollback()
@@ -182,100 +558,174 @@ def handle_operation_orders():
         else:
             return ERROR_RESP_JSON_FORMAT, status.HTTP_400_BAD_REQUEST
     # Handle GET requests
-    # Return all operation orders
+    # Return a page of operation orders, or stream all of them as NDJSON
+    try:
+        limit, after = get_page_args(cursor_type=uuid.UUID)
+    except ValueError as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
     try:
-        orders = OperationOrder.query.all()
-        results = [{
-            "id": order.id,
-            "code": order.equipment_code,
-            "type": order.type,
-            "cost": order.cost
-        } for order in orders]
-        return jsonify({"count": len(results), "orders": results}), status.HTTP_200_OK
+        orders = keyset(OperationOrder.query.with_entities(*ORDER_COLUMNS), OperationOrder.id, after)
+        if wants_ndjson():
+            return ndjson_response(orders, _order_to_dict)
+        orders, next_cursor = split_page(orders.limit(limit + 1).all(), limit, lambda order: str(order.id))
+        results = [_order_to_dict(order) for order in orders]
+        return json_response({"count": len(results), "orders": results, "next": next_cursor}, status.HTTP_200_OK)
     except Exception as err:
         return jsonify({"error": f"{err}"}), status.HTTP_500_INTERNAL_SERVER_ERROR
 
 
+def _queue_operation_order(order):
+    # Write-behind mode: queue the validated order and acknowledge it before it is written
+    code = order["equipment_code"]
+    if lookup_cache.get_or_load(equipment_key(code), lambda: _load_equipment(code)) is None:
+        return jsonify({"error": f"Equipment '{code}' does not exist"}), status.HTTP_400_BAD_REQUEST
+    try:
+        order_queue.put(order)
+    except QueueFull:
+        return jsonify({
+                   "error": "Too many operation orders are waiting to be written. Retry later."
+               }), status.HTTP_503_SERVICE_UNAVAILABLE, {
+                   "Retry-After": str(current_app.config["ORDER_QUEUE_RETRY_AFTER"])
+               }
+    return jsonify({
+               "message": f"Operation order '{order['id']}' has been accepted.",
+               "id": order["id"]
+           }), status.HTTP_202_ACCEPTED
+
+
+@api.route('/equipments/orders/bulk', methods=['POST'])
+@swag_from('./routes_docs/equipments/equipments_post_operation_orders_bulk.yml', methods=['POST'])
+def bulk_operation_orders():
+    # Create many operation orders from a JSON array or from NDJSON, one transaction per chunk
+    if request.mimetype == NDJSON_MIMETYPE:
+        payloads = _read_ndjson(request.stream)
+    elif request.is_json:
+        payloads = request.get_json()
+        if not isinstance(payloads, list):
+            return jsonify({"error": "The request payload must be an array of orders"}), status.HTTP_400_BAD_REQUEST
+    else:
+        return ERROR_RESP_JSON_FORMAT, status.HTTP_400_BAD_REQUEST
+    results = ingestion.bulk_insert(payloads, current_app.config["BULK_CHUNK_SIZE"])
+    created = sum(1 for result in results if result["status"] == "created")
+    failed = len(results) - created
+    return jsonify({
+        "created": created,
+        "failed": failed,
+        "results": results
+    }), status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED
+
+
 @api.route('/equipments/<equipment_code>/orders', methods=['GET'])
 @swag_from('./routes_docs/equipments/equipments_get_operation_orders_with_equip_code.yml', methods=['GET'])
+@admit("list")
+@conditional(lambda request, equipment_code: [versions.for_equipment(equipment_code)])
 def handle_operation_orders_with_code(equipment_code):
     try:
-        orders = OperationOrder.query.filter(
+        orders = OperationOrder.query.with_entities(*ORDER_COLUMNS).filter(
             OperationOrder.equipment_code == equipment_code
         )
-        results = [{
-            "id": order.id,
-            "code": order.equipment_code,
-            "type": order.type,
-            "cost": order.cost
-        } for order in orders]
-        return jsonify({"count": len(results), "orders": results}), status.HTTP_200_OK
+        results = [_order_to_dict(order) for order in orders]
+        return json_response({"count": len(results), "orders": results}, status.HTTP_200_OK)
     except Exception as err:
         return jsonify({"error": f"{err}"}), status.HTTP_500_INTERNAL_SERVER_ERROR
 
 
-@api.route('/equipments/orders/total-cost', methods=['GET'])
+@api.route('/equipments/orders/total-cost', methods=['POST', 'GET'])
 @swag_from('./routes_docs/equipments/equipments_get_total_cost.yml', methods=['GET'])
+@swag_from('./routes_docs/equipments/equipments_post_total_cost.yml', methods=['POST'])
+@admit("aggregate")
+@conditional(lambda request: _total_cost_versions(request))
 def total_cost_by_equipment():
-    total_cost = 0
-    orders_list = []
-    equipment_code = request.args.get("code", None)
-    equipment_name = request.args.get("name", None)
-
-    if equipment_code:
-        try:
-            orders = OperationOrder.query.filter(OperationOrder.equipment_code == equipment_code)
-            for order in orders:
-                orders_list.append(order.id)
-                total_cost += order.cost
+    # Handle POST requests
+    # Return the total cost of many equipments (by code or by name) at once
+    if request.method == 'POST':
+        if not request.is_json:
+            return ERROR_RESP_JSON_FORMAT, status.HTTP_400_BAD_REQUEST
+        data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({"error": "The request payload must be an object"}), status.HTTP_400_BAD_REQUEST
+        keys = [key for key in ("codes", "names") if key in data]
+        if len(keys) != 1:
             return jsonify({
-                "orders": orders_list,
-                "total-cost": total_cost
-            }), status.HTTP_200_OK
-        except Exception as err:
+                "error": "Pass either a list of 'codes' or a list of 'names'"
+            }), status.HTTP_400_BAD_REQUEST
+        values = data[keys[0]]
+        if not isinstance(values, list) or not values or not all(isinstance(value, str) for value in values):
+            return jsonify({
+                "error": f"'{keys[0]}' must be a non-empty list of strings"
+            }), status.HTTP_400_BAD_REQUEST
+        max_keys = current_app.config["BATCH_MAX_KEYS"]
+        if len(values) > max_keys:
+            return jsonify({
+                "error": f"At most {max_keys} {keys[0]} can be passed per request"
+            }), status.HTTP_400_BAD_REQUEST
+        try:
+            start, end = _get_created_range(data)
+        except ValueError as err:
             return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
-    elif equipment_name:
+        key = keys[0][:-1]
+        values = list(dict.fromkeys(values))
+        include_orders = data.get("orders") is True
         try:
-            data = db.session.query(
-                OperationOrder,
-                VesselEquipment
-            ).join(VesselEquipment).filter(VesselEquipment.name == equipment_name)
-            if len(data.all()) == 0:
-                return jsonify({"error": "No orders were found for this equipment"}), status.HTTP_404_NOT_FOUND
-            for order, equipment in data:
-                orders_list.append(order.id)
-                total_cost += order.cost
-            return jsonify({
-                "orders": orders_list,
-                "total-cost": total_cost
-            }), status.HTTP_200_OK
+            totals = costs.total_costs(key, values, start, end)
+            orders = costs.order_ids(key, values, start, end) if include_orders else {}
         except Exception as err:
             return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
+        results = []
+        for value in values:
+            total_cost, count = totals.get(value, (0, 0))
+            result = {key: value, "total-cost": total_cost, "count": count}
+            if include_orders:
+                result["orders"] = orders.get(value, [])
+            results.append(result)
+        return jsonify({"count": len(results), "total-costs": results}), status.HTTP_200_OK
+    # Handle GET requests
+    equipment_code = request.args.get("code", None)
+    equipment_name = request.args.get("name", None)
+    include_orders = _get_bool_arg("orders")
+
+    if equipment_code:
+        key, value = "code", equipment_code
+    elif equipment_name:
+        key, value = "name", equipment_name
     else:
         return jsonify({
             "error": "No filters were passed. Try to filter by 'code' or 'name'"
         }), status.HTTP_400_BAD_REQUEST
+    try:
+        start, end = _get_created_range(request.args)
+    except ValueError as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
+    try:
+        total_cost, count = costs.total_costs(key, [value], start, end).get(value, (0, 0))
+        if key == "name" and count == 0:
+            return jsonify({"error": "No orders were found for this equipment"}), status.HTTP_404_NOT_FOUND
+        result = {"total-cost": total_cost, "count": count}
+        if include_orders:
+            result["orders"] = costs.order_ids(key, [value], start, end).get(value, [])
+        return jsonify(result), status.HTTP_200_OK
+    except Exception as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
 
 
 @api.route('/equipments/orders/avg-cost', methods=['GET'])
 @swag_from('./routes_docs/equipments/equipments_get_avg_cost.yml', methods=['GET'])
+@admit("aggregate")
+@conditional(lambda request: [versions.for_vessel(request.args["code"])] if request.args.get("code") else None)
 def avg_cost_by_vessel():
-    total_cost = 0
     vessel_code = request.args.get("code", None)
     if vessel_code:
         try:
-            data = db.session.query(
-                OperationOrder,
-                VesselEquipment
-            ).join(VesselEquipment).filter(VesselEquipment.vessel_code == vessel_code)
-            if data.count() == 0:
+            start, end = _get_created_range(request.args)
+        except ValueError as err:
+            return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
+        try:
+            total_cost, count = costs.vessel_totals(vessel_code, start, end)
+            if count == 0:
                 return jsonify({"error": "No orders were found for this vessel"}), status.HTTP_404_NOT_FOUND
-            for order, equipment in data:
-                total_cost += order.cost
-            avg_cost = total_cost/data.count()
             return jsonify({
                 "code": vessel_code,
-                "avg-cost": avg_cost
+                "avg-cost": total_cost/count
             }), status.HTTP_200_OK
         except Exception as err:
             return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
@@ -283,3 +733,80 @@ def avg_cost_by_vessel():
         return jsonify({
             "error": "No filters were passed. Try to filter by 'code'"
         }), status.HTTP_400_BAD_REQUEST
+
+
+@api.route('/equipments/orders/fleet-cost', methods=['GET'])
+@swag_from('./routes_docs/equipments/equipments_get_fleet_cost.yml', methods=['GET'])
+@admit("aggregate")
+def fleet_cost_by_vessel():
+    # Return the cost and equipment summary of every vessel (or of the given 'code's), paginated by vessel code
+    vessel_codes = request.args.getlist("code") or None
+    max_keys = current_app.config["BATCH_MAX_KEYS"]
+    if vessel_codes is not None and len(vessel_codes) > max_keys:
+        return jsonify({"error": f"At most {max_keys} codes can be passed per request"}), status.HTTP_400_BAD_REQUEST
+    try:
+        limit, after = get_page_args()
+    except ValueError as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
+    try:
+        rows = costs.vessel_summaries(vessel_codes=vessel_codes, after=after, limit=limit + 1)
+    except Exception as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
+    rows, next_cursor = split_page(rows, limit, lambda row: row[0])
+    results = [{
+        "code": code,
+        "avg-cost": int(total_cost)/count if count else None,
+        "total-cost": int(total_cost),
+        "orders-count": int(count),
+        "active-equipments": active,
+        "inactive-equipments": inactive
+    } for code, total_cost, count, active, inactive in rows]
+    return jsonify({"count": len(results), "vessels": results, "next": next_cursor}), status.HTTP_200_OK
+
+
+@api.route('/equipments/orders/cost-analytics', methods=['GET'])
+@swag_from('./routes_docs/equipments/equipments_get_cost_analytics.yml', methods=['GET'])
+@admit("aggregate")
+def cost_analytics():
+    # Return the cost of the operation orders per day, week or month, grouped by vessel, equipment or type
+    bucket = request.args.get("bucket", "month")
+    group = request.args.get("group", "vessel")
+    timestamp = request.args.get("time", "created_at")
+    if bucket not in analytics.BUCKETS:
+        return jsonify({"error": f"'bucket' must be one of {', '.join(analytics.BUCKETS)}"}), \
+            status.HTTP_400_BAD_REQUEST
+    if group not in analytics.GROUPS:
+        return jsonify({"error": f"'group' must be one of {', '.join(analytics.GROUPS)}"}), \
+            status.HTTP_400_BAD_REQUEST
+    if timestamp not in analytics.TIMESTAMPS:
+        return jsonify({"error": f"'time' must be one of {', '.join(analytics.TIMESTAMPS)}"}), \
+            status.HTTP_400_BAD_REQUEST
+    if "start" not in request.args or "end" not in request.args:
+        return jsonify({"error": "Pass the 'start' and 'end' of the date range"}), status.HTTP_400_BAD_REQUEST
+    try:
+        start = parse_timestamp(request.args["start"])
+        end = parse_timestamp(request.args["end"])
+    except ValueError as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_400_BAD_REQUEST
+    if start >= end:
+        return jsonify({"error": "'start' must be before 'end'"}), status.HTTP_400_BAD_REQUEST
+    try:
+        rows = analytics.cost_buckets(bucket, group, start, end, timestamp)
+    except Exception as err:
+        return jsonify({"error": f"{err}"}), status.HTTP_500_INTERNAL_SERVER_ERROR
+    results = [{
+        "bucket": bucket_start.isoformat(),
+        group: value,
+        "total-cost": total_cost,
+        "orders-count": count,
+        "avg-cost": total_cost/count
+    } for bucket_start, value, total_cost, count in rows]
+    return jsonify({
+        "bucket": bucket,
+        "group": group,
+        "time": timestamp,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "count": len(results),
+        "results": results
+    }), status.HTTP_200_OK
@@ -0,0 +1,40 @@
+import json
+import queue
+
+from flask import current_app, Response
+
+
+def _format(change):
+    lines = [] if change.id is None else [f"id: {change.id}"]
+    lines.append(f"event: {change.type}")
+    lines.append(f"data: {json.dumps(change.data, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def event_stream_response(subscription):
+    """Stream a Subscription as text/event-stream, with a comment every EVENTS_KEEPALIVE_SECONDS.
+
+    The stream ends when the subscription overflows; the client then reconnects with its
+    Last-Event-ID. The request context is not kept: the stream can last for hours.
+    """
+    keepalive = current_app.config["EVENTS_KEEPALIVE_SECONDS"]
+
+    def generate():
+        try:
+            yield b"retry: 1000\n\n"
+            for change in subscription.backlog:
+                yield _format(change)
+            while True:
+                try:
+                    change = subscription.get(keepalive)
+                except queue.Empty:
+                    return
+                yield b": keepalive\n\n" if change is None else _format(change)
+        finally:
+            subscription.close()
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # Disable the response buffering of nginx
+        "X-Accel-Buffering": "no"
+    })
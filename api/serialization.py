@@ -0,0 +1,54 @@
+from flask import current_app, json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard library encoder is used without it
+    orjson = None
+
+
+class JSONProvider(object):
+    """Serializer of the list responses, with the encoder of Flask (which handles UUIDs and dates)."""
+
+    name = "stdlib"
+
+    def dumps(self, obj):
+        """Return the JSON document of 'obj' as bytes."""
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+class OrjsonProvider(JSONProvider):
+    """Serializer backed by orjson, which encodes UUIDs and dates natively and is several times faster."""
+
+    name = "orjson"
+
+    def dumps(self, obj):
+        option = orjson.OPT_NON_STR_KEYS
+        if current_app.config["JSON_SORT_KEYS"]:
+            option |= orjson.OPT_SORT_KEYS
+        # Types orjson does not know (e.g. Decimal) are encoded like Flask does
+        return orjson.dumps(obj, default=current_app.json_encoder().default, option=option)
+
+
+PROVIDERS = {provider.name: provider for provider in (JSONProvider, OrjsonProvider)}
+
+
+def init_app(app):
+    """Pick the JSON provider named by JSON_PROVIDER, or orjson when it is installed and JSON_PROVIDER is 'auto'."""
+    name = app.config["JSON_PROVIDER"]
+    if name == "auto":
+        name = "orjson" if orjson is not None else "stdlib"
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown JSON_PROVIDER '{name}', expected 'auto' or one of {sorted(PROVIDERS)}")
+    if name == "orjson" and orjson is None:
+        raise ValueError("JSON_PROVIDER is 'orjson' but orjson is not installed")
+    app.extensions["json_provider"] = PROVIDERS[name]()
+
+
+def dumps(obj):
+    """Serialize 'obj' to JSON bytes with the provider of the current app."""
+    return current_app.extensions["json_provider"].dumps(obj)
+
+
+def json_response(obj, status_code):
+    """Build a JSON response, the way 'jsonify' does, with the provider of the current app."""
+    return current_app.response_class(dumps(obj) + b"\n", status=status_code, mimetype="application/json")
@@ -0,0 +1,60 @@
+from datetime import timezone
+
+from sqlalchemy import func, cast, Date
+
+from database.database import db, dialect_name
+
+from api.models.operation_orders import OperationOrder
+from api.models.vessel_equipments import VesselEquipment
+
+
+# Sizes of the time buckets
+BUCKETS = ("day", "week", "month")
+# Columns the buckets can be grouped by
+GROUPS = {
+    "vessel": VesselEquipment.vessel_code,
+    "equipment": OperationOrder.equipment_code,
+    "type": OperationOrder.type,
+}
+# Timestamps the orders can be bucketed by
+TIMESTAMPS = {
+    "created_at": OperationOrder.created_at,
+    "performed_at": OperationOrder.performed_at,
+}
+
+
+def _bucket_start(bucket, column):
+    """Return the first day of the 'bucket' (day, week starting on Monday, or month) holding 'column'."""
+    if dialect_name() == 'postgresql':
+        return cast(func.date_trunc(bucket, column), Date)
+    # SQLite: date() modifiers
+    if bucket == "day":
+        return func.date(column, type_=Date)
+    if bucket == "week":
+        return func.date(column, '-6 days', 'weekday 1', type_=Date)
+    return func.date(column, 'start of month', type_=Date)
+
+
+def cost_buckets(bucket, group, start, end, timestamp="created_at"):
+    """Return the cost of the operation orders whose 'timestamp' is in [start, end), per time bucket and group.
+
+    The rows are (bucket start date, group value, total_cost, orders_count), ordered by bucket and
+    group value, and are aggregated by the database in a single GROUP BY; orders without a
+    'timestamp' (performed_at is optional) are left out.
+    """
+    column = TIMESTAMPS[timestamp]
+    bucket_start = _bucket_start(bucket, column).label("bucket")
+    key = GROUPS[group].label("key")
+    query = db.session.query(
+        bucket_start,
+        key,
+        func.sum(OperationOrder.cost),
+        func.count(OperationOrder.id)
+    ).filter(
+        column >= start.astimezone(timezone.utc),
+        column < end.astimezone(timezone.utc)
+    )
+    if group == "vessel":
+        query = query.join(VesselEquipment, VesselEquipment.code == OperationOrder.equipment_code)
+    rows = query.group_by(bucket_start, key).order_by(bucket_start, key)
+    return [(bucket_day, value, int(total_cost or 0), int(count)) for bucket_day, value, total_cost, count in rows]
@@ -0,0 +1,133 @@
+from datetime import timezone
+
+from sqlalchemy import func, case
+
+from database.database import db
+
+from api.models.cost_rollups import EquipmentCostRollup, VesselCostRollup
+from api.models.operation_orders import OperationOrder
+from api.models.vessels import Vessel
+from api.models.vessel_equipments import VesselEquipment
+
+
+# Columns the cost aggregates can be keyed by
+COST_KEYS = {
+    "code": OperationOrder.equipment_code,
+    "name": VesselEquipment.name,
+}
+
+
+def _created_between(query, start, end):
+    # Plain comparisons of created_at with constants, so a partitioned operation_orders is pruned
+    # to the partitions of [start, end) at planning time
+    if start is not None:
+        query = query.filter(OperationOrder.created_at >= start.astimezone(timezone.utc))
+    if end is not None:
+        query = query.filter(OperationOrder.created_at < end.astimezone(timezone.utc))
+    return query
+
+
+def _order_totals(key, values, start, end):
+    column = COST_KEYS[key]
+    query = db.session.query(column, func.sum(OperationOrder.cost), func.count(OperationOrder.id))
+    if key == "name":
+        query = query.select_from(OperationOrder).join(VesselEquipment)
+    query = _created_between(query.filter(column.in_(values)), start, end)
+    return {value: (int(total_cost or 0), int(count)) for value, total_cost, count in query.group_by(column)}
+
+
+def total_costs(key, values, start=None, end=None):
+    """Return {value: (total_cost, orders_count)} for the given equipment codes or names.
+
+    The totals are read from the equipment cost rollups, which are kept up to date by the
+    operation order write paths; values without any operation order are left out. When a
+    'start' or 'end' is given, only the orders created in [start, end) are summed, from the
+    operation orders themselves.
+    """
+    if start is not None or end is not None:
+        return _order_totals(key, values, start, end)
+    if key == "name":
+        rows = db.session.query(
+            VesselEquipment.name,
+            func.sum(EquipmentCostRollup.total_cost),
+            func.sum(EquipmentCostRollup.orders_count)
+        ).join(
+            EquipmentCostRollup, EquipmentCostRollup.equipment_code == VesselEquipment.code
+        ).filter(VesselEquipment.name.in_(values)).group_by(VesselEquipment.name)
+    else:
+        rows = db.session.query(
+            EquipmentCostRollup.equipment_code,
+            EquipmentCostRollup.total_cost,
+            EquipmentCostRollup.orders_count
+        ).filter(EquipmentCostRollup.equipment_code.in_(values))
+    return {value: (int(total_cost), int(count)) for value, total_cost, count in rows if count}
+
+
+def order_ids(key, values, start=None, end=None):
+    """Return {value: [order ids]} for the given equipment codes or names, created in [start, end) if given."""
+    column = COST_KEYS[key]
+    query = db.session.query(column, OperationOrder.id)
+    if key == "name":
+        query = query.select_from(OperationOrder).join(VesselEquipment)
+    results = {}
+    for value, order_id in _created_between(query.filter(column.in_(values)), start, end):
+        results.setdefault(value, []).append(order_id)
+    return results
+
+
+def vessel_totals(vessel_code, start=None, end=None):
+    """Return (total_cost, orders_count) of the operation orders of a vessel, created in [start, end) if given."""
+    if start is not None or end is not None:
+        total_cost, count = _created_between(db.session.query(
+            func.sum(OperationOrder.cost),
+            func.count(OperationOrder.id)
+        ).select_from(OperationOrder).join(VesselEquipment).filter(
+            VesselEquipment.vessel_code == vessel_code
+        ), start, end).one()
+        return int(total_cost or 0), int(count)
+    rollup = db.session.query(
+        VesselCostRollup.total_cost,
+        VesselCostRollup.orders_count
+    ).filter(VesselCostRollup.vessel_code == vessel_code).first()
+    if rollup is None:
+        return 0, 0
+    return int(rollup[0]), int(rollup[1])
+
+
+def vessel_summaries(vessel_codes=None, after=None, limit=None):
+    """Return the cost and equipment summary of a page of vessels, ordered by code.
+
+    Each row is (code, total_cost, orders_count, active_equipments, inactive_equipments).
+    The page of vessels is selected first, so the equipment counts only touch the
+    equipments of the vessels being returned; the costs come from the vessel rollups.
+    Everything runs as a single statement.
+    """
+    page = db.session.query(Vessel.code)
+    if vessel_codes is not None:
+        page = page.filter(Vessel.code.in_(vessel_codes))
+    if after is not None:
+        page = page.filter(Vessel.code > after)
+    page = page.order_by(Vessel.code)
+    if limit is not None:
+        page = page.limit(limit)
+    page = page.cte("vessel_page")
+
+    equipments = db.session.query(
+        VesselEquipment.vessel_code.label("vessel_code"),
+        func.count(case((VesselEquipment.status == "active", 1))).label("active"),
+        func.count(case((VesselEquipment.status == "inactive", 1))).label("inactive")
+    ).filter(
+        VesselEquipment.vessel_code.in_(db.session.query(page.c.code))
+    ).group_by(VesselEquipment.vessel_code).subquery()
+
+    return db.session.query(
+        page.c.code,
+        func.coalesce(VesselCostRollup.total_cost, 0),
+        func.coalesce(VesselCostRollup.orders_count, 0),
+        func.coalesce(equipments.c.active, 0),
+        func.coalesce(equipments.c.inactive, 0)
+    ).outerjoin(
+        equipments, equipments.c.vessel_code == page.c.code
+    ).outerjoin(
+        VesselCostRollup, VesselCostRollup.vessel_code == page.c.code
+    ).order_by(page.c.code).all()
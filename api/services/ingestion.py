@@ -0,0 +1,137 @@
+import uuid
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from database.database import db
+
+from api.events import event_feed
+from api.models.operation_orders import OperationOrder
+from api.models.vessel_equipments import VesselEquipment
+from api.services import rollups, versions
+from api.services.timestamps import parse_timestamp
+
+
+def parse_order(data):
+    """Validate an operation order payload and return it as an operation_orders row.
+
+    Raises ValueError with a message suitable for the client if the payload is invalid.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("The order must be an object")
+    missing = [key for key in ("code", "type", "cost") if key not in data]
+    if missing:
+        raise ValueError(f"Missing keys: {', '.join(missing)}")
+    # Checked here: the write-behind queue only finds out when the batch is written
+    if not isinstance(data["code"], str) or not isinstance(data["type"], str):
+        raise ValueError("The order's code and type must be strings")
+    try:
+        cost = int(data["cost"])
+    except (TypeError, ValueError):
+        raise ValueError("The order's cost must be an integer")
+    performed_at = data.get("performed_at", None)
+    if performed_at is not None:
+        performed_at = parse_timestamp(performed_at)
+    return {
+        "id": uuid.uuid4(),
+        "equipment_code": data["code"],
+        "type": data["type"],
+        "cost": cost,
+        "performed_at": performed_at
+    }
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def lookup_equipments(equipment_codes):
+    """Return {code: (vessel_code, name)} of the existing equipments among 'equipment_codes'."""
+    return {code: (vessel_code, name) for code, vessel_code, name in db.session.query(
+        VesselEquipment.code, VesselEquipment.vessel_code, VesselEquipment.name
+    ).filter(VesselEquipment.code.in_(set(equipment_codes)))}
+
+
+def orders_written(orders, equipments=None):
+    """Update the cost rollups and the version counters for new (equipment_code, cost) orders.
+
+    Runs in the current transaction. 'equipments' is the lookup_equipments() result of the
+    orders' equipment codes, when the caller already has it.
+    Returns {code: (vessel_code, name)} of the orders' equipments.
+    """
+    if equipments is None:
+        equipments = lookup_equipments(code for code, _ in orders)
+    rollups.record_orders(orders, {code: vessel_code for code, (vessel_code, _) in equipments.items()})
+    keys = []
+    for code in {code for code, _ in orders if code in equipments}:
+        vessel_code, name = equipments[code]
+        keys.extend((
+            versions.for_equipment(code),
+            versions.for_equipment_name(name),
+            versions.for_vessel(vessel_code)
+        ))
+    versions.bump(keys)
+    return equipments
+
+
+def insert_orders(orders, equipments=None):
+    """Insert operation_orders rows with batched multi-row statements and update the cost rollups.
+
+    Nothing is committed: the orders, their rollups and their events belong to the current transaction.
+    """
+    db.session.execute(OperationOrder.__table__.insert(), orders)
+    equipments = orders_written([(order["equipment_code"], order["cost"]) for order in orders], equipments)
+    for order in orders:
+        if order["equipment_code"] in equipments:
+            event_feed.stage_order(equipments[order["equipment_code"]][0], order)
+
+
+def bulk_insert(payloads, chunk_size):
+    """Insert many operation orders, committing one transaction per chunk of 'chunk_size' payloads.
+
+    'payloads' is an iterable of decoded order payloads, or of ValueError instances for the
+    payloads that could not be decoded. A payload that is invalid or refers to an unknown
+    equipment fails on its own; a chunk that fails to commit fails all of its orders.
+    Returns one result per payload, in order.
+    """
+    results = []
+    for chunk in _chunks(enumerate(payloads), chunk_size):
+        chunk_results = {}
+        orders = []
+        for index, data in chunk:
+            try:
+                if isinstance(data, ValueError):
+                    raise data
+                order = parse_order(data)
+                orders.append((index, order))
+            except ValueError as err:
+                chunk_results[index] = {"index": index, "status": "failed", "error": f"{err}"}
+
+        equipments = lookup_equipments(order["equipment_code"] for _, order in orders) if orders else {}
+        for index, order in orders:
+            if order["equipment_code"] not in equipments:
+                chunk_results[index] = {
+                    "index": index,
+                    "status": "failed",
+                    "error": f"Equipment '{order['equipment_code']}' does not exist"
+                }
+        orders = [(index, order) for index, order in orders if index not in chunk_results]
+
+        if orders:
+            try:
+                insert_orders([order for _, order in orders], equipments)
+                db.session.commit()
+                for index, order in orders:
+                    chunk_results[index] = {"index": index, "status": "created", "id": order["id"]}
+            except SQLAlchemyError as err:
+                db.session.rollback()
+                for index, _ in orders:
+                    chunk_results[index] = {"index": index, "status": "failed", "error": f"{err}"}
+        results.extend(chunk_results[index] for index, _ in chunk)
+    return results
@@ -0,0 +1,152 @@
+import re
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from database.database import db, dialect_name
+
+from api.models.operation_orders import OperationOrder
+from api.services import rollups
+from api.services.timestamps import parse_timestamp
+
+
+# Partitioning strategies of pg_partitioned_table.partstrat
+STRATEGIES = {"r": "range", "h": "hash", "l": "list"}
+# Partition key columns of each strategy (see the d9c4e2b7a813 migration)
+PARTITION_KEYS = {"range": ("created_at",), "hash": ("equipment_code",)}
+# Bounds of a range partition, as rendered by pg_get_expr()
+RANGE_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class PartitionError(ValueError):
+    """operation_orders is not partitioned the way an operation needs. The message is suitable for the user."""
+
+
+def strategy():
+    """Return how operation_orders is partitioned: 'range', 'hash', or None when it is a plain table."""
+    if dialect_name() != 'postgresql':
+        return None
+    row = db.session.execute(text(
+        "SELECT partstrat FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"
+    ), {"table": OperationOrder.__tablename__}).first()
+    return STRATEGIES[row[0]] if row is not None else None
+
+
+def key_columns(table):
+    """Return the columns of the unique key of 'table': its primary key, plus the partition key when partitioned.
+
+    Unique constraints of a partitioned table must include its partition key, so upserts of
+    operation orders conflict on (id, created_at) or (id, equipment_code).
+    """
+    columns = list(table.primary_key.columns)
+    if table is OperationOrder.__table__:
+        columns += [table.columns[name] for name in PARTITION_KEYS.get(strategy(), ())]
+    return columns
+
+
+def month_start(timestamp):
+    """First instant (UTC) of the month holding 'timestamp'."""
+    timestamp = timestamp.astimezone(timezone.utc)
+    return datetime(timestamp.year, timestamp.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f"{OperationOrder.__tablename__}_p{month:%Y%m}"
+
+
+def _parse_bound(value):
+    # pg_get_expr() renders the bounds in the session time zone, with hour-only offsets ('+00')
+    return parse_timestamp(value + ":00" if re.search(r"[+-]\d\d$", value) else value)
+
+
+def list_partitions():
+    """Return the attached partitions of operation_orders, ordered by name.
+
+    Each one is {"name", "bound", "rows"}, plus "start" and "end" (aware datetimes) for the
+    partitions of a range; "rows" is the planner's estimate.
+    """
+    rows = db.session.execute(text(
+        "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples::bigint "
+        "FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:table) ORDER BY child.relname"
+    ), {"table": OperationOrder.__tablename__})
+    partitions = []
+    for name, bound, estimate in rows:
+        partition = {"name": name, "bound": bound, "rows": max(int(estimate), 0)}
+        bounds = RANGE_BOUNDS.search(bound)
+        if bounds is not None:
+            partition["start"], partition["end"] = (_parse_bound(value) for value in bounds.groups())
+        partitions.append(partition)
+    return partitions
+
+
+def _require_range():
+    found = strategy()
+    if found != "range":
+        raise PartitionError(
+            f"operation_orders is {'partitioned by ' + found if found else 'not partitioned'}; these commands "
+            f"manage the monthly partitions of 'flask db upgrade -x orders_partitioning=range'"
+        )
+
+
+def create_partitions(months_ahead, now=None):
+    """Create the missing monthly partitions, from the current month to 'months_ahead' months later.
+
+    Runs in the current transaction. Returns the names of the created partitions.
+    Raises PartitionError unless operation_orders is partitioned by range.
+    """
+    _require_range()
+    existing = [partition for partition in list_partitions() if "start" in partition]
+    current = month_start(now or datetime.now(timezone.utc))
+    created = []
+    for months in range(months_ahead + 1):
+        start = add_months(current, months)
+        end = add_months(start, 1)
+        if any(partition["start"] < end and start < partition["end"] for partition in existing):
+            continue
+        name = partition_name(start)
+        # Fails if the default partition already holds orders of the month: attach them by hand
+        db.session.execute(text(
+            f'CREATE TABLE "{name}" PARTITION OF {OperationOrder.__tablename__} '
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        created.append(name)
+    return created
+
+
+def _remove_from_rollups(name):
+    totals = db.session.execute(text(
+        f'SELECT equipment_code, coalesce(sum(cost), 0), count(*) FROM "{name}" '
+        f"WHERE equipment_code IS NOT NULL GROUP BY equipment_code"
+    ))
+    rollups.remove_totals({code: (int(total_cost), int(count)) for code, total_cost, count in totals})
+
+
+def detach_partitions(before, archive_schema=None):
+    """Detach the monthly partitions whose orders were all created before 'before'.
+
+    Detached partitions are moved to 'archive_schema' (created if needed), or dropped when it
+    is None, and their orders are taken out of the cost rollups. Runs in the current
+    transaction. Returns the names of the detached partitions.
+    Raises PartitionError unless operation_orders is partitioned by range.
+    """
+    _require_range()
+    detached = []
+    for partition in list_partitions():
+        if "start" not in partition or partition["end"] > before:
+            continue
+        name = partition["name"]
+        _remove_from_rollups(name)
+        db.session.execute(text(f'ALTER TABLE {OperationOrder.__tablename__} DETACH PARTITION "{name}"'))
+        if archive_schema is None:
+            db.session.execute(text(f'DROP TABLE "{name}"'))
+        else:
+            db.session.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"'))
+            db.session.execute(text(f'ALTER TABLE "{name}" SET SCHEMA "{archive_schema}"'))
+        detached.append(name)
+    return detached
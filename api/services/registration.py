@@ -0,0 +1,59 @@
+from database.database import db, dialect_insert, dialect_name
+
+from api.models.vessels import Vessel
+from api.models.vessel_equipments import VesselEquipment
+
+
+# Rows per INSERT statement, well below the bind parameter limits of PostgreSQL and SQLite
+INSERT_CHUNK_SIZE = 1000
+
+
+def _insert_ignoring_conflicts(key_column, rows):
+    """Insert rows with ON CONFLICT DO NOTHING in the current transaction.
+
+    Returns the (created, existing) key values, in the order of 'rows'. On PostgreSQL the
+    created keys come from RETURNING; other databases look up the existing keys first.
+    """
+    table = key_column.table
+    keys = [row[key_column.name] for row in rows]
+    created = set()
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + INSERT_CHUNK_SIZE]
+        statement = dialect_insert(table).values(chunk).on_conflict_do_nothing(index_elements=[key_column])
+        if dialect_name() == 'postgresql':
+            created.update(key for key, in db.session.execute(statement.returning(key_column)))
+        else:
+            chunk_keys = keys[start:start + INSERT_CHUNK_SIZE]
+            existing = {key for key, in db.session.query(key_column).filter(key_column.in_(chunk_keys))}
+            db.session.execute(statement)
+            created.update(key for key in chunk_keys if key not in existing)
+    return [key for key in keys if key in created], [key for key in keys if key not in created]
+
+
+def _unique(rows, key):
+    unique = {}
+    for row in rows:
+        unique.setdefault(row[key], row)
+    return list(unique.values())
+
+
+def register_vessels(codes):
+    """Create the vessels that do not exist yet. Returns the (created, existing) codes."""
+    rows = [{"code": code} for code in dict.fromkeys(codes)]
+    return _insert_ignoring_conflicts(Vessel.code, rows)
+
+
+def register_equipments(vessel_code, equipments):
+    """Create the equipments of a vessel whose codes do not exist yet.
+
+    'equipments' are dicts with the 'code', 'name' and 'location' of each equipment; new
+    equipments are always active. Returns the (created, existing) codes.
+    """
+    rows = [{
+        "code": equipment["code"],
+        "vessel_code": vessel_code,
+        "name": equipment["name"],
+        "location": equipment["location"],
+        "status": "active"
+    } for equipment in _unique(equipments, "code")]
+    return _insert_ignoring_conflicts(VesselEquipment.code, rows)
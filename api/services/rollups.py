@@ -0,0 +1,184 @@
+from sqlalchemy import func, text
+
+from database.database import db, dialect_insert, dialect_name, matches_any
+
+from api.models.cost_rollups import EquipmentCostRollup, VesselCostRollup
+from api.models.operation_orders import OperationOrder
+from api.models.vessel_equipments import VesselEquipment
+
+
+def _upsert(model, key_column, deltas):
+    table = model.__table__
+    rows = [{
+        key_column.name: key,
+        "total_cost": total_cost,
+        "orders_count": count
+    } for key, (total_cost, count) in sorted(deltas.items())]
+    statement = dialect_insert(table)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[key_column],
+        set_={
+            "total_cost": table.c.total_cost + statement.excluded.total_cost,
+            "orders_count": table.c.orders_count + statement.excluded.orders_count
+        }
+    ), rows)
+
+
+def record_orders(orders, vessel_codes=None):
+    """Add new operation orders, given as (equipment_code, cost) pairs, to the cost rollups.
+
+    The rollups are updated in the current transaction, so they are committed (or rolled
+    back) together with the orders themselves. Orders of unknown equipments are ignored:
+    inserting them fails on the equipment foreign key anyway. Callers that already know
+    the vessel of each equipment can pass it as 'vessel_codes' to save a query.
+
+    Returns {equipment_code: vessel_code} of the known equipments.
+    """
+    equipment_deltas = {}
+    for equipment_code, cost in orders:
+        total_cost, count = equipment_deltas.get(equipment_code, (0, 0))
+        equipment_deltas[equipment_code] = (total_cost + (cost or 0), count + 1)
+
+    if vessel_codes is None:
+        vessel_codes = dict(db.session.query(VesselEquipment.code, VesselEquipment.vessel_code).filter(
+            VesselEquipment.code.in_(list(equipment_deltas))
+        ))
+    equipment_deltas = {code: delta for code, delta in equipment_deltas.items() if code in vessel_codes}
+    vessel_deltas = {}
+    for equipment_code, (total_cost, count) in equipment_deltas.items():
+        vessel_code = vessel_codes[equipment_code]
+        if vessel_code is None:
+            continue
+        vessel_total_cost, vessel_count = vessel_deltas.get(vessel_code, (0, 0))
+        vessel_deltas[vessel_code] = (vessel_total_cost + total_cost, vessel_count + count)
+
+    if equipment_deltas:
+        _upsert(EquipmentCostRollup, EquipmentCostRollup.equipment_code, equipment_deltas)
+    if vessel_deltas:
+        _upsert(VesselCostRollup, VesselCostRollup.vessel_code, vessel_deltas)
+    return vessel_codes
+
+
+def apply_totals(equipment_deltas):
+    """Add changes of operation orders, given as {equipment_code: (total_cost, orders_count)}, to the cost rollups.
+
+    The deltas may be negative, e.g. for updated orders; each equipment's delta also goes to
+    the rollup of its vessel. Runs in the current transaction.
+    """
+    equipment_deltas = {code: delta for code, delta in equipment_deltas.items() if delta != (0, 0)}
+    if not equipment_deltas:
+        return
+    vessel_codes = dict(db.session.query(VesselEquipment.code, VesselEquipment.vessel_code).filter(
+        matches_any(VesselEquipment.code, list(equipment_deltas))
+    ))
+    vessel_deltas = {}
+    for equipment_code, (total_cost, count) in equipment_deltas.items():
+        vessel_code = vessel_codes.get(equipment_code, None)
+        if vessel_code is None:
+            continue
+        vessel_total_cost, vessel_count = vessel_deltas.get(vessel_code, (0, 0))
+        vessel_deltas[vessel_code] = (vessel_total_cost + total_cost, vessel_count + count)
+    _upsert(EquipmentCostRollup, EquipmentCostRollup.equipment_code, equipment_deltas)
+    if vessel_deltas:
+        _upsert(VesselCostRollup, VesselCostRollup.vessel_code, vessel_deltas)
+
+
+def remove_totals(equipment_totals):
+    """Take removed operation orders, given as {equipment_code: (total_cost, orders_count)}, out of the cost rollups.
+
+    Used when old orders are archived in bulk; runs in the current transaction.
+    """
+    apply_totals({code: (-total_cost, -count) for code, (total_cost, count) in equipment_totals.items()})
+
+
+def move_equipments(moves):
+    """Move the costs of equipments that changed vessel between the vessel rollups.
+
+    'moves' are (equipment_code, old_vessel_code, new_vessel_code) triples, applied in order;
+    either vessel code may be None. Runs in the current transaction.
+    """
+    if not moves:
+        return
+    totals = {code: (total_cost, count) for code, total_cost, count in db.session.query(
+        EquipmentCostRollup.equipment_code, EquipmentCostRollup.total_cost, EquipmentCostRollup.orders_count
+    ).filter(matches_any(EquipmentCostRollup.equipment_code, list({code for code, _, _ in moves})))}
+    vessel_deltas = {}
+    for equipment_code, old_vessel_code, new_vessel_code in moves:
+        total_cost, count = totals.get(equipment_code, (0, 0))
+        for vessel_code, sign in ((old_vessel_code, -1), (new_vessel_code, 1)):
+            if vessel_code is None:
+                continue
+            vessel_total_cost, vessel_count = vessel_deltas.get(vessel_code, (0, 0))
+            vessel_deltas[vessel_code] = (vessel_total_cost + sign * total_cost, vessel_count + sign * count)
+    vessel_deltas = {code: delta for code, delta in vessel_deltas.items() if delta != (0, 0)}
+    if vessel_deltas:
+        _upsert(VesselCostRollup, VesselCostRollup.vessel_code, vessel_deltas)
+
+
+def _equipment_aggregates():
+    return db.session.query(
+        OperationOrder.equipment_code,
+        func.coalesce(func.sum(OperationOrder.cost), 0),
+        func.count(OperationOrder.id)
+    ).filter(OperationOrder.equipment_code.isnot(None)).group_by(OperationOrder.equipment_code)
+
+
+def _vessel_aggregates():
+    return db.session.query(
+        VesselEquipment.vessel_code,
+        func.coalesce(func.sum(OperationOrder.cost), 0),
+        func.count(OperationOrder.id)
+    ).select_from(OperationOrder).join(VesselEquipment).filter(
+        VesselEquipment.vessel_code.isnot(None)
+    ).group_by(VesselEquipment.vessel_code)
+
+
+def rebuild():
+    """Recompute every cost rollup from the operation orders, in the current transaction.
+
+    Returns the number of (equipment, vessel) rollup rows written.
+    """
+    if dialect_name() == 'postgresql':
+        # Block concurrent order writes until the rebuilt rollups are committed. The full scan can
+        # outlast DB_STATEMENT_TIMEOUT_MS: lift it for this transaction
+        db.session.execute(text("SET LOCAL statement_timeout = 0"))
+        db.session.execute(text("LOCK TABLE operation_orders IN SHARE MODE"))
+    db.session.query(EquipmentCostRollup).delete(synchronize_session=False)
+    db.session.query(VesselCostRollup).delete(synchronize_session=False)
+
+    columns = ["total_cost", "orders_count"]
+    equipments = db.session.execute(EquipmentCostRollup.__table__.insert().from_select(
+        ["equipment_code"] + columns, _equipment_aggregates()
+    )).rowcount
+    vessels = db.session.execute(VesselCostRollup.__table__.insert().from_select(
+        ["vessel_code"] + columns, _vessel_aggregates()
+    )).rowcount
+    return equipments, vessels
+
+
+def _mismatches(scope, expected, actual):
+    return [{
+        "scope": scope,
+        "key": key,
+        "expected": expected.get(key, (0, 0)),
+        "actual": actual.get(key, (0, 0))
+    } for key in sorted(set(expected) | set(actual)) if expected.get(key, (0, 0)) != actual.get(key, (0, 0))]
+
+
+def check():
+    """Compare the cost rollups with the operation orders.
+
+    Returns a list of mismatches, each one a dict with the rollup 'scope' ('equipment' or
+    'vessel'), its 'key' and the 'expected' and 'actual' (total_cost, orders_count) pairs.
+    """
+    def as_dict(rows):
+        return {key: (int(total_cost), int(count)) for key, total_cost, count in rows}
+
+    equipment_rollups = db.session.query(
+        EquipmentCostRollup.equipment_code, EquipmentCostRollup.total_cost, EquipmentCostRollup.orders_count
+    )
+    vessel_rollups = db.session.query(
+        VesselCostRollup.vessel_code, VesselCostRollup.total_cost, VesselCostRollup.orders_count
+    )
+    return (_mismatches("equipment", as_dict(_equipment_aggregates()), as_dict(equipment_rollups)) +
+            _mismatches("vessel", as_dict(_vessel_aggregates()), as_dict(vessel_rollups)))
@@ -0,0 +1,40 @@
+from database.database import db
+
+from api.models.vessel_equipments import VesselEquipment
+
+
+# Columns that can be searched, and how a term matches them (case-insensitively)
+SEARCH_FIELDS = {
+    "name": VesselEquipment.name,
+    "location": VesselEquipment.location,
+}
+MATCHES = ("prefix", "substring")
+LIKE_ESCAPE = "\\"
+
+
+def escape_like(term):
+    """Escape the LIKE wildcards of a search term, so that it matches literally."""
+    return term.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace("%", LIKE_ESCAPE + "%").replace("_", LIKE_ESCAPE + "_")
+
+
+def _condition(column, term, match):
+    # Prefixes are served by the lower(column) text_pattern_ops indexes, substrings by the trigram indexes
+    if match == "prefix":
+        return db.func.lower(column).like(escape_like(term.lower()) + "%", escape=LIKE_ESCAPE)
+    return column.ilike("%" + escape_like(term) + "%", escape=LIKE_ESCAPE)
+
+
+def search_equipments(columns, terms, match, vessel_code=None, equipment_status=None):
+    """Return a query of the equipments matching every {field: term} of 'terms', in code order.
+
+    'columns' are the selected columns; 'match' is 'prefix' or 'substring'. The results can be
+    paginated with keyset() on the code.
+    """
+    query = VesselEquipment.query.with_entities(*columns).filter(
+        *(_condition(SEARCH_FIELDS[field], term, match) for field, term in terms.items())
+    )
+    if vessel_code is not None:
+        query = query.filter(VesselEquipment.vessel_code == vessel_code)
+    if equipment_status is not None:
+        query = query.filter(VesselEquipment.status == equipment_status)
+    return query
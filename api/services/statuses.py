@@ -0,0 +1,63 @@
+from sqlalchemy import update
+
+from database.database import db, dialect_name, matches_any
+
+from api.models.vessel_equipments import VesselEquipment
+
+
+EQUIPMENT_STATUSES = tuple(VesselEquipment.status.type.enums)
+
+
+def update_statuses(statuses, chunk_size):
+    """Set the status of many equipments, given as {code: status}, in the current transaction.
+
+    Runs one set-based UPDATE per target status and chunk of 'chunk_size' codes, after
+    locking the rows of the chunk to classify each code. Returns the 'updated',
+    'unchanged' and 'not-found' codes, plus {code: vessel_code} of the updated ones.
+    """
+    results = {"updated": [], "unchanged": [], "not-found": []}
+    vessel_codes = {}
+    by_status = {}
+    for code, equipment_status in statuses.items():
+        by_status.setdefault(equipment_status, []).append(code)
+
+    for equipment_status, codes in by_status.items():
+        for start in range(0, len(codes), chunk_size):
+            chunk = codes[start:start + chunk_size]
+            current = {code: (current_status, vessel_code) for code, current_status, vessel_code in db.session.query(
+                VesselEquipment.code, VesselEquipment.status, VesselEquipment.vessel_code
+            ).filter(matches_any(VesselEquipment.code, chunk)).with_for_update()}
+            to_update = []
+            for code in chunk:
+                if code not in current:
+                    results["not-found"].append(code)
+                elif current[code][0] == equipment_status:
+                    results["unchanged"].append(code)
+                else:
+                    to_update.append(code)
+                    vessel_codes[code] = current[code][1]
+            if to_update:
+                db.session.execute(update(VesselEquipment.__table__).where(
+                    matches_any(VesselEquipment.code, to_update)
+                ).values(status=equipment_status))
+            results["updated"].extend(to_update)
+    return results, vessel_codes
+
+
+def update_vessel_status(vessel_code, equipment_status):
+    """Set the status of every equipment of a vessel with a single UPDATE, in the current transaction.
+
+    Returns the codes of the equipments whose status changed.
+    """
+    statement = update(VesselEquipment.__table__).where(
+        VesselEquipment.vessel_code == vessel_code,
+        VesselEquipment.status != equipment_status
+    ).values(status=equipment_status)
+    if dialect_name() == 'postgresql':
+        return [code for code, in db.session.execute(statement.returning(VesselEquipment.code))]
+    codes = [code for code, in db.session.query(VesselEquipment.code).filter(
+        VesselEquipment.vessel_code == vessel_code,
+        VesselEquipment.status != equipment_status
+    ).with_for_update()]
+    db.session.execute(statement)
+    return codes
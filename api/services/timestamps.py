@@ -0,0 +1,19 @@
+from datetime import datetime, timezone
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 date or timestamp ('2022-03-01', '2022-03-01T10:30:00Z') as an aware datetime.
+
+    Timestamps without an offset are taken as UTC.
+    Raises ValueError with a message suitable for the client if 'value' is not valid.
+    """
+    if not isinstance(value, str):
+        raise ValueError(f"'{value}' is not an ISO 8601 date or timestamp")
+    try:
+        # datetime.fromisoformat() only accepts 'Z' from Python 3.11
+        parsed = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+    except ValueError:
+        raise ValueError(f"'{value}' is not an ISO 8601 date or timestamp")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
@@ -0,0 +1,315 @@
+import csv
+import io
+import queue
+import threading
+import uuid
+
+from sqlalchemy import BigInteger, DateTime, Integer, func, text, tuple_
+
+from database.database import db, dialect_name, dialect_insert
+from database.types import GUID
+
+from api.models.operation_orders import OperationOrder
+from api.models.vessels import Vessel
+from api.models.vessel_equipments import VesselEquipment
+from api.services import partitions, rollups, versions
+from api.services.timestamps import parse_timestamp
+
+
+# Tables that can be exported and imported as CSV, in foreign key order
+TABLES = {
+    "vessels": Vessel.__table__,
+    "vessel_equipments": VesselEquipment.__table__,
+    "operation_orders": OperationOrder.__table__,
+}
+# Bytes buffered before a chunk of an export is handed to the client
+EXPORT_CHUNK_BYTES = 64 * 1024
+# Chunks of an export buffered between the COPY thread and the client
+EXPORT_QUEUE_SIZE = 16
+
+
+class TransferError(ValueError):
+    """The CSV file does not match the table. The message is suitable for the client."""
+
+
+class _ExportCancelled(Exception):
+    pass
+
+
+class _QueueWriter(object):
+    """File object handed to COPY TO STDOUT: buffers the CSV and puts it in a bounded queue.
+
+    The queue blocks COPY while the client is slower than the database, so the export runs in
+    constant memory. Setting 'cancelled' aborts the COPY at its next write.
+    """
+
+    def __init__(self, chunks, cancelled):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= EXPORT_CHUNK_BYTES:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        chunk, self.buffer = bytes(self.buffer), bytearray()
+        while True:
+            if self.cancelled.is_set():
+                raise _ExportCancelled()
+            try:
+                self.chunks.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+
+def _column_list(columns):
+    return ", ".join(f'"{column.name}"' for column in columns)
+
+
+def _copy_export(table):
+    chunks = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+    cancelled = threading.Event()
+    done = object()
+    # A connection of its own, to the replica when the request reads from it: the response is
+    # streamed after the request's session is gone
+    connection = db.session().get_bind().raw_connection()
+
+    def copy():
+        writer = _QueueWriter(chunks, cancelled)
+        try:
+            cursor = connection.cursor()
+            # A full table can outlast DB_STATEMENT_TIMEOUT_MS; LOCAL ends with the transaction
+            cursor.execute("SET LOCAL statement_timeout = 0")
+            cursor.copy_expert(
+                f"COPY (SELECT {_column_list(table.columns)} FROM {table.name} "
+                f"ORDER BY {_column_list(table.primary_key.columns)}) TO STDOUT WITH (FORMAT csv, HEADER)",
+                writer
+            )
+            writer.flush()
+            connection.rollback()
+            connection.close()
+            result = done
+        except Exception as err:
+            connection.invalidate()
+            result = err
+        if not cancelled.is_set():
+            chunks.put(result)
+
+    thread = threading.Thread(target=copy, name=f"export-{table.name}", daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        cancelled.set()
+
+
+def _rows_export(table, batch_size):
+    columns = list(table.columns)
+    rows = db.session.query(*columns).order_by(*table.primary_key.columns).execution_options(
+        stream_results=True
+    ).yield_per(batch_size)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow([column.name for column in columns])
+    for count, row in enumerate(rows, 1):
+        writer.writerow(["" if value is None else value for value in row])
+        if count % batch_size == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def export_csv(table_name, batch_size):
+    """Return a generator of the CSV chunks (bytes) of a table, with a header row, in primary key order.
+
+    PostgreSQL streams the table with COPY TO STDOUT from a separate thread; other databases
+    fetch it in batches of 'batch_size' rows. Both run in constant memory.
+    """
+    table = TABLES[table_name]
+    if dialect_name() == 'postgresql':
+        return _copy_export(table)
+    return _rows_export(table, batch_size)
+
+
+def _read_header(table, key_columns, stream):
+    header = next(csv.reader([stream.readline().decode("utf-8-sig")]), None)
+    if not header:
+        raise TransferError("The CSV file is empty")
+    unknown = [name for name in header if name not in table.columns]
+    if unknown:
+        raise TransferError(f"Unknown columns for '{table.name}': {', '.join(unknown)}")
+    if len(set(header)) != len(header):
+        raise TransferError("The CSV header has duplicate columns")
+    missing = [column.name for column in key_columns if column.name not in header]
+    if missing:
+        raise TransferError(f"Missing key columns: {', '.join(missing)}")
+    return [table.columns[name] for name in header]
+
+
+def _order_totals(imported):
+    """{equipment_code: (total_cost, orders_count)} of the imported operation orders that exist."""
+    rows = db.session.query(
+        OperationOrder.equipment_code, func.coalesce(func.sum(OperationOrder.cost), 0), func.count()
+    ).filter(imported, OperationOrder.equipment_code.isnot(None)).group_by(OperationOrder.equipment_code)
+    return {code: (int(total_cost), int(count)) for code, total_cost, count in rows}
+
+
+def _vessel_codes(imported):
+    """{code: vessel_code} of the imported equipments that exist."""
+    return dict(db.session.query(VesselEquipment.code, VesselEquipment.vessel_code).filter(imported))
+
+
+def _rollup_snapshot(table, columns):
+    """Return the function reading what the cost rollups depend on in the imported rows, or None.
+
+    It is called with a filter of the imported keys, before and after each merge.
+    """
+    if table is OperationOrder.__table__:
+        return _order_totals
+    if table is VesselEquipment.__table__ and "vessel_code" in [column.name for column in columns]:
+        return _vessel_codes
+    return None
+
+
+def _update_rollups(table, changes):
+    """Apply the (before, after) snapshots of the merges to the cost rollups, instead of rebuilding them."""
+    if table is OperationOrder.__table__:
+        deltas = {}
+        for before, after in changes:
+            for code in set(before) | set(after):
+                (old_cost, old_count), (new_cost, new_count) = before.get(code, (0, 0)), after.get(code, (0, 0))
+                total_cost, count = deltas.get(code, (0, 0))
+                deltas[code] = (total_cost + new_cost - old_cost, count + new_count - old_count)
+        rollups.apply_totals(deltas)
+    else:
+        # New equipments have no orders yet: only the existing ones that changed vessel matter
+        rollups.move_equipments([
+            (code, vessel_code, after.get(code))
+            for before, after in changes for code, vessel_code in before.items() if after.get(code) != vessel_code
+        ])
+
+
+def _copy_import(table, columns, key_columns, stream, snapshot):
+    key = _column_list(key_columns)
+    names = _column_list(columns)
+    key_names = {column.name for column in key_columns}
+    updates = ", ".join(
+        f'"{column.name}" = EXCLUDED."{column.name}"' for column in columns if column.name not in key_names
+    )
+    staging = f"{table.name}_staging"
+    connection = db.session.connection()
+    dbapi = connection.dialect.dbapi
+    cursor = connection.connection.cursor()
+    imported = text(f"({key}) IN (SELECT {key} FROM {staging})")
+    changes = []
+    try:
+        # A large file can outlast DB_STATEMENT_TIMEOUT_MS; LOCAL ends with the import's transaction
+        cursor.execute("SET LOCAL statement_timeout = 0")
+        cursor.execute(f"CREATE TEMPORARY TABLE {staging} (LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DROP")
+        cursor.copy_expert(f"COPY {staging} ({names}) FROM STDIN WITH (FORMAT csv)", stream)
+        before = snapshot(imported) if snapshot else None
+        # Merge: the last occurrence of a duplicated key is not guaranteed to win
+        cursor.execute(
+            f"INSERT INTO {table.name} ({names}) SELECT DISTINCT ON ({key}) {names} FROM {staging} ORDER BY {key} "
+            f"ON CONFLICT ({key}) " + (f"DO UPDATE SET {updates}" if updates else "DO NOTHING")
+        )
+        merged = cursor.rowcount
+        if snapshot:
+            changes.append((before, snapshot(imported)))
+    except (dbapi.DataError, dbapi.IntegrityError) as err:
+        # Raised by the DBAPI cursor, not wrapped by SQLAlchemy: malformed values or broken constraints
+        raise TransferError(f"{err}".strip())
+    return merged, changes
+
+
+def _converter(column):
+    if isinstance(column.type, GUID):
+        convert = uuid.UUID
+    elif isinstance(column.type, (Integer, BigInteger)):
+        convert = int
+    elif isinstance(column.type, DateTime):
+        convert = parse_timestamp
+    else:
+        convert = str
+    return lambda value: None if value == "" else convert(value)
+
+
+def _rows_import(table, columns, stream, chunk_size, snapshot):
+    converters = [_converter(column) for column in columns]
+    key_columns = list(table.primary_key.columns)
+    key_names = [column.name for column in key_columns]
+    reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+    merged = 0
+    changes = []
+    chunk = {}
+
+    def merge(rows):
+        insert = dialect_insert(table)
+        updates = {column.name: insert.excluded[column.name] for column in columns if not column.primary_key}
+        if updates:
+            insert = insert.on_conflict_do_update(index_elements=key_names, set_=updates)
+        else:
+            insert = insert.on_conflict_do_nothing(index_elements=key_names)
+        imported = tuple_(*key_columns).in_([tuple(row[name] for name in key_names) for row in rows])
+        before = snapshot(imported) if snapshot else None
+        count = db.session.execute(insert, rows).rowcount
+        if snapshot:
+            changes.append((before, snapshot(imported)))
+        return count
+
+    for line, values in enumerate(reader, 2):
+        if len(values) != len(columns):
+            raise TransferError(f"Line {line}: expected {len(columns)} values, found {len(values)}")
+        try:
+            row = {column.name: convert(value) for column, convert, value in zip(columns, converters, values)}
+        except ValueError as err:
+            raise TransferError(f"Line {line}: {err}")
+        chunk[tuple(row[name] for name in key_names)] = row
+        if len(chunk) == chunk_size:
+            merged += merge(list(chunk.values()))
+            chunk = {}
+    if chunk:
+        merged += merge(list(chunk.values()))
+    return merged, changes
+
+
+def import_csv(table_name, stream, chunk_size):
+    """Insert or update the rows of a CSV file (binary stream, with a header row) into a table.
+
+    The header names the columns present in the file; it must include the primary key, and the
+    partition key of a partitioned operation_orders. Rows whose key exists are updated.
+    PostgreSQL copies the file with COPY FROM STDIN into a temporary staging table and merges
+    it with one INSERT ... ON CONFLICT; other databases merge it in chunks of 'chunk_size'
+    rows. Both run in constant memory.
+
+    Runs in the current transaction. The cost rollups are updated with the changes of the
+    imported operation orders, and of the vessels of imported equipments, without rescanning
+    the tables; then the global version is bumped. Returns the number of rows inserted or updated.
+    Raises TransferError if the file does not match the table.
+    """
+    table = TABLES[table_name]
+    # A partitioned operation_orders is keyed by its primary key and partition key
+    key_columns = partitions.key_columns(table)
+    columns = _read_header(table, key_columns, stream)
+    snapshot = _rollup_snapshot(table, columns)
+    if dialect_name() == 'postgresql':
+        merged, changes = _copy_import(table, columns, key_columns, stream, snapshot)
+    else:
+        merged, changes = _rows_import(table, columns, stream, chunk_size, snapshot)
+    if changes:
+        _update_rollups(table, changes)
+    versions.bump([versions.GLOBAL_KEY])
+    return merged
@@ -0,0 +1,41 @@
+from database.database import db, dialect_insert
+
+from api.models.resource_versions import ResourceVersion
+
+
+# Bumped by maintenance operations that change data in bulk, part of every validator
+GLOBAL_KEY = "global"
+
+
+def for_vessel(vessel_code):
+    return f"vessel:{vessel_code}"
+
+
+def for_equipment(equipment_code):
+    return f"equipment:{equipment_code}"
+
+
+def for_equipment_name(equipment_name):
+    return f"equipment-name:{equipment_name}"
+
+
+def bump(keys):
+    """Increment the version counters of 'keys' in the current transaction."""
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    table = ResourceVersion.__table__
+    statement = dialect_insert(table)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={"version": table.c.version + 1}
+    ), [{"key": key, "version": 1} for key in keys])
+
+
+def current(keys):
+    """Return the version counters of 'keys' (and of GLOBAL_KEY) as a tuple, with one query."""
+    keys = sorted(set(keys) | {GLOBAL_KEY})
+    found = dict(db.session.query(ResourceVersion.key, ResourceVersion.version).filter(
+        ResourceVersion.key.in_(keys)
+    ))
+    return tuple((key, found.get(key, 0)) for key in keys)
@@ -0,0 +1,209 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from database.database import db
+
+from api.metrics import registry, LATENCY_BUCKETS
+from api.services import ingestion
+
+
+logger = logging.getLogger(__name__)
+
+ACCEPTED = registry.counter("order_queue_accepted_total", "Operation orders accepted by the write-behind queue.")
+REJECTED = registry.counter(
+    "order_queue_rejected_total", "Operation orders rejected with a 503 because the write-behind queue was full."
+)
+WRITTEN = registry.counter("order_queue_written_total", "Operation orders written by the write-behind flusher.")
+DROPPED = registry.counter(
+    "order_queue_dropped_total", "Accepted operation orders that could not be written.", ("reason",)
+)
+FLUSH_LATENCY = registry.histogram(
+    "order_queue_flush_duration_seconds", "Time spent inserting and committing a batch of queued orders.",
+    buckets=LATENCY_BUCKETS
+)
+FLUSH_SIZE = registry.histogram(
+    "order_queue_flush_size", "Operation orders per flushed batch.", buckets=(1, 10, 50, 100, 250, 500, 1000, 5000)
+)
+
+
+class QueueFull(Exception):
+    """The write-behind queue is at ORDER_QUEUE_MAX_SIZE: the client should retry later."""
+
+
+class _Flusher(object):
+    """Bounded queue of one app's accepted orders and the thread that writes them in batches."""
+
+    def __init__(self, app):
+        self.app = app
+        self.queue = queue.Queue(maxsize=app.config["ORDER_QUEUE_MAX_SIZE"])
+        self.batch_size = app.config["ORDER_FLUSH_BATCH_SIZE"]
+        self.interval = app.config["ORDER_FLUSH_INTERVAL_MS"] / 1000
+        self.retries = app.config["ORDER_FLUSH_RETRIES"]
+        self.stopping = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def put(self, order):
+        self._start()
+        try:
+            self.queue.put_nowait(order)
+        except queue.Full:
+            REJECTED.inc()
+            raise QueueFull()
+        ACCEPTED.inc()
+
+    def _start(self):
+        # The thread is started by the first order, i.e. in the worker process after any fork
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="order-flusher", daemon=True)
+                self.thread.start()
+                atexit.register(self.stop)
+
+    def _next_batch(self):
+        """Wait for an order, then collect more until the batch is full or the time window has passed."""
+        try:
+            batch = [self.queue.get(timeout=self.interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self.stopping.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            except Exception:
+                # The thread must outlive any error: a dead flusher fills the queue and hangs flush()
+                DROPPED.inc(len(batch), reason="write-failed")
+                logger.exception("Dropped %d operation orders", len(batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write_once(self, batch):
+        """Insert and commit a batch in one transaction. Returns the number of orders written."""
+        start = time.perf_counter()
+        try:
+            equipments = ingestion.lookup_equipments(order["equipment_code"] for order in batch)
+            orders = [order for order in batch if order["equipment_code"] in equipments]
+            if orders:
+                ingestion.insert_orders(orders, equipments)
+            db.session.commit()
+        except (SQLAlchemyError, TypeError, ValueError):
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+        FLUSH_LATENCY.observe(time.perf_counter() - start)
+        FLUSH_SIZE.observe(len(orders))
+        WRITTEN.inc(len(orders))
+        if len(orders) < len(batch):
+            DROPPED.inc(len(batch) - len(orders), reason="unknown-equipment")
+        return len(orders)
+
+    def _write(self, batch):
+        with self.app.app_context():
+            for attempt in range(1, self.retries + 1):
+                try:
+                    self._write_once(batch)
+                    return
+                except (SQLAlchemyError, TypeError, ValueError):
+                    logger.exception("Flushing %d operation orders failed (attempt %d/%d)",
+                                     len(batch), attempt, self.retries)
+                    time.sleep(min(self.interval * 2 ** attempt, 5))
+            # One bad order fails its whole batch: write the orders one by one, so only the bad ones are dropped
+            dropped = len(batch)
+            if len(batch) > 1:
+                for order in batch:
+                    try:
+                        self._write_once([order])
+                        dropped -= 1
+                    except (SQLAlchemyError, TypeError, ValueError):
+                        logger.exception("Writing operation order %s failed", order["id"])
+            if dropped:
+                DROPPED.inc(dropped, reason="write-failed")
+                logger.error("Dropped %d of %d operation orders after %d failed flushes",
+                             dropped, len(batch), self.retries)
+
+    def flush(self):
+        """Block until every order accepted so far is written (or dropped)."""
+        if self.thread is not None:
+            self.queue.join()
+
+    def stop(self):
+        """Write the queued orders and stop the thread (registered with atexit)."""
+        if self.thread is None:
+            return
+        self.stopping.set()
+        self.thread.join()
+
+
+class OrderQueue(object):
+    """Write-behind mode of POST /equipments/orders.
+
+    With ORDER_WRITE_BEHIND on, accepted orders are put in a queue of ORDER_QUEUE_MAX_SIZE
+    orders and written by a background thread in batches of up to ORDER_FLUSH_BATCH_SIZE
+    orders, at least every ORDER_FLUSH_INTERVAL_MS milliseconds, one transaction per batch.
+    Orders still queued when the process exits are written first. An order is acknowledged
+    before it is durable: orders in the queue are lost if the process is killed.
+    """
+
+    def init_app(self, app):
+        app.extensions["order_queue"] = _Flusher(app) if app.config["ORDER_WRITE_BEHIND"] else None
+
+    @staticmethod
+    def _flusher():
+        return current_app.extensions.get("order_queue", None)
+
+    @property
+    def enabled(self):
+        return self._flusher() is not None
+
+    def put(self, order):
+        """Queue an operation_orders row (see ingestion.parse_order). Raises QueueFull when the queue is full."""
+        order.setdefault("created_at", datetime.now(timezone.utc))
+        self._flusher().put(order)
+
+    def flush(self):
+        flusher = self._flusher()
+        if flusher is not None:
+            flusher.flush()
+
+    def stop(self):
+        flusher = self._flusher()
+        if flusher is not None:
+            flusher.stop()
+
+
+order_queue = OrderQueue()
+
+
+@registry.collector
+def _queue_samples():
+    flusher = current_app.extensions.get("order_queue", None)
+    if flusher is None:
+        return []
+    return [
+        ("order_queue_depth", "gauge", "Operation orders waiting in the write-behind queue.",
+         [({}, flusher.queue.qsize())]),
+        ("order_queue_capacity", "gauge", "Size of the write-behind queue.", [({}, flusher.queue.maxsize)]),
+    ]
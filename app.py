@@ -1,23 +1,41 @@
+import os
+
 from flask import Flask
 from flask_migrate import Migrate
 from config.config import Config
+from api.routes import admission, docs
 from api.routes.routes import api
+from api.commands.data import data_cli
+from api.commands.partitions import partitions_cli
+from api.commands.rollups import rollups_cli
 from database.database import db
-from flasgger import Swagger
+from database.pool import engine_options
+from api.cache import lookup_cache
+from api import compression, metrics, serialization
+from api.write_behind import order_queue
+from api.events import event_feed
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
-    app.config['SWAGGER'] = {
-        'title': 'FPSO Management - API Documentation',
-        'uiversion': 3
-    }
-    swagger = Swagger(app)
-    app.config.from_object(Config)
+    # The configuration class, or its import path in APP_CONFIG (e.g. 'config.config.ProductionConfig')
+    app.config.from_object(config or os.getenv('APP_CONFIG', Config))
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    docs.init_app(app)
     app.register_blueprint(api, url_prefix='/api')
 
     db.init_app(app)
+    lookup_cache.init_app(app)
+    metrics.init_app(app)
+    serialization.init_app(app)
+    order_queue.init_app(app)
+    event_feed.init_app(app)
+    admission.init_app(app)
+    compression.init_app(app)
     migrate = Migrate(app, db)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(data_cli)
+    app.cli.add_command(partitions_cli)
 
     return app
 
@@ -0,0 +1,102 @@
+"""Measure the CPU time and the bandwidth saved by each response compression coding and level.
+
+The payload is a page of operation orders encoded like GET /api/equipments/orders, and the same
+orders as an NDJSON stream compressed chunk by chunk. For each level the time to send the body
+over a --bandwidth link is added to the compression time, to pick the level of slow links.
+
+Run from the repository root:
+
+    python -m benchmarks.compression --rows 10000 --bandwidth 512
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime, timezone
+
+from app import create_app
+from config.config import TestingConfig
+from api import compression, serialization
+from api.routes.routes import OrderRow, _order_to_dict
+
+
+LEVELS = {
+    "gzip": (1, 3, 6, 9),
+    "deflate": (1, 6, 9),
+    "br": (1, 4, 6, 9, 11),
+    "zstd": (1, 3, 9, 19)
+}
+
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+
+
+def payloads(rows):
+    now = datetime.now(timezone.utc)
+    results = [
+        _order_to_dict(OrderRow(uuid.uuid4(), f"EQ{index % 5000:07d}", ("clean", "inspect", "repair")[index % 3],
+                                100 + index % 997, now, None))
+        for index in range(rows)
+    ]
+    page = serialization.dumps({"count": len(results), "orders": results, "next": None}) + b"\n"
+    lines = [serialization.dumps(result) + b"\n" for result in results]
+    return page, lines
+
+
+def measure(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def stream(coding, level, lines, flush_size):
+    compressor = compression.CODINGS[coding](level)
+    size, pending = 0, 0
+    for line in lines:
+        size += len(compressor.compress(line))
+        pending += len(line)
+        if pending >= flush_size:
+            size += len(compressor.flush())
+            pending = 0
+    return size + len(compressor.finish())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--bandwidth", type=float, default=512, help="link bandwidth in kbit/s")
+    args = parser.parse_args()
+
+    app = create_app(BenchmarkConfig)
+    flush_size = app.config["COMPRESSION_STREAM_FLUSH_SIZE"]
+    with app.app_context():
+        page, lines = payloads(args.rows)
+
+    def transfer(size):
+        return size * 8 / (args.bandwidth * 1000)
+
+    print(f"{args.rows} orders: {len(page)} bytes as a JSON page, best of {args.repeat}, "
+          f"{args.bandwidth:g} kbit/s link, streams flushed every {flush_size} bytes")
+    print(f"  {'coding':<8}{'level':>6}{'ratio':>8}{'bytes':>11}{'cpu ms':>9}{'MB/s':>8}"
+          f"{'send s':>9}{'total s':>9}{'stream bytes':>14}")
+    print(f"  {'identity':<8}{'':>6}{1:>8.2f}{len(page):>11}{0:>9.1f}{'':>8}"
+          f"{transfer(len(page)):>9.2f}{transfer(len(page)):>9.2f}{sum(len(line) for line in lines):>14}")
+    for coding in compression.available_codings():
+        for level in LEVELS[coding]:
+            seconds, compressed = measure(lambda: compression.compress(coding, level, page), args.repeat)
+            stream_size = stream(coding, level, lines, flush_size)
+            print(f"  {coding:<8}{level:>6}{len(page) / len(compressed):>8.2f}{len(compressed):>11}"
+                  f"{seconds * 1000:>9.1f}{len(page) / seconds / 1e6:>8.1f}"
+                  f"{transfer(len(compressed)):>9.2f}{seconds + transfer(len(compressed)):>9.2f}{stream_size:>14}")
+    missing = sorted(set(compression.CODINGS) - set(compression.available_codings()))
+    if missing:
+        print(f"  not installed: {', '.join(missing)}")
+
+
+if __name__ == '__main__':
+    main()
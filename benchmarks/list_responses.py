@@ -0,0 +1,94 @@
+"""Compare the list responses built from ORM instances with the stdlib encoder (before) and from
+projected rows with the configured JSON provider (after).
+
+Run from the repository root:
+
+    python -m benchmarks.list_responses --rows 100000
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import jsonify
+
+from app import create_app
+from config.config import TestingConfig
+from database.database import db
+from api import serialization
+from api.models.vessels import Vessel
+from api.models.vessel_equipments import VesselEquipment
+from api.routes.routes import EQUIPMENT_COLUMNS, OrderRow, _equipment_to_dict, _order_to_dict
+
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+
+
+def seed(rows):
+    db.metadata.create_all(db.engine, tables=[Vessel.__table__, VesselEquipment.__table__])
+    db.session.execute(Vessel.__table__.insert(), [{"code": "MV100"}])
+    db.session.execute(VesselEquipment.__table__.insert(), [
+        {"code": f"E{index:08d}", "vessel_code": "MV100", "name": "compressor", "location": "Brazil",
+         "status": "active" if index % 2 else "inactive"}
+        for index in range(rows)
+    ])
+    db.session.commit()
+
+
+def orm_response():
+    equipments = VesselEquipment.query.filter(VesselEquipment.vessel_code == "MV100").order_by(VesselEquipment.code)
+    results = [_equipment_to_dict(equipment) for equipment in equipments]
+    return jsonify({"count": len(results), "equipments": results}).get_data()
+
+
+def projected_response():
+    equipments = VesselEquipment.query.with_entities(*EQUIPMENT_COLUMNS).filter(
+        VesselEquipment.vessel_code == "MV100"
+    ).order_by(VesselEquipment.code)
+    results = [_equipment_to_dict(equipment) for equipment in equipments]
+    return serialization.json_response({"count": len(results), "equipments": results}, 200).get_data()
+
+
+def measure(function, repeat):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_app(BenchmarkConfig)
+    with app.test_request_context():
+        seed(args.rows)
+        provider = app.extensions["json_provider"].name
+        before = measure(orm_response, args.repeat)
+        after = measure(projected_response, args.repeat)
+        print(f"{args.rows} equipments, best of {args.repeat}")
+        print(f"  ORM instances + jsonify:       {before * 1000:8.1f} ms")
+        print(f"  projected rows + {provider:<13}{after * 1000:8.1f} ms ({before / after:.1f}x)")
+
+        now = datetime.now(timezone.utc)
+        results = [
+            _order_to_dict(OrderRow(uuid.uuid4(), f"E{index:08d}", "clean", index, now, None)) for index in range(args.rows)
+        ]
+        providers = [serialization.JSONProvider()]
+        if serialization.orjson is not None:
+            providers.append(serialization.OrjsonProvider())
+        for provider in providers:
+            start = time.perf_counter()
+            provider.dumps({"count": len(results), "orders": results})
+            print(f"  {args.rows} orders with UUID ids, {provider.name:<7} {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""Run every route of the API under concurrent load and report latency percentiles and throughput.
+
+Start the API against a database filled by benchmarks.fleet (with the same --vessels,
+--equipments and --names), then run from the repository root:
+
+    python -m benchmarks.load --base-url http://localhost:5000 --concurrency 16 --requests 2000 \\
+        --save results.json
+    python -m benchmarks.load ... --baseline results.json
+
+With --baseline, every endpoint whose p95 latency or throughput is worse than the baseline
+by more than --tolerance is reported and the exit status is 1. --read-only skips the routes
+that write to the database.
+"""
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+from benchmarks.fleet import vessel_code, equipment_code, equipment_name, equipment_vessel
+
+
+class Fleet(object):
+    """Picks random existing vessels and equipments of a fleet generated by benchmarks.fleet."""
+
+    def __init__(self, vessels, equipments, names, rng):
+        self.vessels = vessels
+        self.equipments = equipments
+        self.names = names
+        self.rng = rng
+
+    def vessel(self):
+        return vessel_code(self.rng.randint(1, self.vessels))
+
+    def equipment(self):
+        """Return a random (vessel code, equipment code, equipment name)."""
+        index = self.rng.randint(1, self.equipments)
+        return (vessel_code(equipment_vessel(index, self.vessels)), equipment_code(index),
+                equipment_name(index, self.names))
+
+
+def _order(fleet):
+    return {"code": fleet.equipment()[1], "type": "clean", "cost": fleet.rng.randint(100, 100000)}
+
+
+def _month(fleet):
+    start = date.today().replace(day=1) - timedelta(days=fleet.rng.randint(0, 330))
+    return start.isoformat(), (start + timedelta(days=30)).isoformat()
+
+
+def _new_equipment(fleet):
+    return {"code": f"LE{uuid.uuid4().hex[:12]}", "name": "load-test", "location": "benchmark"}
+
+
+# (name, method, path(fleet), body(fleet) or None, writes)
+SCENARIOS = (
+    ("ping", "GET", lambda f: "/api/ping", None, False),
+    ("cache stats", "GET", lambda f: "/api/cache/stats", None, False),
+    ("db pool", "GET", lambda f: "/api/db/pool", None, False),
+    ("metrics", "GET", lambda f: "/api/metrics", None, False),
+    ("vessels page", "GET", lambda f: f"/api/vessels?limit=100&after={f.vessel()}", None, False),
+    ("vessel", "GET", lambda f: f"/api/vessels/{f.vessel()}", None, False),
+    ("vessel equipments", "GET", lambda f: f"/api/vessels/{f.vessel()}/equipments", None, False),
+    ("vessel active equipments", "GET", lambda f: f"/api/vessels/{f.vessel()}/equipments?status=active",
+     None, False),
+    ("vessel equipment", "GET", lambda f: "/api/vessels/{}/equipments/{}".format(*f.equipment()[:2]), None, False),
+    ("orders page", "GET", lambda f: "/api/equipments/orders?limit=100", None, False),
+    ("equipment orders", "GET", lambda f: f"/api/equipments/{f.equipment()[1]}/orders", None, False),
+    ("total cost by code", "GET", lambda f: f"/api/equipments/orders/total-cost?code={f.equipment()[1]}",
+     None, False),
+    ("total cost by name", "GET", lambda f: f"/api/equipments/orders/total-cost?name={f.equipment()[2]}",
+     None, False),
+    ("total cost batch", "POST", lambda f: "/api/equipments/orders/total-cost",
+     lambda f: {"codes": [f.equipment()[1] for _ in range(100)]}, False),
+    ("avg cost", "GET", lambda f: f"/api/equipments/orders/avg-cost?code={f.vessel()}", None, False),
+    ("fleet cost", "GET", lambda f: f"/api/equipments/orders/fleet-cost?limit=100&after={f.vessel()}",
+     None, False),
+    ("cost analytics", "GET",
+     lambda f: "/api/equipments/orders/cost-analytics?start={}&end={}&bucket=week&group=type".format(
+         *_month(f)), None, False),
+    ("create vessel", "POST", lambda f: "/api/vessels", lambda f: {"code": f"LV{uuid.uuid4().hex[:12]}"}, True),
+    ("create equipment", "POST", lambda f: f"/api/vessels/{f.vessel()}/equipments", _new_equipment, True),
+    ("update status", "PATCH", lambda f: "/api/equipments/status",
+     lambda f: [{"code": f.equipment()[1], "status": f.rng.choice(("active", "inactive"))}], True),
+    ("create order", "POST", lambda f: "/api/equipments/orders", _order, True),
+    ("create orders bulk", "POST", lambda f: "/api/equipments/orders/bulk",
+     lambda f: [_order(f) for _ in range(100)], True),
+)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted 'values'."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+class Client(object):
+    """One keep-alive HTTP connection per worker thread."""
+
+    def __init__(self, base_url, timeout):
+        url = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._connect = lambda: connection_class(url.hostname, url.port, timeout=timeout)
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+def run_scenario(client, fleet_args, scenario, requests, concurrency, seed):
+    name, method, path, body, _ = scenario
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(worker_index):
+        fleet = Fleet(*fleet_args, rng=random.Random(f"{seed}-{name}-{worker_index}"))
+        for _ in range(worker_index, requests, concurrency):
+            request_path, request_body = path(fleet), body(fleet) if body else None
+            start = time.perf_counter()
+            try:
+                failed = client.request(method, request_path, request_body) >= 500
+            except (OSError, http.client.HTTPException):
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    duration = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput": len(latencies) / duration if duration else None,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99)
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """Return a message for every endpoint slower (p95) or with a lower throughput than the baseline."""
+    messages = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if previous["p95"] and result["p95"] > previous["p95"] * (1 + tolerance):
+            messages.append(f"{name}: p95 {previous['p95'] * 1000:.1f} ms -> {result['p95'] * 1000:.1f} ms")
+        if previous["throughput"] and result["throughput"] < previous["throughput"] * (1 - tolerance):
+            messages.append(f"{name}: throughput {previous['throughput']:.0f}/s -> {result['throughput']:.0f}/s")
+    return messages
+
+
+def _ms(value):
+    return f"{value * 1000:9.1f}" if value is not None else f"{'-':>9}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--vessels", type=int, default=500)
+    parser.add_argument("--equipments", type=int, default=200000)
+    parser.add_argument("--names", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", default="fleet")
+    parser.add_argument("--only", action="append", help="run only the endpoints with this name (repeatable)")
+    parser.add_argument("--read-only", action="store_true", help="skip the endpoints that write")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results saved in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+
+    client = Client(args.base_url, args.timeout)
+    fleet_args = (args.vessels, args.equipments, args.names)
+    scenarios = [
+        scenario for scenario in SCENARIOS
+        if not (args.read_only and scenario[4]) and (not args.only or scenario[0] in args.only)
+    ]
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    print(f"{'endpoint':<26}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    results = {}
+    for scenario in scenarios:
+        result = results[scenario[0]] = run_scenario(
+            client, fleet_args, scenario, args.requests, args.concurrency, args.seed
+        )
+        print(f"{scenario[0]:<26}{result['requests']:>9}{result['errors']:>8}{result['throughput']:>9.0f}"
+              f"{_ms(result['p50'])}{_ms(result['p95'])}{_ms(result['p99'])}")
+
+    if args.save:
+        with open(args.save, "w") as results_file:
+            json.dump({"base-url": args.base_url, "concurrency": args.concurrency, "requests": args.requests,
+                       "results": results}, results_file, indent=2)
+    if baseline is not None:
+        messages = regressions(results, baseline, args.tolerance)
+        for message in messages:
+            print(f"REGRESSION {message}")
+        if messages:
+            sys.exit(1)
+        print(f"No endpoint regressed by more than {args.tolerance:.0%} against {args.baseline}.")
+
+
+if __name__ == '__main__':
+    main()
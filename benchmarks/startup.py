@@ -0,0 +1,52 @@
+"""Measure the cold start of a worker: importing the app module, building the app with
+and without Swagger, and building the spec on the first /apispec_1.json request.
+
+Every sample runs in a fresh interpreter. Run from the repository root:
+
+    python -m benchmarks.startup --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SAMPLE = """
+import json, time
+start = time.perf_counter()
+from app import create_app
+from config.config import TestingConfig
+imported = time.perf_counter()
+app = create_app(TestingConfig)
+created = time.perf_counter()
+spec = None
+if app.config["SWAGGER_ENABLED"]:
+    app.test_client().get('/apispec_1.json')
+    spec = time.perf_counter() - created
+print(json.dumps({"import": imported - start, "create_app": created - imported, "first_spec": spec}))
+"""
+
+
+def sample(swagger_enabled):
+    env = dict(os.environ, SWAGGER_ENABLED="true" if swagger_enabled else "false")
+    output = subprocess.run([sys.executable, "-c", SAMPLE], env=env, check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    for swagger_enabled in (True, False):
+        samples = [sample(swagger_enabled) for _ in range(args.runs)]
+        print(f"SWAGGER_ENABLED={str(swagger_enabled).lower()}, median of {args.runs} runs")
+        for name in ("import", "create_app", "first_spec"):
+            values = [run[name] for run in samples if run[name] is not None]
+            if values:
+                print(f"  {name:<11}{statistics.median(values) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
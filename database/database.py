@@ -1,7 +1,35 @@
-from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
+from sqlalchemy import any_, literal
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database.routing import RoutingSQLAlchemy
+db = RoutingSQLAlchemy()
 
 
 def init_app(app):
     db.init_app(app)
     db.create_all(app=app)
+
+
+def dialect_name():
+    # Called on the session itself: the scoped_session proxy passes arguments that
+    # Flask-SQLAlchemy's session does not accept
+    return db.session().get_bind().dialect.name
+
+
+def dialect_insert(table):
+    """Return an insert() for the current database that supports ON CONFLICT clauses."""
+    if dialect_name() == 'sqlite':
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+def matches_any(column, values):
+    """Return a 'column IN values' filter.
+
+    On PostgreSQL it is rendered as 'column = ANY(:values)' with the values sent as a single
+    array parameter, so long lists neither hit the bind parameter limit nor change the
+    statement text.
+    """
+    if dialect_name() == 'postgresql':
+        return column == any_(literal(list(values), postgresql.ARRAY(column.type)))
+    return column.in_(values)
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that measures how long checkouts wait for a connection.
+
+    The wait includes opening a new connection when the pool grows into its overflow.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self.acquisitions = 0
+        self.acquire_timeouts = 0
+        self.acquire_wait_total = 0.0
+        self.acquire_wait_max = 0.0
+
+    def _do_get(self):
+        # QueuePool._do_get() calls itself again when it loses a race for an overflow slot
+        if getattr(self._local, "acquiring", False):
+            return super()._do_get()
+        self._local.acquiring = True
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.acquire_timeouts += 1
+            raise
+        finally:
+            self._local.acquiring = False
+            wait = time.perf_counter() - start
+            with self._stats_lock:
+                self.acquisitions += 1
+                self.acquire_wait_total += wait
+                self.acquire_wait_max = max(self.acquire_wait_max, wait)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "size": self.size(),
+                "checked-out": self.checkedout(),
+                "idle": self.checkedin(),
+                "overflow": max(self.overflow(), 0),
+                "max-overflow": self._max_overflow,
+                "acquisitions": self.acquisitions,
+                "acquire-timeouts": self.acquire_timeouts,
+                "acquire-wait-seconds-total": self.acquire_wait_total,
+                "acquire-wait-seconds-max": self.acquire_wait_max
+            }
+
+
+def engine_options(config):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from the DB_* settings of a configuration.
+
+    The pool settings only apply to PostgreSQL; other databases (e.g. SQLite in tests)
+    keep the pool Flask-SQLAlchemy picks for them.
+    """
+    if not config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql"):
+        return {}
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"]
+    }
+    if config["DB_STATEMENT_TIMEOUT_MS"]:
+        options["connect_args"] = {"options": f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+
+def pool_stats(engine):
+    """Return the connection pool counters of an engine."""
+    pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.stats()
+    return {"status": pool.status()}
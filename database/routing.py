@@ -0,0 +1,113 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+
+
+# Name of the replica in SQLALCHEMY_BINDS, the methods whose requests read from it and those that pin
+# the client to the primary
+REPLICA_BIND = "replica"
+READ_METHODS = ("GET", "HEAD")
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+# Cookie holding the time until which a client that wrote is served by the primary
+PIN_COOKIE = "db-primary-until"
+
+
+def _set_read_only(dbapi_connection, connection_record):
+    # A second line of defence: a write routed to the replica fails instead of diverging from the primary
+    cursor = dbapi_connection.cursor()
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor.execute("PRAGMA query_only = ON")
+    else:
+        cursor.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY")
+    cursor.close()
+    dbapi_connection.commit()
+
+
+class RoutingSession(SignallingSession):
+    """Session that reads from the replica during the requests routed to it.
+
+    Flushes always go to the primary, so a write in a GET handler never reaches the replica.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and reads_from_replica():
+            return self.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with an optional read replica, set by SQLALCHEMY_REPLICA_URI.
+
+    GET and HEAD requests read from the replica; other requests, CLI commands and background
+    threads use the primary. A client that wrote is pinned to the primary for
+    REPLICA_READ_YOUR_WRITES_SECONDS, so it reads its own writes despite the replication lag.
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        if app.config["SQLALCHEMY_REPLICA_URI"]:
+            app.config["SQLALCHEMY_BINDS"] = {
+                **(app.config.get("SQLALCHEMY_BINDS") or {}),
+                REPLICA_BIND: app.config["SQLALCHEMY_REPLICA_URI"]
+            }
+            app.before_request(_route_request)
+            app.after_request(_pin_writer)
+        super().init_app(app)
+
+    def get_engine(self, app=None, bind=None):
+        engine = super().get_engine(app, bind)
+        if bind == REPLICA_BIND and not event.contains(engine, "connect", _set_read_only):
+            event.listen(engine, "connect", _set_read_only)
+        return engine
+
+    def replica_engine(self, app=None):
+        """Return the engine of the replica, or None when it is not configured."""
+        app = self.get_app(app)
+        if not app.config.get("SQLALCHEMY_REPLICA_URI"):
+            return None
+        return self.get_engine(app, bind=REPLICA_BIND)
+
+
+def reads_from_replica():
+    """Whether the current request reads from the replica."""
+    return has_app_context() and g.get("db_bind", None) == REPLICA_BIND
+
+
+@contextmanager
+def primary_reads():
+    """Route the reads of the block to the primary, also during a request routed to the replica."""
+    bind = g.pop("db_bind", None) if has_app_context() else None
+    try:
+        yield
+    finally:
+        if bind is not None:
+            g.db_bind = bind
+
+
+def _pinned():
+    try:
+        return float(request.cookies.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _route_request():
+    if request.method in READ_METHODS and not _pinned():
+        g.db_bind = REPLICA_BIND
+
+
+def _pin_writer(response):
+    window = current_app.config["REPLICA_READ_YOUR_WRITES_SECONDS"]
+    if request.method in WRITE_METHODS and response.status_code < 400 and window:
+        response.set_cookie(PIN_COOKIE, f"{time.time() + window:.3f}", max_age=window, httponly=True, samesite="Lax")
+    return response
@@ -0,0 +1,31 @@
+import uuid
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator, CHAR
+
+
+class GUID(TypeDecorator):
+    """UUID column: PostgreSQL's native UUID type, a 32-character hex string elsewhere (e.g. SQLite).
+
+    Values are uuid.UUID instances on every database, and the hex strings sort like the UUIDs.
+    """
+
+    impl = CHAR
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=True))
+        return dialect.type_descriptor(CHAR(32))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name == 'postgresql':
+            return value
+        if not isinstance(value, uuid.UUID):
+            value = uuid.UUID(str(value))
+        return value.hex
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name == 'postgresql' or isinstance(value, uuid.UUID):
+            return value
+        return uuid.UUID(value)
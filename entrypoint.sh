@@ -1,5 +1,3 @@
 #!/usr/bin/env bash
-python -m flask db init
-python -m flask db migrate
 python -m flask db upgrade
 python -m flask run
\ No newline at end of file
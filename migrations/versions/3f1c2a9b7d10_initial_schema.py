@@ -0,0 +1,50 @@
+"""initial schema
+
+Revision ID: 3f1c2a9b7d10
+Revises:
+Create Date: 2022-01-10 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'vessels',
+        sa.Column('code', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('code')
+    )
+    op.create_table(
+        'vessel_equipments',
+        sa.Column('code', sa.String(), nullable=False),
+        sa.Column('vessel_code', sa.String(), nullable=True),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('location', sa.String(), nullable=True),
+        sa.Column('status', sa.Enum('active', 'inactive', name='status'), nullable=True),
+        sa.ForeignKeyConstraint(['vessel_code'], ['vessels.code']),
+        sa.PrimaryKeyConstraint('code')
+    )
+    op.create_table(
+        'operation_orders',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('equipment_code', sa.String(), nullable=True),
+        sa.Column('type', sa.String(), nullable=True),
+        sa.Column('cost', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['equipment_code'], ['vessel_equipments.code']),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('operation_orders')
+    op.drop_table('vessel_equipments')
+    op.drop_table('vessels')
+    sa.Enum(name='status').drop(op.get_bind(), checkfirst=True)
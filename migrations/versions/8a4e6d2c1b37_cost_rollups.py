@@ -0,0 +1,51 @@
+"""cost rollups
+
+Revision ID: 8a4e6d2c1b37
+Revises: 3f1c2a9b7d10
+Create Date: 2022-01-24 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6d2c1b37'
+down_revision = '3f1c2a9b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'equipment_cost_rollups',
+        sa.Column('equipment_code', sa.String(), nullable=False),
+        sa.Column('total_cost', sa.BigInteger(), nullable=False),
+        sa.Column('orders_count', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['equipment_code'], ['vessel_equipments.code'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('equipment_code')
+    )
+    op.create_table(
+        'vessel_cost_rollups',
+        sa.Column('vessel_code', sa.String(), nullable=False),
+        sa.Column('total_cost', sa.BigInteger(), nullable=False),
+        sa.Column('orders_count', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['vessel_code'], ['vessels.code'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('vessel_code')
+    )
+    # Backfill the rollups of the orders that already exist
+    op.execute(
+        "INSERT INTO equipment_cost_rollups (equipment_code, total_cost, orders_count) "
+        "SELECT equipment_code, coalesce(sum(cost), 0), count(id) FROM operation_orders "
+        "WHERE equipment_code IS NOT NULL GROUP BY equipment_code"
+    )
+    op.execute(
+        "INSERT INTO vessel_cost_rollups (vessel_code, total_cost, orders_count) "
+        "SELECT vessel_equipments.vessel_code, coalesce(sum(operation_orders.cost), 0), count(operation_orders.id) "
+        "FROM operation_orders JOIN vessel_equipments ON vessel_equipments.code = operation_orders.equipment_code "
+        "WHERE vessel_equipments.vessel_code IS NOT NULL GROUP BY vessel_equipments.vessel_code"
+    )
+
+
+def downgrade():
+    op.drop_table('vessel_cost_rollups')
+    op.drop_table('equipment_cost_rollups')
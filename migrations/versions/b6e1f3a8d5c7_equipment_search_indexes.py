@@ -0,0 +1,48 @@
+"""equipment search indexes
+
+Revision ID: b6e1f3a8d5c7
+Revises: f4d8b2a6c3e1
+Create Date: 2022-03-07 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b6e1f3a8d5c7'
+down_revision = 'f4d8b2a6c3e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm ships with PostgreSQL; creating it needs the CREATE privilege on the database
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Build the indexes without blocking writes to the (large) table
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_vessel_equipments_name_trgm', 'vessel_equipments', ['name'],
+            postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}, postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_vessel_equipments_location_trgm', 'vessel_equipments', ['location'],
+            postgresql_using='gin', postgresql_ops={'location': 'gin_trgm_ops'}, postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_vessel_equipments_name_prefix', 'vessel_equipments',
+            [sa.func.lower(sa.column('name')).label('name_lower')],
+            postgresql_ops={'name_lower': 'text_pattern_ops'}, postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_vessel_equipments_location_prefix', 'vessel_equipments',
+            [sa.func.lower(sa.column('location')).label('location_lower')],
+            postgresql_ops={'location_lower': 'text_pattern_ops'}, postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    op.drop_index('ix_vessel_equipments_location_prefix', table_name='vessel_equipments')
+    op.drop_index('ix_vessel_equipments_name_prefix', table_name='vessel_equipments')
+    op.drop_index('ix_vessel_equipments_location_trgm', table_name='vessel_equipments')
+    op.drop_index('ix_vessel_equipments_name_trgm', table_name='vessel_equipments')
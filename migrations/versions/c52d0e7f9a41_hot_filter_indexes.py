@@ -0,0 +1,48 @@
+"""hot filter indexes
+
+Revision ID: c52d0e7f9a41
+Revises: 8a4e6d2c1b37
+Create Date: 2022-02-07 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c52d0e7f9a41'
+down_revision = '8a4e6d2c1b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Build the indexes without blocking writes to the (large) tables
+    with op.get_context().autocommit_block():
+        _create_indexes()
+
+
+def _create_indexes():
+    op.create_index(
+        'ix_vessel_equipments_vessel_code_code', 'vessel_equipments', ['vessel_code', 'code'],
+        postgresql_include=['status'], postgresql_concurrently=True
+    )
+    op.create_index(
+        'ix_vessel_equipments_active_by_vessel', 'vessel_equipments', ['vessel_code', 'code'],
+        postgresql_include=['name', 'location'], postgresql_where=sa.text("status = 'active'"),
+        postgresql_concurrently=True
+    )
+    op.create_index(
+        'ix_vessel_equipments_name', 'vessel_equipments', ['name'],
+        postgresql_include=['code'], postgresql_concurrently=True
+    )
+    op.create_index(
+        'ix_operation_orders_equipment_code', 'operation_orders', ['equipment_code'],
+        postgresql_include=['cost'], postgresql_concurrently=True
+    )
+
+
+def downgrade():
+    op.drop_index('ix_operation_orders_equipment_code', table_name='operation_orders')
+    op.drop_index('ix_vessel_equipments_name', table_name='vessel_equipments')
+    op.drop_index('ix_vessel_equipments_active_by_vessel', table_name='vessel_equipments')
+    op.drop_index('ix_vessel_equipments_vessel_code_code', table_name='vessel_equipments')
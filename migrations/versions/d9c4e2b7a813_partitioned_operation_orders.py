@@ -0,0 +1,131 @@
+"""partitioned operation orders
+
+Revision ID: d9c4e2b7a813
+Revises: b6e1f3a8d5c7
+Create Date: 2022-03-14 12:00:00.000000
+
+Opt-in: operation_orders is only partitioned on PostgreSQL when the upgrade is run with
+
+    flask db upgrade -x orders_partitioning=range    # one partition per month of created_at
+    flask db upgrade -x orders_partitioning=hash     # ORDERS_HASH_PARTITIONS partitions of equipment_code
+
+and is left as it is otherwise. Hash partitioning makes equipment_code part of the primary key,
+so the upgrade stops first if some orders have none. The rows are copied into the new table in
+the migration's transaction, which holds an exclusive lock on operation_orders: run it in a
+maintenance window.
+To partition a database already at this revision, downgrade one revision first (the downgrade
+does nothing on a table that is not partitioned).
+"""
+from alembic import context, op
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision = 'd9c4e2b7a813'
+down_revision = 'b6e1f3a8d5c7'
+branch_labels = None
+depends_on = None
+
+# Partition key, and the primary key including it, of each strategy
+STRATEGIES = {
+    "range": ("RANGE (created_at)", "id, created_at"),
+    "hash": ("HASH (equipment_code)", "id, equipment_code"),
+}
+# Monthly partitions created after the current month ('flask partitions create' adds the next ones)
+MONTHS_AHEAD = 3
+ORDERS_HASH_PARTITIONS = 16
+NULL_EQUIPMENT_CODES = (
+    "operation_orders has orders without an equipment_code, which hash partitioning cannot store: "
+    "set or delete them first, or use orders_partitioning=range"
+)
+INDEXES = ("operation_orders_pkey", "ix_operation_orders_equipment_code", "ix_operation_orders_created_at")
+
+
+def _swap_out(old_name):
+    # Free the names of the table and of its indexes for the new table
+    op.execute(f"ALTER TABLE operation_orders RENAME TO {old_name}")
+    for index in INDEXES:
+        op.execute(f"ALTER INDEX {index} RENAME TO {index.replace('operation_orders', old_name, 1)}")
+
+
+def _copy_in(old_name, primary_key):
+    op.execute(f"ALTER TABLE operation_orders ADD PRIMARY KEY ({primary_key})")
+    op.execute(
+        "ALTER TABLE operation_orders ADD CONSTRAINT operation_orders_equipment_code_fkey "
+        "FOREIGN KEY (equipment_code) REFERENCES vessel_equipments (code)"
+    )
+    op.execute(f"INSERT INTO operation_orders SELECT * FROM {old_name}")
+    # Built once the rows are in, on every partition
+    op.execute("CREATE INDEX ix_operation_orders_equipment_code ON operation_orders (equipment_code) INCLUDE (cost)")
+    op.execute("CREATE INDEX ix_operation_orders_created_at ON operation_orders USING brin (created_at)")
+    op.execute(f"DROP TABLE {old_name}")
+
+
+def upgrade():
+    strategy = context.get_x_argument(as_dictionary=True).get("orders_partitioning")
+    if strategy is None or op.get_context().dialect.name != 'postgresql':
+        return
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown orders_partitioning '{strategy}', expected one of {', '.join(STRATEGIES)}")
+    partition_key, primary_key = STRATEGIES[strategy]
+    if strategy == "hash":
+        # equipment_code joins the primary key, which makes it NOT NULL: fail before touching anything,
+        # rather than halfway through the copy. A DO block, so that offline (--sql) scripts check it too
+        op.execute(f"""
+            DO $$
+            BEGIN
+                IF EXISTS (SELECT 1 FROM operation_orders WHERE equipment_code IS NULL) THEN
+                    RAISE EXCEPTION '{NULL_EQUIPMENT_CODES}';
+                END IF;
+            END
+            $$
+        """)
+    _swap_out("operation_orders_monolithic")
+    op.execute(
+        "CREATE TABLE operation_orders (LIKE operation_orders_monolithic INCLUDING DEFAULTS) "
+        f"PARTITION BY {partition_key}"
+    )
+    if strategy == "range":
+        # One partition per UTC month, from the oldest order to MONTHS_AHEAD months from now
+        op.execute(f"""
+            DO $$
+            DECLARE month timestamp;
+            BEGIN
+                FOR month IN SELECT generate_series(
+                    date_trunc('month', coalesce(min(created_at), now()) AT TIME ZONE 'UTC'),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{MONTHS_AHEAD} months',
+                    interval '1 month'
+                ) FROM operation_orders_monolithic
+                LOOP
+                    EXECUTE 'CREATE TABLE ' || quote_ident('operation_orders_p' || to_char(month, 'YYYYMM'))
+                        || ' PARTITION OF operation_orders FOR VALUES FROM ('
+                        || quote_literal(month AT TIME ZONE 'UTC') || ') TO ('
+                        || quote_literal((month + interval '1 month') AT TIME ZONE 'UTC') || ')';
+                END LOOP;
+            END
+            $$
+        """)
+        # Catches the orders of months without a partition, if 'flask partitions create' did not run
+        op.execute("CREATE TABLE operation_orders_default PARTITION OF operation_orders DEFAULT")
+    else:
+        for remainder in range(ORDERS_HASH_PARTITIONS):
+            op.execute(
+                f"CREATE TABLE operation_orders_h{remainder:02d} PARTITION OF operation_orders "
+                f"FOR VALUES WITH (MODULUS {ORDERS_HASH_PARTITIONS}, REMAINDER {remainder})"
+            )
+    _copy_in("operation_orders_monolithic", primary_key)
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    partitioned = op.get_bind().execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('operation_orders')"
+    )).first()
+    if partitioned is None:
+        return
+    _swap_out("operation_orders_partitioned")
+    op.execute("CREATE TABLE operation_orders (LIKE operation_orders_partitioned INCLUDING DEFAULTS)")
+    # Set by the primary key of the hash partitioned table
+    op.execute("ALTER TABLE operation_orders ALTER COLUMN equipment_code DROP NOT NULL")
+    # Drops the attached partitions; detached (archived) ones are left alone
+    _copy_in("operation_orders_partitioned", "id")
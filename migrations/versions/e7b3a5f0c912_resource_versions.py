@@ -0,0 +1,28 @@
+"""resource versions
+
+Revision ID: e7b3a5f0c912
+Revises: c52d0e7f9a41
+Create Date: 2022-02-21 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3a5f0c912'
+down_revision = 'c52d0e7f9a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'resource_versions',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('resource_versions')
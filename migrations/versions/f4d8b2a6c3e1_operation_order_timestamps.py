@@ -0,0 +1,34 @@
+"""operation order timestamps
+
+Revision ID: f4d8b2a6c3e1
+Revises: e7b3a5f0c912
+Create Date: 2022-02-28 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f4d8b2a6c3e1'
+down_revision = 'e7b3a5f0c912'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # now() is evaluated once for the existing rows: the column is added without rewriting the table
+    op.add_column('operation_orders', sa.Column(
+        'created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False
+    ))
+    op.add_column('operation_orders', sa.Column('performed_at', sa.DateTime(timezone=True), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_operation_orders_created_at', 'operation_orders', ['created_at'],
+            postgresql_using='brin', postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    op.drop_index('ix_operation_orders_created_at', table_name='operation_orders')
+    op.drop_column('operation_orders', 'performed_at')
+    op.drop_column('operation_orders', 'created_at')
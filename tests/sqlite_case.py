@@ -0,0 +1,62 @@
+"""Shared fixture of the tests that run the application on an in-memory SQLite database.
+
+Imported as 'sqlite_case': pytest and 'python -m unittest discover -s tests' both put tests/ on sys.path.
+"""
+import unittest
+
+from app import create_app
+from config.config import TestingConfig
+from database.database import db
+from api.models.operation_orders import OperationOrder
+from api.models.vessels import Vessel
+from api.models.vessel_equipments import VesselEquipment
+from api.services import rollups
+
+
+class SQLiteConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    SWAGGER_ENABLED = False
+
+
+def equipment(code, vessel_code, **values):
+    """A vessel_equipments row: an active pump in Brazil unless 'values' say otherwise."""
+    return {"code": code, "vessel_code": vessel_code, "name": "pump", "location": "Brazil", "status": "active",
+            **values}
+
+
+def seed(vessels=(), equipments=(), orders=(), rebuild_rollups=False):
+    """Insert vessel codes, vessel_equipments rows and operation_orders rows, and commit them.
+
+    Runs in the current app context. The rows are inserted as they are, without the cost
+    rollups of the orders unless 'rebuild_rollups' is set.
+    """
+    if vessels:
+        db.session.execute(Vessel.__table__.insert(), [{"code": code} for code in vessels])
+    if equipments:
+        db.session.execute(VesselEquipment.__table__.insert(), list(equipments))
+    if orders:
+        db.session.execute(OperationOrder.__table__.insert(), list(orders))
+    if rebuild_rollups:
+        rollups.rebuild()
+    db.session.commit()
+
+
+class SQLiteTestCase(unittest.TestCase):
+    """Creates the application with 'config' and the tables, then calls seed_database(), for each test."""
+
+    config = SQLiteConfig
+
+    def setUp(self) -> None:
+        self.app = create_app(self.config)
+        self.tester = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            self.seed_database()
+
+    def seed_database(self):
+        """Insert the rows every test of the case starts from (see seed()); none by default."""
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
@@ -0,0 +1,100 @@
+import threading
+import unittest
+from types import SimpleNamespace
+
+from flask import jsonify
+
+from api.routes import admission
+from sqlite_case import SQLiteConfig, SQLiteTestCase
+
+
+class AdmissionConfig(SQLiteConfig):
+    ADMISSION_LIMITS = {"aggregate": 1, "list": 0}
+    ADMISSION_QUEUE_SIZE = 1
+    ADMISSION_QUEUE_TIMEOUT_MS = 50
+
+
+class AppTestAdmission(SQLiteTestCase):
+    config = AdmissionConfig
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.running = threading.Event()
+        self.finish = threading.Event()
+
+        @admission.admit("aggregate")
+        def slow():
+            self.running.set()
+            self.finish.wait(5)
+            return jsonify({"message": "done"}), 200
+
+        @admission.admit("aggregate")
+        def streamed():
+            return self.app.response_class((chunk for chunk in (b"a", b"b")), mimetype="text/plain")
+
+        self.app.add_url_rule('/slow', view_func=slow)
+        self.app.add_url_rule('/streamed', view_func=streamed)
+        self.limiter = self.app.extensions["admission"]["aggregate"]
+
+    def tearDown(self) -> None:
+        self.finish.set()
+        super().tearDown()
+
+    def test_limiter(self):
+        limiter = admission.Limiter(limit=1, queue_size=1)
+        limiter.acquire(0)
+        with self.assertRaises(admission.Saturated) as raised:
+            limiter.acquire(0.01)
+        self.assertEqual((raised.exception.reason, limiter.waiting), ("timeout", 0))
+        waiter = threading.Thread(target=limiter.acquire, args=(5,))
+        waiter.start()
+        while limiter.waiting == 0:
+            pass
+        with self.assertRaises(admission.Saturated) as raised:
+            limiter.acquire(5)
+        self.assertEqual(raised.exception.reason, "queue-full")
+        limiter.release()
+        waiter.join()
+        self.assertEqual(limiter.active, 1)
+
+    def test_saturated_route_class_answers_503(self):
+        results = []
+        worker = threading.Thread(target=lambda: results.append(self.app.test_client().get('/slow').status_code))
+        worker.start()
+        self.running.wait(5)
+        rejected = admission.REJECTED.value(route_class="aggregate", reason="timeout")
+        response = self.app.test_client().get('/api/equipments/orders/fleet-cost')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(admission.REJECTED.value(route_class="aggregate", reason="timeout"), rejected + 1)
+        # Other route classes are not affected
+        self.assertEqual(self.app.test_client().get('/api/equipments/orders').status_code, 200)
+        self.assertEqual(self.app.test_client().get('/api/ping').status_code, 200)
+        self.finish.set()
+        worker.join()
+        self.assertEqual(results, [200])
+        self.assertEqual(self.limiter.active, 0)
+        self.assertEqual(self.app.test_client().get('/api/equipments/orders/fleet-cost').status_code, 200)
+
+    def test_streamed_response_holds_its_slot(self):
+        response = self.app.test_client().get('/streamed')
+        self.assertEqual(self.limiter.active, 1)
+        self.assertEqual(response.get_data(), b"ab")
+        self.assertEqual(self.limiter.active, 0)
+
+    def test_statement_timeout_answers_503(self):
+        with self.app.test_request_context('/'):
+            admission._record_statement_timeout(SimpleNamespace(original_exception=SimpleNamespace(pgcode="57014")))
+            self.assertTrue(admission.g.statement_timed_out)
+        with self.app.test_request_context('/'):
+            admission._record_statement_timeout(SimpleNamespace(original_exception=ValueError()))
+            self.assertFalse(admission.g.get("statement_timed_out", False))
+
+    def test_metrics(self):
+        metrics = self.app.test_client().get('/api/metrics').get_data(as_text=True)
+        self.assertIn('admission_limit{route_class="aggregate"} 1', metrics)
+        self.assertNotIn('route_class="list"', metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
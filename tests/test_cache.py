@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import patch
+
+from cachelib import SimpleCache
+
+from api.cache import CacheBackend, LRUCache, CacheLibBackend
+
+
+class AppTestLookupCache(unittest.TestCase):
+    def test_lru_cache(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        self.assertEqual(cache.get("vessel:MV100"), (False, None))
+        cache.set("vessel:MV100", {"code": "MV100"})
+        cache.set("vessel:MV101", None)
+        self.assertEqual(cache.get("vessel:MV100"), (True, {"code": "MV100"}))
+        self.assertEqual(cache.get("vessel:MV101"), (True, None))
+        cache.get("vessel:MV100")
+        cache.set("vessel:MV102", {"code": "MV102"})
+        self.assertEqual(cache.get("vessel:MV101"), (False, None))
+        cache.delete_many(["vessel:MV100"])
+        self.assertEqual(cache.get("vessel:MV100"), (False, None))
+        self.assertEqual(cache.stats(), {
+            "backend": "memory",
+            "size": 1,
+            "max-size": 2,
+            "hits": 3,
+            "misses": 3,
+            "evictions": 1,
+            "expirations": 0
+        })
+
+    def test_lru_cache_expiration(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        with patch('api.cache.time.monotonic') as mock_monotonic:
+            mock_monotonic.return_value = 1000
+            cache.set("vessel:MV100", {"code": "MV100"})
+            mock_monotonic.return_value = 1059
+            self.assertEqual(cache.get("vessel:MV100"), (True, {"code": "MV100"}))
+            mock_monotonic.return_value = 1060
+            self.assertEqual(cache.get("vessel:MV100"), (False, None))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_cachelib_backend(self):
+        cache = CacheLibBackend(SimpleCache(), ttl=60)
+        self.assertEqual(cache.get("vessel:MV100"), (False, None))
+        cache.set("vessel:MV100", None)
+        self.assertEqual(cache.get("vessel:MV100"), (True, None))
+        cache.delete_many(["vessel:MV100"])
+        self.assertEqual(cache.get("vessel:MV100"), (False, None))
+        self.assertEqual(cache.stats(), {"backend": "SimpleCache", "hits": 1, "misses": 2})
+
+    def test_incomplete_backend(self):
+        class GetOnlyBackend(CacheBackend):
+            def get(self, key):
+                return False, None
+
+        with self.assertRaises(TypeError):
+            GetOnlyBackend()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import gzip
+import unittest
+import zlib
+
+from api import compression
+from sqlite_case import SQLiteConfig, SQLiteTestCase, equipment, seed
+
+
+class CompressionConfig(SQLiteConfig):
+    COMPRESSION_STREAM_FLUSH_SIZE = 1024
+
+
+class AppTestCompression(SQLiteTestCase):
+    config = CompressionConfig
+
+    def seed_database(self):
+        seed(vessels=["MV100"], equipments=[
+            equipment(f"EQ{index:05d}", "MV100", name="compressor") for index in range(500)
+        ])
+
+    def test_small_bodies_are_not_compressed(self):
+        response = self.tester.get('/api/ping', headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.get_json(), {"message": "PONG"})
+
+    def test_negotiated_compression(self):
+        uri = '/api/vessels/MV100/equipments?limit=500'
+        plain = self.tester.get(uri)
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertIn("Accept-Encoding", plain.headers["Vary"])
+
+        response = self.tester.get(uri, headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(int(response.headers["Content-Length"]), len(response.get_data()))
+        self.assertLess(len(response.get_data()), len(plain.get_data()) / 5)
+        self.assertEqual(gzip.decompress(response.get_data()), plain.get_data())
+
+        response = self.tester.get(uri, headers={"Accept-Encoding": "gzip;q=0.5, deflate"})
+        self.assertEqual(response.headers["Content-Encoding"], "deflate")
+        self.assertEqual(zlib.decompress(response.get_data()), plain.get_data())
+
+        response = self.tester.get(uri, headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_compressed_response_keeps_validator(self):
+        uri = '/api/vessels/MV100/equipments?limit=500'
+        response = self.tester.get(uri, headers={"Accept-Encoding": "gzip"})
+        etag, weak = response.get_etag()
+        self.assertTrue(weak)
+        response = self.tester.get(uri, headers={"Accept-Encoding": "gzip", "If-None-Match": f'W/"{etag}"'})
+        self.assertEqual(response.status_code, 304)
+
+    def test_streamed_response_is_compressed_chunk_by_chunk(self):
+        uri = '/api/vessels/MV100/equipments?format=ndjson'
+        plain = self.tester.get(uri).get_data()
+        response = self.tester.get(uri, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        decoded = []
+        for chunk in response.iter_encoded():
+            decoded.append(decompressor.decompress(chunk))
+        # Each flush lets the client decode the lines received so far
+        self.assertGreater(len([part for part in decoded if part]), 2)
+        self.assertEqual(b"".join(decoded), plain)
+
+    def test_codings(self):
+        data = b'{"code":"EQ00001","name":"compressor"}\n' * 100
+        for coding in compression.available_codings():
+            self.assertLess(len(compression.compress(coding, 6, data)), len(data))
+        self.assertEqual(
+            "br" in compression.available_codings(), compression.brotli is not None
+        )
+
+    def test_incomplete_compressor(self):
+        class NoFinishCompressor(compression.Compressor):
+            def compress(self, data):
+                return data
+
+            def flush(self):
+                return b""
+
+        with self.assertRaises(TypeError):
+            NoFinishCompressor(6)
+
+    @unittest.skipIf(compression.brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        response = self.tester.get('/api/vessels/MV100/equipments?limit=500', headers={"Accept-Encoding": "br"})
+        self.assertEqual(response.headers["Content-Encoding"], "br")
+        self.assertIn(b"EQ00499", compression.brotli.decompress(response.get_data()))
+
+    @unittest.skipIf(compression.zstandard is None, "zstandard is not installed")
+    def test_zstd(self):
+        response = self.tester.get('/api/vessels/MV100/equipments?limit=500', headers={"Accept-Encoding": "zstd"})
+        self.assertEqual(response.headers["Content-Encoding"], "zstd")
+        decompressor = compression.zstandard.ZstdDecompressor().decompressobj()
+        self.assertIn(b"EQ00499", decompressor.decompress(response.get_data()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from datetime import datetime, timezone
+
+from sqlite_case import SQLiteTestCase, equipment, seed
+
+
+def _at(day, hour=12):
+    return datetime(2022, 3, day, hour, tzinfo=timezone.utc)
+
+
+class AppTestCostAnalytics(SQLiteTestCase):
+    def seed_database(self):
+        # 2022-03-07 is a Monday
+        seed(vessels=["MV100", "MV101"], equipments=[equipment("EQ1", "MV100"), equipment("EQ2", "MV101")], orders=[
+            {"equipment_code": "EQ1", "type": "clean", "cost": 100, "created_at": _at(1), "performed_at": None},
+            {"equipment_code": "EQ1", "type": "repair", "cost": 200, "created_at": _at(6, 23), "performed_at": _at(2)},
+            {"equipment_code": "EQ1", "type": "clean", "cost": 300, "created_at": _at(7, 0), "performed_at": _at(7)},
+            {"equipment_code": "EQ2", "type": "clean", "cost": 400, "created_at": _at(8), "performed_at": None},
+            {"equipment_code": "EQ2", "type": "clean", "cost": 500,
+             "created_at": datetime(2022, 4, 1, tzinfo=timezone.utc), "performed_at": None},
+        ])
+
+    def _results(self, query):
+        response = self.tester.get('/api/equipments/orders/cost-analytics?' + query)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return [
+            (result["bucket"], result[response.get_json()["group"]], result["total-cost"], result["orders-count"])
+            for result in response.get_json()["results"]
+        ]
+
+    def test_get_cost_analytics(self):
+        self.assertEqual(self._results("start=2022-03-01&end=2022-05-01"), [
+            ("2022-03-01", "MV100", 600, 3),
+            ("2022-03-01", "MV101", 400, 1),
+            ("2022-04-01", "MV101", 500, 1)
+        ])
+        self.assertEqual(self._results("start=2022-03-01&end=2022-04-01&bucket=week&group=type"), [
+            ("2022-02-28", "clean", 100, 1),
+            ("2022-02-28", "repair", 200, 1),
+            ("2022-03-07", "clean", 700, 2)
+        ])
+        self.assertEqual(self._results("start=2022-03-06&end=2022-03-08&bucket=day&group=equipment"), [
+            ("2022-03-06", "EQ1", 200, 1),
+            ("2022-03-07", "EQ1", 300, 1)
+        ])
+        self.assertEqual(self._results("start=2022-03-01&end=2022-04-01&bucket=day&time=performed_at"), [
+            ("2022-03-02", "MV100", 200, 1),
+            ("2022-03-07", "MV100", 300, 1)
+        ])
+        self.assertEqual(self._results("start=2022-03-07T00:00:00Z&end=2022-03-07T01:00:00%2B00:00"), [
+            ("2022-03-01", "MV100", 300, 1)
+        ])
+
+    def test_get_cost_analytics_bad_request(self):
+        uri = '/api/equipments/orders/cost-analytics'
+        for query in ("", "?start=2022-03-01", "?start=yesterday&end=2022-04-01",
+                      "?start=2022-04-01&end=2022-03-01", "?start=2022-03-01&end=2022-04-01&bucket=year",
+                      "?start=2022-03-01&end=2022-04-01&group=name",
+                      "?start=2022-03-01&end=2022-04-01&time=updated_at"):
+            response = self.tester.get(uri + query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn("error", response.get_json())
+
+    def test_post_operation_order_performed_at(self):
+        response = self.tester.post('/api/equipments/orders', json={
+            "code": "EQ2", "type": "repair", "cost": 50, "performed_at": "2022-03-09T08:00:00Z"
+        })
+        self.assertEqual(response.status_code, 201)
+        response = self.tester.post('/api/equipments/orders', json={
+            "code": "EQ2", "type": "repair", "cost": 50, "performed_at": "last week"
+        })
+        self.assertEqual(response.status_code, 400)
+        response = self.tester.get('/api/equipments/EQ2/orders')
+        performed = [order["performed_at"] for order in response.get_json()["orders"]]
+        self.assertIn("2022-03-09T08:00:00", performed)
+        self.assertTrue(all(order["created_at"] for order in response.get_json()["orders"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+
+from database.database import db
+from api.models.cost_rollups import EquipmentCostRollup, VesselCostRollup
+from api.models.vessels import Vessel
+from api.models.vessel_equipments import VesselEquipment
+from api.services import rollups, transfer
+from sqlite_case import SQLiteConfig, SQLiteTestCase
+
+
+class TransferConfig(SQLiteConfig):
+    NDJSON_BATCH_SIZE = 2
+    BULK_CHUNK_SIZE = 2
+
+
+ORDERS_CSV = (
+    "id,equipment_code,type,cost\n"
+    "5f0c4d8e-8f5d-4a4e-9a39-6a2b8e4f1c11,EQ1,clean,100\n"
+    "6a1d5e9f-8f5d-4a4e-9a39-6a2b8e4f1c12,EQ1,repair,250\n"
+    "7b2e6fa0-8f5d-4a4e-9a39-6a2b8e4f1c13,EQ2,clean,40\n"
+)
+
+
+class AppTestDataTransfer(SQLiteTestCase):
+    config = TransferConfig
+
+    def _post_csv(self, table, body):
+        return self.tester.post(f'/api/data/{table}.csv', data=body, content_type='text/csv')
+
+    def test_import_and_export(self):
+        response = self._post_csv('vessels', "code\nMV100\nMV101\nMV102\n")
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertEqual(response.get_json()["rows"], 3)
+        response = self._post_csv('vessel_equipments', (
+            "code,vessel_code,name,location,status\n"
+            "EQ1,MV100,pump,Brazil,active\n"
+            "EQ2,MV101,\"compressor, main\",Brazil,inactive\n"
+        ))
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertEqual(self._post_csv('operation_orders', ORDERS_CSV).status_code, 200)
+        with self.app.app_context():
+            self.assertEqual(db.session.get(EquipmentCostRollup, "EQ1").total_cost, 350)
+
+        # Rows whose key exists are updated
+        response = self._post_csv('vessel_equipments', "code,location\nEQ1,Norway\n")
+        self.assertEqual(response.status_code, 200, response.get_json())
+        with self.app.app_context():
+            equipment = db.session.get(VesselEquipment, "EQ1")
+            self.assertEqual((equipment.location, equipment.name), ("Norway", "pump"))
+
+        response = self.tester.get('/api/data/vessel_equipments.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertEqual(response.get_data(as_text=True), (
+            "code,vessel_code,name,location,status\n"
+            "EQ1,MV100,pump,Norway,active\n"
+            "EQ2,MV101,\"compressor, main\",Brazil,inactive\n"
+        ))
+        lines = self.tester.get('/api/data/operation_orders.csv').get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0], "id,equipment_code,type,cost,created_at,performed_at")
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].startswith("5f0c4d8e-8f5d-4a4e-9a39-6a2b8e4f1c11,EQ1,clean,100,"))
+        self.assertEqual(self.tester.get('/api/data/resource_versions.csv').status_code, 404)
+
+    def test_import_updates_rollups(self):
+        self._post_csv('vessels', "code\nMV100\nMV101\n")
+        self._post_csv('vessel_equipments', "code,vessel_code\nEQ1,MV100\nEQ2,MV101\n")
+        with patch('api.services.rollups.rebuild') as mock_rebuild:
+            self.assertEqual(self._post_csv('operation_orders', ORDERS_CSV).status_code, 200)
+            # Updated orders replace their old costs, also when they move to another equipment
+            response = self._post_csv('operation_orders', (
+                "id,equipment_code,cost\n"
+                "6a1d5e9f-8f5d-4a4e-9a39-6a2b8e4f1c12,EQ2,300\n"
+                "8c3f7ab1-8f5d-4a4e-9a39-6a2b8e4f1c14,EQ1,5\n"
+            ))
+            self.assertEqual(response.status_code, 200, response.get_json())
+            # Costs of equipments that change vessel follow them
+            response = self._post_csv('vessel_equipments', "code,vessel_code\nEQ1,MV101\nEQ3,MV100\n")
+            self.assertEqual(response.status_code, 200, response.get_json())
+        mock_rebuild.assert_not_called()
+        with self.app.app_context():
+            self.assertEqual(rollups.check(), [])
+            equipment = db.session.get(EquipmentCostRollup, "EQ2")
+            self.assertEqual((equipment.total_cost, equipment.orders_count), (340, 2))
+            vessel = db.session.get(VesselCostRollup, "MV101")
+            self.assertEqual((vessel.total_cost, vessel.orders_count), (445, 4))
+            self.assertEqual(db.session.get(VesselCostRollup, "MV100").orders_count, 0)
+
+    def test_import_errors(self):
+        self._post_csv('vessels', "code\nMV100\n")
+        for table, body in (
+            ('vessels', "name\nMV100\n"),
+            ('vessels', ""),
+            ('vessel_equipments', "code,vessel_code\nEQ1\n"),
+            ('vessel_equipments', "code,vessel_code,vessel_code\nEQ1,MV100,MV100\n"),
+            ('operation_orders', "id,cost\nnot-an-uuid,100\n"),
+            ('operation_orders', "id,cost\n5f0c4d8e-8f5d-4a4e-9a39-6a2b8e4f1c11,a lot\n"),
+        ):
+            response = self._post_csv(table, body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn("error", response.get_json())
+        response = self.tester.post('/api/data/vessels.csv', json={"code": "MV100"})
+        self.assertEqual(response.status_code, 400)
+        with self.app.app_context():
+            self.assertEqual(db.session.query(Vessel).count(), 1)
+
+    def test_cli(self):
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['data', 'import', 'vessels'], input="code\nMV100\nMV101\n")
+        self.assertEqual(result.exit_code, 0, result.output)
+        result = runner.invoke(args=['data', 'export', 'vessels'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertTrue(result.output.startswith("code\nMV100\nMV101\n"))
+        result = runner.invoke(args=['data', 'import', 'vessels'], input="name\nMV100\n")
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("Unknown columns", result.output)
+
+    def test_copy_export(self):
+        lines = [b"code\n"] + [f"MV{index:05d}\n".encode() for index in range(300000)]
+        connection = MagicMock()
+        connection.cursor.return_value.copy_expert.side_effect = \
+            lambda statement, output: [output.write(line) for line in lines]
+        with self.app.app_context():
+            with patch.object(db.engine, 'raw_connection', return_value=connection):
+                chunks = list(transfer._copy_export(Vessel.__table__))
+        self.assertEqual(b"".join(chunks), b"".join(lines))
+        self.assertGreater(len(chunks), 1)
+        statement = connection.cursor.return_value.copy_expert.call_args[0][0]
+        self.assertEqual(statement, 'COPY (SELECT "code" FROM vessels ORDER BY "code") TO STDOUT WITH (FORMAT csv, HEADER)')
+        connection.cursor.return_value.execute.assert_called_once_with("SET LOCAL statement_timeout = 0")
+        connection.close.assert_called_once()
+
+        # A client that goes away stops the COPY
+        with self.app.app_context():
+            with patch.object(db.engine, 'raw_connection', return_value=connection):
+                connection.reset_mock()
+                chunks = transfer._copy_export(Vessel.__table__)
+                next(chunks)
+                chunks.close()
+        for _ in range(50):
+            if connection.invalidate.called:
+                break
+            threading.Event().wait(0.1)
+        connection.invalidate.assert_called_once()
+        connection.close.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import sqlite3
+import unittest
+
+from sqlalchemy import exc
+
+from app import create_app
+from config.config import TestingConfig
+from database.pool import InstrumentedQueuePool, engine_options
+
+
+class AppTestDatabasePool(unittest.TestCase):
+    def test_engine_options(self):
+        app = create_app(TestingConfig)
+        options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        self.assertIs(options["poolclass"], InstrumentedQueuePool)
+        self.assertEqual((options["pool_size"], options["max_overflow"], options["pool_timeout"]), (2, 0, 5))
+        self.assertTrue(options["pool_pre_ping"])
+        # No connection-wide timeout by default: migrations and COPY streams share the engine
+        self.assertNotIn("connect_args", options)
+        options = engine_options({**app.config, "DB_STATEMENT_TIMEOUT_MS": 30000})
+        self.assertEqual(options["connect_args"], {"options": "-c statement_timeout=30000"})
+        self.assertEqual(engine_options({"SQLALCHEMY_DATABASE_URI": "sqlite://"}), {})
+
+    def test_instrumented_pool(self):
+        pool = InstrumentedQueuePool(lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=0, timeout=0.01)
+        connection = pool.connect()
+        self.assertEqual(pool.stats()["checked-out"], 1)
+        with self.assertRaises(exc.TimeoutError):
+            pool.connect()
+        connection.close()
+        stats = pool.stats()
+        self.assertEqual((stats["checked-out"], stats["idle"]), (0, 1))
+        self.assertEqual((stats["acquisitions"], stats["acquire-timeouts"]), (2, 1))
+        self.assertGreaterEqual(stats["acquire-wait-seconds-max"], 0.01)
+
+    def test_get_pool_stats(self):
+        app = create_app(TestingConfig)
+        response = app.test_client().get('/api/db/pool')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["primary"]["size"], 2)
+        self.assertEqual(response.get_json()["primary"]["checked-out"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
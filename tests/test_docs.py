@@ -0,0 +1,31 @@
+import unittest
+
+from app import create_app
+from config.config import TestingConfig
+
+
+class NoSwaggerConfig(TestingConfig):
+    SWAGGER_ENABLED = False
+
+
+class AppTestDocs(unittest.TestCase):
+    def test_get_apispec(self):
+        tester = create_app(TestingConfig).test_client()
+        response = tester.get('/apispec_1.json')
+        self.assertEqual(response.status_code, 200)
+        paths = response.get_json()["paths"]
+        self.assertEqual(set(paths["/api/vessels"]), {"get", "post"})
+        self.assertIn("vessels", paths["/api/vessels"]["get"]["tags"])
+        self.assertIn("get", paths["/api/equipments/{equipment_code}/orders"])
+        self.assertIn("get", paths["/api/ping"])
+        self.assertEqual(tester.get('/apidocs/').status_code, 200)
+
+    def test_swagger_disabled(self):
+        tester = create_app(NoSwaggerConfig).test_client()
+        self.assertEqual(tester.get('/apispec_1.json').status_code, 404)
+        self.assertEqual(tester.get('/apidocs/').status_code, 404)
+        self.assertEqual(tester.get('/api/ping').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
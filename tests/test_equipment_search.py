@@ -0,0 +1,100 @@
+import unittest
+
+from api.cache import lookup_cache, equipment_key
+from api.services.search import escape_like
+from sqlite_case import SQLiteConfig, SQLiteTestCase, equipment, seed
+
+
+class SearchConfig(SQLiteConfig):
+    BATCH_MAX_KEYS = 4
+
+
+class AppTestEquipmentSearch(SQLiteTestCase):
+    config = SearchConfig
+
+    def seed_database(self):
+        seed(vessels=["MV100", "MV101"], equipments=[
+            equipment("EQ001", "MV100", name="Compressor"),
+            equipment("EQ002", "MV100", name="air compressor", status="inactive"),
+            equipment("EQ003", "MV101", name="compressor_2", location="Norway"),
+            equipment("EQ004", "MV101", name="compressor%2", location="Norway"),
+            equipment("EQ005", "MV101"),
+        ])
+
+    def _codes(self, uri):
+        response = self.tester.get(uri)
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return [equipment["code"] for equipment in response.get_json()["equipments"]]
+
+    def test_escape_like(self):
+        self.assertEqual(escape_like("50%_off\\"), "50\\%\\_off\\\\")
+
+    def test_prefix_and_substring(self):
+        self.assertEqual(self._codes('/api/equipments/search?name=COMPRESSOR'), ["EQ001", "EQ003", "EQ004"])
+        self.assertEqual(self._codes('/api/equipments/search?name=compressor&match=substring'),
+                         ["EQ001", "EQ002", "EQ003", "EQ004"])
+        self.assertEqual(self._codes('/api/equipments/search?name=compressor&location=nor'), ["EQ003", "EQ004"])
+        self.assertEqual(self._codes('/api/equipments/search?name=compressor&match=substring&status=inactive'),
+                         ["EQ002"])
+        self.assertEqual(self._codes('/api/equipments/search?location=braz&vessel_code=MV101'), ["EQ005"])
+
+    def test_wildcards_match_literally(self):
+        self.assertEqual(self._codes('/api/equipments/search?name=compressor_'), ["EQ003"])
+        self.assertEqual(self._codes('/api/equipments/search?name=sor%25&match=substring'), ["EQ004"])
+
+    def test_search_pagination(self):
+        response = self.tester.get('/api/equipments/search?name=compressor&match=substring&limit=3').get_json()
+        self.assertEqual((response["count"], response["next"]), (3, "EQ003"))
+        self.assertEqual(response["equipments"][0], {
+            "code": "EQ001", "name": "Compressor", "location": "Brazil", "status": "active", "vessel_code": "MV100"
+        })
+        self.assertEqual(
+            self._codes('/api/equipments/search?name=compressor&match=substring&limit=3&after=EQ003'), ["EQ004"]
+        )
+
+    def test_invalid_search(self):
+        for uri in ('/api/equipments/search', '/api/equipments/search?name=',
+                    '/api/equipments/search?name=pump&match=fuzzy',
+                    '/api/equipments/search?name=pu&match=substring',
+                    '/api/equipments/search?name=pump&status=broken'):
+            response = self.tester.get(uri)
+            self.assertEqual(response.status_code, 400, uri)
+            self.assertIn("error", response.get_json())
+
+    def test_lookup(self):
+        response = self.tester.post('/api/equipments/lookup', json={"codes": ["EQ005", "NOPE", "EQ001", "EQ005"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {
+            "count": 2,
+            "equipments": [
+                {"code": "EQ005", "name": "pump", "location": "Brazil", "status": "active", "vessel_code": "MV101"},
+                {"code": "EQ001", "name": "Compressor", "location": "Brazil", "status": "active",
+                 "vessel_code": "MV100"}
+            ],
+            "not-found": ["NOPE"]
+        })
+
+    def test_lookup_loads_cache_misses_once(self):
+        loaded = []
+        with self.app.app_context():
+            lookup_cache.get_or_load(equipment_key("EQ001"), lambda: {"vessel_code": "MV100", "equipment": {}})
+            values = lookup_cache.get_many_or_load(
+                [equipment_key("EQ001"), equipment_key("EQ002")],
+                lambda keys: loaded.append(keys) or {equipment_key("EQ002"): {"vessel_code": "MV100"}}
+            )
+            self.assertEqual(loaded, [[equipment_key("EQ002")]])
+            self.assertEqual(values[equipment_key("EQ002")], {"vessel_code": "MV100"})
+            lookup_cache.get_many_or_load([equipment_key("EQ002")], lambda keys: loaded.append(keys) or {})
+            self.assertEqual(len(loaded), 1)
+
+    def test_invalid_lookup(self):
+        for body in ({"codes": []}, {"codes": "EQ001"}, ["EQ001"],
+                     {"codes": ["EQ001", "EQ002", "EQ003", "EQ004", "EQ005"]}):
+            response = self.tester.post('/api/equipments/lookup', json=body)
+            self.assertEqual(response.status_code, 400, body)
+        response = self.tester.post('/api/equipments/lookup', data="EQ001")
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,13 @@
 import unittest
+import uuid
+from datetime import datetime, timezone
 from unittest.mock import patch, Mock
 from sqlalchemy.exc import IntegrityError, DataError
-from sqlalchemy.orm.exc import StaleDataError
 
 from app import create_app
 from api.models.operation_orders import OperationOrder
 from api.models.vessel_equipments import VesselEquipment
+from api.routes.routes import ORDER_COLUMNS, OrderRow
 
 
 class AppTestEquipmentsEndpoints(unittest.TestCase):
@@ -15,41 +17,87 @@ class AppTestEquipmentsEndpoints(unittest.TestCase):
 
     def test_patch_equipment_status(self):
         uri = '/api/equipments/status'
-        with patch('database.database.db.session.bulk_update_mappings'):
-            with patch('database.database.db.session.commit'):
-                response = self.tester.patch(uri, json=[{
-                    "code": "5310B9D1",
-                    "status": "inactive"
-                }])
-                self.assertEqual(response.status_code, 200)
-            with patch('database.database.db.session.commit') as mock_commit:
-                mock_commit.side_effect = StaleDataError()
-                response = self.tester.patch(uri, json=[{
-                    "code": "5310B9D1",
-                    "status": "inactive"
-                }])
-                self.assertEqual(response.status_code, 400)
-                mock_commit.side_effect = DataError(orig="Data error", params=None, statement=None)
-                response = self.tester.patch(uri, json=[{
-                    "code": "5310B9D1",
-                    "status": "inactive"
-                }])
-                self.assertEqual(response.status_code, 400)
+        with patch('database.database.db.session') as mock_session:
+            mock_session.query.return_value.filter.return_value.with_for_update.return_value = [
+                ("5310B9D1", "active", "MV100"),
+                ("5310B9D2", "inactive", "MV100")
+            ]
+            response = self.tester.patch(uri, json=[{
+                "code": "5310B9D1",
+                "status": "inactive"
+            }, "5310B9D2", "5310B9D3"])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json(), {
+                "message": "Status updated!",
+                "updated": ["5310B9D1"],
+                "unchanged": ["5310B9D2"],
+                "not-found": ["5310B9D3"]
+            })
+            # One UPDATE and one version counters upsert
+            self.assertEqual(mock_session.execute.call_count, 2)
+            self.assertEqual(mock_session.commit.call_count, 1)
+
+            response = self.tester.patch(uri, json="5310B9D2")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()["unchanged"], ["5310B9D2"])
+
+            mock_session.commit.side_effect = DataError(orig="Data error", params=None, statement=None)
+            response = self.tester.patch(uri, json=["5310B9D1"])
+            self.assertEqual(response.status_code, 400)
+
+        response = self.tester.patch(uri, json=[{
+            "code": "5310B9D1",
+            "status": "broken"
+        }])
+        self.assertEqual(response.status_code, 400)
+        response = self.tester.patch(uri, json=[])
+        self.assertEqual(response.status_code, 400)
+        response = self.tester.patch(uri, data="5310B9D1")
+        self.assertEqual(response.status_code, 400)
+
+    def test_patch_vessel_equipment_status(self):
+        uri = '/api/equipments/status'
+        with patch('database.database.db.session') as mock_session:
+            mock_session.query.return_value.filter.return_value.with_for_update.return_value = [
+                ("5310B9D1",),
+                ("5310B9D2",)
+            ]
+            response = self.tester.patch(uri, json={"vessel_code": "MV100", "status": "inactive"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json(), {
+                "message": "Status updated!",
+                "updated": ["5310B9D1", "5310B9D2"]
+            })
+            self.assertEqual(mock_session.execute.call_count, 2)
 
     def test_get_operation_orders(self):
         uri = '/api/equipments/orders'
         with patch('flask_sqlalchemy._QueryProperty.__get__') as mock:
-            mock_get_sqlalchemy = mock.return_value = Mock()
-            mock_get_sqlalchemy.all.return_value = [
-                OperationOrder(equipment_code="12345", operation_type="clean", operation_cost=1000),
-                OperationOrder(equipment_code="67890", operation_type="replace", operation_cost=1234)
+            mock_get_sqlalchemy = mock.return_value.with_entities.return_value = Mock()
+            order_id = uuid.UUID("5f0c4d8e-8f5d-4a4e-9a39-6a2b8e4f1c11")
+            mock_get_sqlalchemy.order_by.return_value.limit.return_value.all.return_value = [
+                OrderRow(order_id, "12345", "clean", 1000, datetime(2022, 3, 1, 10, 30, tzinfo=timezone.utc), None),
+                OrderRow(uuid.uuid4(), "67890", "replace", 1234, datetime(2022, 3, 2, tzinfo=timezone.utc), None)
             ]
             response = self.tester.get(uri)
             self.assertEqual(response.status_code, 200)
             self.assertTrue(isinstance(response.get_json(), dict))
             self.assertEqual(response.get_json()["count"], 2)
+            self.assertIsNone(response.get_json()["next"])
+            self.assertEqual(response.get_json()["orders"][0], {
+                "id": "5f0c4d8e-8f5d-4a4e-9a39-6a2b8e4f1c11",
+                "code": "12345",
+                "type": "clean",
+                "cost": 1000,
+                "created_at": "2022-03-01T10:30:00+00:00",
+                "performed_at": None
+            })
+            mock.return_value.with_entities.assert_called_with(*ORDER_COLUMNS)
+            response = self.tester.get(uri + '?after=not-an-uuid')
+            self.assertEqual(response.status_code, 400)
 
-    def test_post_operation_orders(self):
+    @patch('api.services.ingestion.orders_written')
+    def test_post_operation_orders(self, mock_orders_written):
         uri = '/api/equipments/orders'
         with patch('database.database.db.session.add'):
             with patch('database.database.db.session.commit'):
@@ -59,6 +107,13 @@ class AppTestEquipmentsEndpoints(unittest.TestCase):
                   "type": "clean"
                 })
                 self.assertEqual(response.status_code, 201)
+                mock_orders_written.assert_called_once_with([("123456", 1000)])
+                response = self.tester.post(uri, json={
+                  "code": "123456",
+                  "cost": "a lot",
+                  "type": "clean"
+                })
+                self.assertEqual(response.status_code, 400)
                 response = self.tester.post(uri, data={
                     "code": "123456",
                     "cost": 1000,
@@ -74,7 +129,41 @@ class AppTestEquipmentsEndpoints(unittest.TestCase):
                 })
                 self.assertEqual(response.status_code, 400)
 
-    def test_get_operation_orders_with_code(self):
+    def test_post_operation_orders_bulk(self):
+        uri = '/api/equipments/orders/bulk'
+        with patch('database.database.db.session') as mock_session:
+            mock_session.query.return_value.filter.return_value = [("12345", "MV100", "compressor")]
+            response = self.tester.post(uri, json=[
+                {"code": "12345", "cost": 1000, "type": "clean"},
+                {"code": "67890", "cost": 1000, "type": "clean"},
+                {"code": "12345", "cost": "a lot", "type": "clean"},
+                {"code": "12345", "cost": "500", "type": "replacement"}
+            ])
+            self.assertEqual(response.status_code, 207)
+            data = response.get_json()
+            self.assertEqual((data["created"], data["failed"]), (2, 2))
+            self.assertEqual([result["status"] for result in data["results"]],
+                             ["created", "failed", "failed", "created"])
+            self.assertEqual(data["results"][1]["error"], "Equipment '67890' does not exist")
+            self.assertEqual(mock_session.commit.call_count, 1)
+            inserted = mock_session.execute.call_args_list[0][0][1]
+            self.assertEqual([(row["equipment_code"], row["cost"]) for row in inserted], [("12345", 1000), ("12345", 500)])
+
+            response = self.tester.post(
+                uri,
+                data='{"code": "12345", "cost": 1000, "type": "clean"}\n\nnot json\n',
+                content_type='application/x-ndjson'
+            )
+            self.assertEqual(response.status_code, 207)
+            self.assertEqual([result["status"] for result in response.get_json()["results"]], ["created", "failed"])
+
+            response = self.tester.post(uri, json=[{"code": "12345", "cost": 1000, "type": "clean"}])
+            self.assertEqual(response.status_code, 201)
+            response = self.tester.post(uri, json={"code": "12345", "cost": 1000, "type": "clean"})
+            self.assertEqual(response.status_code, 400)
+
+    @patch('api.services.versions.current', return_value=(("equipment:12345", 1), ("global", 0)))
+    def test_get_operation_orders_with_code(self, mock_versions):
         uri = '/api/equipments/12345/orders'
         with patch('flask_sqlalchemy._QueryProperty.__get__') as mock:
             mock.return_value.filter.return_value.first.return_value = OperationOrder(
@@ -86,6 +175,33 @@ class AppTestEquipmentsEndpoints(unittest.TestCase):
             self.assertEqual(response.status_code, 200)
             self.assertTrue(isinstance(response.get_json(), dict))
 
+    def test_get_operation_orders_with_code_not_modified(self):
+        uri = '/api/equipments/12345/orders'
+        with patch('api.services.versions.current') as mock_versions:
+            mock_versions.return_value = (("equipment:12345", 1), ("global", 0))
+            with patch('flask_sqlalchemy._QueryProperty.__get__') as mock:
+                mock.return_value.filter.return_value = [OperationOrder(
+                    equipment_code="12345",
+                    operation_type="clean",
+                    operation_cost=1000
+                )]
+                response = self.tester.get(uri)
+                self.assertEqual(response.status_code, 200)
+                etag = response.headers["ETag"]
+                mock.reset_mock()
+
+                response = self.tester.get(uri, headers={"If-None-Match": etag})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.headers["ETag"], etag)
+                self.assertEqual(response.get_data(), b"")
+                mock.assert_not_called()
+                mock_versions.assert_called_with(["equipment:12345"])
+
+                mock_versions.return_value = (("equipment:12345", 2), ("global", 0))
+                response = self.tester.get(uri, headers={"If-None-Match": etag})
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response.headers["ETag"], etag)
+
     def test_get_total_cost(self):
         with patch('flask_sqlalchemy._QueryProperty.__get__') as mock:
             mock.return_value.filter.return_value = [
@@ -104,21 +220,106 @@ class AppTestEquipmentsEndpoints(unittest.TestCase):
             response = self.tester.get(uri)
             self.assertEqual(response.status_code, 400)
 
-        with patch('database.database.db.session') as mock_count:
-            mock_count.query.return_value.join.return_value.filter.return_value.count.return_value = 2
+        with patch('database.database.db.session') as mock_session:
+            mock_filter = mock_session.query.return_value.filter.return_value
+            mock_filter.__iter__.return_value = iter([("12345", 2000, 2)])
             uri = '/api/equipments/orders/total-cost?code=12345'
             response = self.tester.get(uri)
             self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json(), {"total-cost": 2000, "count": 2})
+
+            mock_filter.__iter__.side_effect = [
+                iter([("12345", 2000, 2)]),
+                iter([("12345", "a-uuid"), ("12345", "b-uuid")])
+            ]
+            uri = '/api/equipments/orders/total-cost?code=12345&orders=true'
+            response = self.tester.get(uri)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()["orders"], ["a-uuid", "b-uuid"])
+
+        with patch('database.database.db.session') as mock_session:
+            mock_query = mock_session.query.return_value.join.return_value
+            mock_query.filter.return_value.group_by.return_value = []
+            uri = '/api/equipments/orders/total-cost?name=compressor'
+            response = self.tester.get(uri)
+            self.assertEqual(response.status_code, 404)
+
+    def test_post_total_cost_batch(self):
+        uri = '/api/equipments/orders/total-cost'
+        with patch('database.database.db.session') as mock_session:
+            mock_session.query.return_value.filter.return_value = [("12345", 2000, 2)]
+            response = self.tester.post(uri, json={"codes": ["12345", "67890", "12345"]})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json(), {
+                "count": 2,
+                "total-costs": [
+                    {"code": "12345", "total-cost": 2000, "count": 2},
+                    {"code": "67890", "total-cost": 0, "count": 0}
+                ]
+            })
+            self.assertEqual(mock_session.query.call_count, 1)
+
+            response = self.tester.post(uri, json={"codes": ["12345"], "names": ["compressor"]})
+            self.assertEqual(response.status_code, 400)
+            response = self.tester.post(uri, json={"codes": []})
+            self.assertEqual(response.status_code, 400)
+            response = self.tester.post(uri, data={"codes": ["12345"]})
+            self.assertEqual(response.status_code, 400)
 
     def test_get_avg_cost(self):
-        with patch('database.database.db.session') as mock_count:
-            mock_count.query.return_value.join.return_value.filter.return_value.count.return_value = 2
+        with patch('database.database.db.session') as mock_session:
+            mock_first = mock_session.query.return_value.filter.return_value.first
+            mock_first.return_value = (3000, 2)
             uri = '/api/equipments/orders/avg-cost'
             response = self.tester.get(uri)
             self.assertEqual(response.status_code, 400)
             uri = '/api/equipments/orders/avg-cost?code=MV100'
             response = self.tester.get(uri)
             self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json(), {"code": "MV100", "avg-cost": 1500})
+            mock_first.return_value = None
+            response = self.tester.get(uri)
+            self.assertEqual(response.status_code, 404)
+
+    def test_get_fleet_cost(self):
+        uri = '/api/equipments/orders/fleet-cost?limit=2'
+        with patch('api.services.costs.vessel_summaries') as mock_summaries:
+            mock_summaries.return_value = [
+                ("MV100", 3000, 2, 3, 1),
+                ("MV101", 0, 0, 1, 0),
+                ("MV102", 500, 1, 1, 0)
+            ]
+            response = self.tester.get(uri)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json(), {
+                "count": 2,
+                "next": "MV101",
+                "vessels": [{
+                    "code": "MV100",
+                    "avg-cost": 1500,
+                    "total-cost": 3000,
+                    "orders-count": 2,
+                    "active-equipments": 3,
+                    "inactive-equipments": 1
+                }, {
+                    "code": "MV101",
+                    "avg-cost": None,
+                    "total-cost": 0,
+                    "orders-count": 0,
+                    "active-equipments": 1,
+                    "inactive-equipments": 0
+                }]
+            })
+            mock_summaries.assert_called_with(vessel_codes=None, after=None, limit=3)
+            response = self.tester.get('/api/equipments/orders/fleet-cost?code=MV100&code=MV102&after=MV100')
+            self.assertEqual(response.status_code, 200)
+            mock_summaries.assert_called_with(vessel_codes=["MV100", "MV102"], after="MV100", limit=101)
+            response = self.tester.get('/api/equipments/orders/fleet-cost?limit=0')
+            self.assertEqual(response.status_code, 400)
+            self.app.config["BATCH_MAX_KEYS"] = 2
+            response = self.tester.get('/api/equipments/orders/fleet-cost?code=MV100&code=MV101&code=MV102')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("At most 2 codes", response.get_json()["error"])
 
 
 if __name__ == '__main__':
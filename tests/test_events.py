@@ -0,0 +1,107 @@
+import json
+import unittest
+
+from database.database import db
+from api import events
+from api.models.vessel_equipments import VesselEquipment
+from sqlite_case import SQLiteConfig, SQLiteTestCase, equipment, seed
+
+
+class EventsConfig(SQLiteConfig):
+    EVENTS_HISTORY_SIZE = 5
+    EVENTS_CLIENT_BUFFER_SIZE = 10
+    EVENTS_KEEPALIVE_SECONDS = 0.01
+
+
+def _parse(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.decode("utf-8").strip().split("\n"))
+    return fields.get("id", None), fields["event"], json.loads(fields["data"])
+
+
+class AppTestEvents(SQLiteTestCase):
+    config = EventsConfig
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.broker = self.app.extensions["events"]
+
+    def seed_database(self):
+        seed(vessels=["MV100", "MV200"], equipments=[equipment("EQ1", "MV100"), equipment("EQ2", "MV200")])
+
+    def _events(self, response, count):
+        # Read 'count' events from a stream, skipping the retry field and the keepalive comments
+        received = []
+        chunks = response.iter_encoded()
+        while len(received) < count:
+            chunk = next(chunks)
+            if chunk.startswith(b"event:") or chunk.startswith(b"id:"):
+                received.append(_parse(chunk))
+        return received
+
+    def test_stream_committed_changes(self):
+        response = self.tester.get('/api/vessels/MV100/events')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        self.assertEqual(self.broker.subscriber_count(), 1)
+        self.tester.post('/api/equipments/orders', json={"code": "EQ1", "type": "clean", "cost": 10})
+        self.tester.post('/api/equipments/orders', json={"code": "EQ2", "type": "clean", "cost": 20})
+        self.tester.patch('/api/equipments/status', json=["EQ1", "EQ2"])
+        self.tester.post('/api/vessels/MV100/equipments', json={"code": "EQ3", "name": "valve", "location": "Brazil"})
+        self.tester.post('/api/equipments/orders/bulk', json=[{"code": "EQ3", "type": "inspect", "cost": 5}])
+
+        received = self._events(response, 4)
+        self.assertEqual([event_type for _, event_type, _ in received],
+                         [events.ORDER_CREATED, events.EQUIPMENT_STATUS, events.EQUIPMENT_CREATED, events.ORDER_CREATED])
+        self.assertEqual((received[0][2]["code"], received[0][2]["cost"]), ("EQ1", 10))
+        self.assertEqual(received[1][2], {"code": "EQ1", "status": "inactive"})
+        self.assertEqual(received[2][2]["code"], "EQ3")
+        self.assertEqual(received[3][2]["code"], "EQ3")
+        response.close()
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+    def test_rolled_back_changes_are_not_published(self):
+        with self.app.app_context():
+            db.session.execute(VesselEquipment.__table__.update().values(status="inactive"))
+            events.event_feed.stage("MV100", events.EQUIPMENT_STATUS, {"code": "EQ1", "status": "inactive"})
+            db.session.rollback()
+            db.session.commit()
+        self.assertEqual(len(self.broker.history), 0)
+
+    def test_resume_from_last_event_id(self):
+        self.tester.patch('/api/equipments/status', json=["EQ1"])
+        self.tester.patch('/api/equipments/status', json=[{"code": "EQ1", "status": "active"}])
+        first_id = self.broker.history[0].id
+        response = self.tester.get('/api/vessels/MV100/events', headers={"Last-Event-ID": first_id})
+        self.assertEqual(self._events(response, 1)[0][2], {"code": "EQ1", "status": "active"})
+        response.close()
+        # Ids that are no longer in the history get a reset event
+        response = self.tester.get('/api/vessels/MV100/events', headers={"Last-Event-ID": "unknown"})
+        self.assertEqual(self._events(response, 1)[0], (None, events.RESET, {}))
+        response.close()
+
+    def test_slow_subscriber_is_dropped(self):
+        self.broker.buffer_size = 3
+        subscription = self.broker.subscribe("MV100")
+        for index in range(5):
+            self.broker.dispatch([events.Event(str(index), "MV100", events.EQUIPMENT_STATUS, {})])
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual([subscription.get(0).id for _ in range(3)], ["0", "1", "2"])
+        with self.assertRaises(events.queue.Empty):
+            subscription.get(0)
+        subscription.close()
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+    def test_get_events_of_unknown_vessel(self):
+        self.assertEqual(self.tester.get('/api/vessels/MV999/events').status_code, 404)
+
+    def test_notify_payloads(self):
+        changes = [events.Event(f"{index:032d}", "MV100", events.ORDER_CREATED, {"code": "EQ1" * 100})
+                   for index in range(100)]
+        payloads = list(events._payloads(changes))
+        self.assertGreater(len(payloads), 1)
+        self.assertTrue(all(len(payload) <= events.NOTIFY_PAYLOAD_MAX_SIZE for payload in payloads))
+        self.assertEqual([events.Event(*change) for payload in payloads for change in json.loads(payload)], changes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+from flask import g
+from sqlalchemy import create_engine, exc, text
+
+from app import create_app
+from config.config import TestingConfig
+from api import metrics
+
+
+class SlowRequestConfig(TestingConfig):
+    SLOW_REQUEST_LOG_MS = 0
+
+
+class AppTestMetrics(unittest.TestCase):
+    def test_histogram(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", ("route",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, route="/a")
+        histogram.observe(0.5, route="/a")
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{route="/a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{route="/a",le="1.0"} 2', lines)
+        self.assertIn('test_seconds_bucket{route="/a",le="+Inf"} 2', lines)
+        self.assertIn('test_seconds_count{route="/a"} 2', lines)
+        self.assertEqual(histogram.count(route="/a"), 2)
+
+    def test_get_metrics(self):
+        app = create_app(TestingConfig)
+        client = app.test_client()
+        before = metrics.REQUESTS.value(endpoint="/api/ping", method="GET", status="200")
+        client.get('/api/ping')
+        self.assertEqual(metrics.REQUESTS.value(endpoint="/api/ping", method="GET", status="200"), before + 1)
+
+        response = client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        body = response.get_data(as_text=True)
+        self.assertIn('http_requests_total{endpoint="/api/ping",method="GET",status="200"}', body)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="/api/ping",method="GET",le="+Inf"}', body)
+        self.assertIn('http_request_sql_statements_count{endpoint="/api/ping",method="GET"}', body)
+        self.assertIn('db_pool_size{pool="primary"} 2', body)
+        self.assertIn('# TYPE db_pool_acquisitions counter', body)
+        self.assertIn('lookup_cache_hits_total{backend="memory"}', body)
+
+    def test_unmatched_routes_share_a_label(self):
+        app = create_app(TestingConfig)
+        before = metrics.REQUESTS.value(endpoint="unmatched", method="GET", status="404")
+        app.test_client().get('/api/nothing/here')
+        self.assertEqual(metrics.REQUESTS.value(endpoint="unmatched", method="GET", status="404"), before + 1)
+
+    def test_sql_statements_per_request(self):
+        app = create_app(SlowRequestConfig)
+        engine = create_engine("sqlite://")
+        with app.test_request_context('/api/ping'):
+            metrics._start_request()
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+                connection.execute(text("SELECT 2"))
+            self.assertEqual(g.sql_stats["count"], 2)
+            with self.assertLogs(app.logger, level="WARNING") as logs:
+                metrics._finish_request(app.response_class())
+        self.assertIn("2 SQL statements", logs.output[0])
+        self.assertIn("SELECT 2", logs.output[0])
+
+    def test_failed_statements_do_not_leak_timings(self):
+        engine = create_engine("sqlite://")
+        with engine.connect() as connection:
+            for _ in range(3):
+                with self.assertRaises(exc.OperationalError):
+                    connection.execute(text("SELECT * FROM missing_table"))
+            self.assertNotIn("query_start_time", connection.info)
+            statements = metrics.STATEMENTS.value()
+            connection.execute(text("SELECT 1"))
+            self.assertNotIn("query_start_time", connection.info)
+        self.assertEqual(metrics.STATEMENTS.value(), statements + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from database.database import db
+from api.models.cost_rollups import EquipmentCostRollup, VesselCostRollup
+from api.models.operation_orders import OperationOrder
+from api.services import partitions, rollups
+from sqlite_case import SQLiteTestCase, equipment, seed
+
+
+def _month(year, month):
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+class AppTestPartitions(SQLiteTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.runner = self.app.test_cli_runner()
+
+    def seed_database(self):
+        seed(vessels=["MV100"], equipments=[equipment("EQ1", "MV100"), equipment("EQ2", "MV100")], orders=[
+            {"equipment_code": "EQ1", "type": "clean", "cost": 100, "created_at": _month(2022, 1)},
+            {"equipment_code": "EQ1", "type": "clean", "cost": 200, "created_at": _month(2022, 2)},
+            {"equipment_code": "EQ2", "type": "clean", "cost": 400, "created_at": _month(2022, 3)},
+        ], rebuild_rollups=True)
+
+    def test_months(self):
+        self.assertEqual(partitions.month_start(datetime(2022, 3, 31, 23, tzinfo=timezone.utc)), _month(2022, 3))
+        self.assertEqual(partitions.add_months(_month(2022, 11), 3), _month(2023, 2))
+        self.assertEqual(partitions.add_months(_month(2022, 1), -1), _month(2021, 12))
+        self.assertEqual(partitions.partition_name(_month(2022, 3)), "operation_orders_p202203")
+        self.assertEqual(partitions._parse_bound("2022-03-01 00:00:00+00"), _month(2022, 3))
+
+    def test_plain_table(self):
+        with self.app.app_context():
+            self.assertIsNone(partitions.strategy())
+            self.assertEqual([column.name for column in partitions.key_columns(OperationOrder.__table__)], ["id"])
+        result = self.runner.invoke(args=['partitions', 'list'])
+        self.assertIn("not partitioned", result.output)
+        result = self.runner.invoke(args=['partitions', 'create'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("orders_partitioning=range", result.output)
+
+    @patch('api.services.partitions.strategy', return_value="range")
+    def test_create_partitions(self, mock_strategy):
+        existing = [{"name": "operation_orders_p202203", "bound": "", "rows": 0,
+                     "start": _month(2022, 3), "end": _month(2022, 4)}]
+        with self.app.app_context():
+            with patch('api.services.partitions.list_partitions', return_value=existing):
+                with patch('database.database.db.session.execute') as mock_execute:
+                    created = partitions.create_partitions(2, now=datetime(2022, 3, 15, tzinfo=timezone.utc))
+        self.assertEqual(created, ["operation_orders_p202204", "operation_orders_p202205"])
+        self.assertIn(
+            "FOR VALUES FROM ('2022-04-01T00:00:00+00:00') TO ('2022-05-01T00:00:00+00:00')",
+            str(mock_execute.call_args_list[0].args[0])
+        )
+
+    @patch('api.services.partitions.strategy', return_value="range")
+    def test_detach_partitions(self, mock_strategy):
+        existing = [
+            {"name": "operation_orders_p202201", "bound": "", "rows": 1,
+             "start": _month(2022, 1), "end": _month(2022, 2)},
+            {"name": "operation_orders_p202202", "bound": "", "rows": 1,
+             "start": _month(2022, 2), "end": _month(2022, 3)},
+            {"name": "operation_orders_default", "bound": "DEFAULT", "rows": 0},
+        ]
+        with self.app.app_context():
+            with patch('api.services.partitions.list_partitions', return_value=existing):
+                with patch('api.services.partitions._remove_from_rollups') as mock_remove:
+                    with patch('database.database.db.session.execute') as mock_execute:
+                        detached = partitions.detach_partitions(_month(2022, 2), archive_schema="archive")
+        self.assertEqual(detached, ["operation_orders_p202201"])
+        mock_remove.assert_called_once_with("operation_orders_p202201")
+        statements = [str(call.args[0]) for call in mock_execute.call_args_list]
+        self.assertIn('ALTER TABLE operation_orders DETACH PARTITION "operation_orders_p202201"', statements)
+        self.assertIn('ALTER TABLE "operation_orders_p202201" SET SCHEMA "archive"', statements)
+
+    def test_remove_totals(self):
+        with self.app.app_context():
+            rollups.remove_totals({"EQ1": (100, 1)})
+            db.session.commit()
+            self.assertEqual(db.session.get(EquipmentCostRollup, "EQ1").total_cost, 200)
+            vessel = db.session.get(VesselCostRollup, "MV100")
+            self.assertEqual((vessel.total_cost, vessel.orders_count), (600, 2))
+
+    def test_costs_of_a_date_range(self):
+        response = self.tester.get('/api/equipments/orders/total-cost?code=EQ1&start=2022-02-01&orders=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["total-cost"], 200)
+        self.assertEqual(len(response.get_json()["orders"]), 1)
+        response = self.tester.get('/api/equipments/orders/total-cost?code=EQ1')
+        self.assertEqual(response.get_json()["total-cost"], 300)
+
+        response = self.tester.post('/api/equipments/orders/total-cost', json={
+            "names": ["pump"], "start": "2022-01-15", "end": "2022-03-01"
+        })
+        self.assertEqual(response.get_json()["total-costs"], [{"name": "pump", "total-cost": 200, "count": 1}])
+
+        response = self.tester.get('/api/equipments/orders/avg-cost?code=MV100&end=2022-03-01')
+        self.assertEqual(response.get_json()["avg-cost"], 150)
+        response = self.tester.get('/api/equipments/orders/avg-cost?code=MV100&start=2023-01-01')
+        self.assertEqual(response.status_code, 404)
+
+        for uri in ('/api/equipments/orders/total-cost?code=EQ1&start=2022-03-01&end=2022-02-01',
+                    '/api/equipments/orders/avg-cost?code=MV100&start=March'):
+            self.assertEqual(self.tester.get(uri).status_code, 400, uri)
+
+
+if __name__ == '__main__':
+    unittest.main()
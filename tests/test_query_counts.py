@@ -0,0 +1,164 @@
+import unittest
+
+from sqlalchemy import event
+
+from database.database import db
+from api.cache import lookup_cache
+from api.models.operation_orders import OperationOrder
+from api.models.vessels import Vessel
+from api.models.vessel_equipments import VesselEquipment
+from sqlite_case import SQLiteConfig, SQLiteTestCase, equipment, seed
+
+
+class QueryCountsConfig(SQLiteConfig):
+    # Rows per chunk of the CSV imports of CSV_IMPORT_BUDGETS
+    BULK_CHUNK_SIZE = 100
+
+
+# Most SQL statements each route may execute: (method, uri, body, budget). Bodies are sent as JSON,
+# or as CSV when they are strings
+BUDGETS = (
+    ('GET', '/api/ping', None, 0),
+    ('GET', '/api/metrics', None, 0),
+    ('GET', '/api/cache/stats', None, 0),
+    ('GET', '/api/db/pool', None, 0),
+    ('GET', '/api/data/vessels.csv', None, 1),
+    ('GET', '/api/data/vessel_equipments.csv', None, 1),
+    ('GET', '/api/data/operation_orders.csv', None, 1),
+    ('GET', '/api/vessels', None, 1),
+    ('GET', '/api/vessels/MV001', None, 1),
+    ('GET', '/api/vessels/MV001/equipments', None, 2),
+    ('GET', '/api/vessels/MV001/equipments?status=active', None, 2),
+    ('GET', '/api/vessels/MV001/equipments/EQ0001', None, 1),
+    ('GET', '/api/vessels/MV001/events', None, 1),
+    ('GET', '/api/equipments/search?name=NAME-&match=prefix', None, 1),
+    ('GET', '/api/equipments/search?location=razi&match=substring&status=active', None, 1),
+    ('GET', '/api/equipments/orders', None, 1),
+    ('GET', '/api/equipments/EQ0001/orders', None, 2),
+    ('GET', '/api/equipments/orders/total-cost?code=EQ0001', None, 2),
+    ('GET', '/api/equipments/orders/total-cost?code=EQ0001&orders=true', None, 3),
+    ('GET', '/api/equipments/orders/total-cost?name=name-1', None, 2),
+    ('GET', '/api/equipments/orders/total-cost?name=name-1&orders=true', None, 3),
+    ('POST', '/api/equipments/orders/total-cost', {"codes": ["EQ0001", "EQ0002", "EQ0003"], "orders": True}, 2),
+    ('POST', '/api/equipments/orders/total-cost', {"names": ["name-0", "name-1"]}, 1),
+    ('GET', '/api/equipments/orders/total-cost?code=EQ0001&start=2000-01-01&orders=true', None, 3),
+    ('GET', '/api/equipments/orders/avg-cost?code=MV001', None, 2),
+    ('GET', '/api/equipments/orders/avg-cost?code=MV001&start=2000-01-01&end=2100-01-01', None, 2),
+    ('GET', '/api/equipments/orders/fleet-cost', None, 1),
+    ('GET', '/api/equipments/orders/cost-analytics?start=2000-01-01&end=2100-01-01&bucket=week', None, 1),
+    ('POST', '/api/equipments/lookup', {"codes": ["EQ0001", "EQ0002", "NOPE"]}, 1),
+    ('POST', '/api/vessels', [{"code": "NEW01"}, {"code": "NEW02"}, {"code": "MV001"}], 2),
+    ('POST', '/api/vessels/MV001/equipments',
+     [{"code": "NEW01", "name": "pump", "location": "Brazil"},
+      {"code": "NEW02", "name": "pump", "location": "Brazil"}], 4),
+    ('POST', '/api/equipments/orders', {"code": "EQ0001", "type": "clean", "cost": 100}, 6),
+    ('POST', '/api/equipments/orders/bulk',
+     [{"code": "EQ0001", "type": "clean", "cost": 100}, {"code": "EQ0002", "type": "clean", "cost": 200}], 5),
+    ('PATCH', '/api/equipments/status', ["EQ0001", {"code": "EQ0002", "status": "inactive"}], 3),
+    ('PATCH', '/api/equipments/status', {"vessel_code": "MV002", "status": "inactive"}, 3),
+    ('POST', '/api/data/vessels.csv', "code\nCSV01\nMV001\n", 2),
+    ('POST', '/api/data/vessel_equipments.csv', "code,vessel_code\nCSV-EQ1,MV001\nEQ0001,MV002\n", 6),
+    ('POST', '/api/data/operation_orders.csv',
+     "id,equipment_code,type,cost\n"
+     "5f0c4d8e-8f5d-4a4e-9a39-6a2b8e4f1c11,EQ0001,clean,100\n"
+     "6a1d5e9f-8f5d-4a4e-9a39-6a2b8e4f1c12,EQ0002,repair,250\n", 7),
+)
+# CSV imports run a few statements per chunk of BULK_CHUNK_SIZE rows: (table, header, row format,
+# budget of the statements run once, budget per chunk)
+CSV_IMPORT_BUDGETS = (
+    ('vessels', "code", "CSV{index:05d}", 1, 1),
+    ('operation_orders', "id,equipment_code,type,cost", "00000000-0000-4000-8000-{index:012d},EQ0001,clean,1", 4, 3),
+)
+
+
+class AppTestQueryCounts(SQLiteTestCase):
+    """Count the SQL statements of every route on an in-memory SQLite database.
+
+    Every route is run on a small fleet and on a fleet twice as large: the counts must stay
+    within the route's budget and must not grow with the data (no N+1 queries).
+    """
+
+    config = QueryCountsConfig
+
+    def _seed(self, vessels, equipments_per_vessel, orders_per_equipment):
+        with self.app.app_context():
+            db.session.execute(Vessel.__table__.delete().where(Vessel.code.like("NEW%")))
+            db.session.execute(OperationOrder.__table__.delete())
+            db.session.execute(VesselEquipment.__table__.delete())
+            db.session.execute(Vessel.__table__.delete())
+            codes = [f"EQ{index:04d}" for index in range(1, vessels * equipments_per_vessel + 1)]
+            seed(
+                vessels=[f"MV{vessel:03d}" for vessel in range(1, vessels + 1)],
+                equipments=[
+                    equipment(code, f"MV{index % vessels + 1:03d}", name=f"name-{index % 3}",
+                              status="active" if index % 4 else "inactive")
+                    for index, code in enumerate(codes)
+                ],
+                orders=[
+                    {"equipment_code": code, "type": "clean", "cost": 100 + order}
+                    for code in codes for order in range(orders_per_equipment)
+                ],
+                rebuild_rollups=True
+            )
+
+    def _count(self, method, uri, body):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with self.app.app_context():
+            engine = db.get_engine()
+            event.listen(engine, "before_cursor_execute", record)
+            # Each request starts with an empty cache, so its lookups reach the database
+            lookup_cache.clear()
+            try:
+                if isinstance(body, str):
+                    response = self.tester.open(uri, method=method, data=body, content_type="text/csv")
+                else:
+                    response = self.tester.open(uri, method=method, json=body)
+                # Streamed bodies run their statements as they are read, but the event stream never ends
+                if response.mimetype != "text/event-stream":
+                    response.get_data()
+            finally:
+                event.remove(engine, "before_cursor_execute", record)
+        if response.status_code >= 400:
+            self.fail(f"{method} {uri}: {response.get_data(as_text=True)}")
+        response.close()
+        return statements
+
+    def _counts(self):
+        counts = {}
+        for method, uri, body, budget in BUDGETS:
+            statements = self._count(method, uri, body)
+            counts[(method, uri, repr(body))] = len(statements)
+            self.assertLessEqual(
+                len(statements), budget,
+                f"{method} {uri} executed {len(statements)} statements (budget {budget}):\n" + "\n".join(statements)
+            )
+        return counts
+
+    def test_csv_import_budgets(self):
+        self._seed(vessels=1, equipments_per_vessel=1, orders_per_equipment=0)
+        chunk_size = self.app.config["BULK_CHUNK_SIZE"]
+        for table, header, row, fixed, per_chunk in CSV_IMPORT_BUDGETS:
+            for rows in (10, 3000):
+                body = "\n".join([header] + [row.format(index=index) for index in range(rows)]) + "\n"
+                statements = self._count('POST', f'/api/data/{table}.csv', body)
+                budget = fixed + per_chunk * -(-rows // chunk_size)
+                self.assertLessEqual(
+                    len(statements), budget,
+                    f"Importing {rows} rows into {table} executed {len(statements)} statements (budget {budget})"
+                )
+
+    def test_query_budgets(self):
+        self._seed(vessels=3, equipments_per_vessel=4, orders_per_equipment=2)
+        small = self._counts()
+        self._seed(vessels=6, equipments_per_vessel=8, orders_per_equipment=4)
+        large = self._counts()
+        for key, count in small.items():
+            self.assertEqual(large[key], count, f"{key[0]} {key[1]} runs more statements on a larger fleet")
+
+
+if __name__ == '__main__':
+    unittest.main()
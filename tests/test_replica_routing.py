@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from sqlalchemy import create_engine, exc
+
+from app import create_app
+from config.config import TestingConfig
+from database.database import db
+from database.routing import PIN_COOKIE, REPLICA_BIND
+from api.cache import LRUCache
+from api.models.vessels import Vessel
+
+
+class AppTestReplicaRouting(unittest.TestCase):
+    def setUp(self) -> None:
+        # Two SQLite files stand for the primary and its replica; replication is not simulated,
+        # so a row is only visible on the database it was written to
+        self.directory = tempfile.mkdtemp()
+        primary_uri = f"sqlite:///{os.path.join(self.directory, 'primary.db')}"
+        replica_uri = f"sqlite:///{os.path.join(self.directory, 'replica.db')}"
+
+        class ReplicaConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = primary_uri
+            SQLALCHEMY_REPLICA_URI = replica_uri
+            SWAGGER_ENABLED = False
+            LOOKUP_CACHE_ENABLED = False
+
+        replica = create_engine(replica_uri)
+        db.metadata.create_all(replica)
+        with replica.begin() as connection:
+            connection.execute(Vessel.__table__.insert(), [{"code": "MV-REPLICA"}])
+        replica.dispose()
+        self.app = create_app(ReplicaConfig)
+        self.tester = self.app.test_client()
+        with self.app.app_context():
+            db.create_all(bind=None)
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            for engine in (db.engine, db.replica_engine()):
+                engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def _vessel_codes(self):
+        response = self.tester.get('/api/vessels')
+        self.assertEqual(response.status_code, 200)
+        return [vessel["code"] for vessel in response.get_json()["vessels"]]
+
+    def test_get_reads_from_replica(self):
+        self.assertEqual(self._vessel_codes(), ["MV-REPLICA"])
+        self.assertEqual(self.tester.get('/api/vessels/MV-REPLICA').status_code, 200)
+
+    def test_write_pins_client_to_primary(self):
+        response = self.tester.post('/api/vessels', json={"code": "MV-PRIMARY"})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.headers["Set-Cookie"])
+        self.assertEqual(self._vessel_codes(), ["MV-PRIMARY"])
+        # Another client, or the same one once the window has passed, reads from the replica
+        self.assertEqual(self.app.test_client().get('/api/vessels').get_json()["vessels"], [{"code": "MV-REPLICA"}])
+        self.tester.set_cookie("localhost", PIN_COOKIE, f"{time.time() - 1}")
+        self.assertEqual(self._vessel_codes(), ["MV-REPLICA"])
+
+    def test_failed_write_does_not_pin(self):
+        response = self.tester.post('/api/vessels', data="MV-PRIMARY")
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn("Set-Cookie", response.headers)
+
+    def test_cached_lookups_load_from_primary(self):
+        self.app.extensions["lookup_cache"] = LRUCache(max_size=10, ttl=60)
+        self.assertEqual(self.tester.post('/api/vessels', json={"code": "MV-PRIMARY"}).status_code, 201)
+        reader = self.app.test_client()
+        for _ in range(2):
+            self.assertEqual(reader.get('/api/vessels/MV-PRIMARY').status_code, 200)
+        stats = self.app.extensions["lookup_cache"].stats()
+        self.assertEqual((stats["misses"], stats["hits"]), (1, 1))
+
+    def test_replica_is_read_only(self):
+        with self.app.app_context():
+            with db.replica_engine().connect() as connection:
+                with self.assertRaises(exc.OperationalError):
+                    connection.execute(Vessel.__table__.insert(), [{"code": "MV-WRITE"}])
+            self.assertEqual(db.get_binds(self.app)[Vessel.__table__], db.engine)
+            self.assertIsNot(db.get_engine(self.app, bind=REPLICA_BIND), db.engine)
+
+    def test_get_pool_stats(self):
+        response = self.tester.get('/api/db/pool')
+        self.assertEqual(set(response.get_json()), {"primary", "replica"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from unittest.mock import patch
+
+from app import create_app
+
+
+class AppTestRollupsCommands(unittest.TestCase):
+    def setUp(self) -> None:
+        self.app = create_app()
+        self.runner = self.app.test_cli_runner()
+
+    @patch('api.services.versions.bump')
+    def test_rebuild_rollups(self, mock_bump):
+        with patch('api.services.rollups.rebuild') as mock_rebuild:
+            with patch('database.database.db.session.commit') as mock_commit:
+                mock_rebuild.return_value = (10, 2)
+                result = self.runner.invoke(args=['rollups', 'rebuild'])
+                self.assertEqual(result.exit_code, 0)
+                self.assertIn("Rebuilt 10 equipment and 2 vessel cost rollups.", result.output)
+                mock_commit.assert_called_once()
+                mock_bump.assert_called_once_with(["global"])
+
+    def test_check_rollups(self):
+        with patch('api.services.rollups.check') as mock_check:
+            mock_check.return_value = []
+            result = self.runner.invoke(args=['rollups', 'check'])
+            self.assertEqual(result.exit_code, 0)
+
+            mock_check.return_value = [{
+                "scope": "vessel",
+                "key": "MV100",
+                "expected": (3000, 2),
+                "actual": (1000, 1)
+            }]
+            result = self.runner.invoke(args=['rollups', 'check'])
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn("vessel 'MV100'", result.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
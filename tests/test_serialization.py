@@ -0,0 +1,42 @@
+import unittest
+import uuid
+from decimal import Decimal
+
+from app import create_app
+from config.config import TestingConfig
+from api import serialization
+
+
+class StdlibJSONConfig(TestingConfig):
+    JSON_PROVIDER = "stdlib"
+
+
+class AppTestSerialization(unittest.TestCase):
+    def test_providers_agree(self):
+        document = {
+            "id": uuid.UUID("5f0c4d8e-8f5d-4a4e-9a39-6a2b8e4f1c11"),
+            "cost": 1000,
+            "avg": Decimal("12.5"),
+            "next": None
+        }
+        expected = b'{"avg":"12.5","cost":1000,"id":"5f0c4d8e-8f5d-4a4e-9a39-6a2b8e4f1c11","next":null}'
+        providers = [serialization.JSONProvider()]
+        if serialization.orjson is not None:
+            providers.append(serialization.OrjsonProvider())
+        app = create_app(TestingConfig)
+        with app.app_context():
+            for provider in providers:
+                self.assertEqual(provider.dumps(document), expected)
+
+    def test_json_provider_config(self):
+        app = create_app(StdlibJSONConfig)
+        self.assertIsInstance(app.extensions["json_provider"], serialization.JSONProvider)
+        self.assertEqual(app.extensions["json_provider"].name, "stdlib")
+        with app.app_context():
+            response = serialization.json_response({"count": 0}, 200)
+        self.assertEqual(response.get_data(), b'{"count":0}\n')
+        self.assertEqual(response.mimetype, "application/json")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+from collections import namedtuple
 from unittest.mock import patch, Mock
 
 from sqlalchemy.exc import IntegrityError
@@ -7,6 +8,9 @@ from app import create_app
 from api.models.vessels import Vessel
 from api.models.vessel_equipments import VesselEquipment
 
+VesselRow = namedtuple("VesselRow", ["code"])
+EquipmentRow = namedtuple("EquipmentRow", ["code", "name", "location", "status"])
+
 
 class AppTestVesselsEndpoints(unittest.TestCase):
     def setUp(self) -> None:
@@ -15,16 +19,17 @@ class AppTestVesselsEndpoints(unittest.TestCase):
 
     def test_get_vessels(self):
         with patch('flask_sqlalchemy._QueryProperty.__get__') as mock:
-            mock_get_sqlalchemy = mock.return_value = Mock()
-            mock_get_sqlalchemy.all.return_value = [
-                Vessel(code="MV100"),
-                Vessel(code="MV101")
+            mock_get_sqlalchemy = mock.return_value.with_entities.return_value = Mock()
+            mock_get_sqlalchemy.order_by.return_value.limit.return_value.all.return_value = [
+                VesselRow("MV100"),
+                VesselRow("MV101")
             ]
             response = self.tester.get('/api/vessels')
             self.assertEqual(response.status_code, 200)
             self.assertTrue(isinstance(response.get_json(), dict))
             self.assertEqual(response.get_json(), {
               "count": 2,
+              "next": None,
               "vessels": [
                 {
                   "code": "MV100"
@@ -34,6 +39,33 @@ class AppTestVesselsEndpoints(unittest.TestCase):
                 }
               ]
             })
+            response = self.tester.get('/api/vessels?limit=1')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json(), {
+              "count": 1,
+              "next": "MV100",
+              "vessels": [
+                {
+                  "code": "MV100"
+                }
+              ]
+            })
+            mock_get_sqlalchemy.order_by.return_value.limit.assert_called_with(2)
+            response = self.tester.get('/api/vessels?limit=none')
+            self.assertEqual(response.status_code, 400)
+
+    def test_get_vessels_ndjson(self):
+        with patch('flask_sqlalchemy._QueryProperty.__get__') as mock:
+            mock_ordered = mock.return_value.with_entities.return_value.filter.return_value.order_by.return_value
+            mock_ordered.execution_options.return_value.yield_per.return_value = [
+                VesselRow("MV101"),
+                VesselRow("MV102")
+            ]
+            response = self.tester.get('/api/vessels?after=MV100', headers={"Accept": "application/x-ndjson"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, "application/x-ndjson")
+            self.assertEqual(response.get_data(as_text=True), '{"code":"MV101"}\n{"code":"MV102"}\n')
+            mock_ordered.execution_options.assert_called_with(stream_results=True)
 
     def test_post_vessels(self):
         with patch('database.database.db.session.add'):
@@ -47,6 +79,22 @@ class AppTestVesselsEndpoints(unittest.TestCase):
                 response = self.tester.post('/api/vessels', json={"code": "MV100"})
                 self.assertEqual(response.status_code, 400)
 
+    def test_post_vessels_bulk(self):
+        with patch('database.database.db.session') as mock_session:
+            mock_session.query.return_value.filter.return_value = [("MV101",)]
+            response = self.tester.post('/api/vessels', json=[{"code": "MV100"}, {"code": "MV101"}, {"code": "MV100"}])
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.get_json(), {"created": ["MV100"], "existing": ["MV101"]})
+            self.assertEqual(mock_session.execute.call_count, 1)
+            self.assertEqual(mock_session.commit.call_count, 1)
+
+            mock_session.query.return_value.filter.return_value = [("MV100",)]
+            response = self.tester.post('/api/vessels', json=[{"code": "MV100"}])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json(), {"created": [], "existing": ["MV100"]})
+            response = self.tester.post('/api/vessels', json=[{"name": "MV100"}])
+            self.assertEqual(response.status_code, 400)
+
     def test_get_vessels_with_code(self):
         with patch('flask_sqlalchemy._QueryProperty.__get__') as mock:
             mock.return_value.filter.return_value.first.return_value = Vessel(code="MV100")
@@ -57,7 +105,32 @@ class AppTestVesselsEndpoints(unittest.TestCase):
               "code": "MV100"
             })
 
-    def test_post_vessels_equipments(self):
+    def test_get_vessels_with_code_cache(self):
+        with patch('flask_sqlalchemy._QueryProperty.__get__') as mock:
+            mock.return_value.filter.return_value.first.return_value = None
+            response = self.tester.get('/api/vessels/MV100')
+            self.assertEqual(response.status_code, 404)
+            mock.return_value.filter.return_value.first.return_value = Vessel(code="MV100")
+            response = self.tester.get('/api/vessels/MV100')
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(mock.return_value.filter.return_value.first.call_count, 1)
+
+            with patch('database.database.db.session.add'):
+                with patch('database.database.db.session.commit'):
+                    response = self.tester.post('/api/vessels', json={"code": "MV100"})
+                    self.assertEqual(response.status_code, 201)
+            response = self.tester.get('/api/vessels/MV100')
+            self.assertEqual(response.status_code, 200)
+            response = self.tester.get('/api/vessels/MV100')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(mock.return_value.filter.return_value.first.call_count, 2)
+
+        response = self.tester.get('/api/cache/stats')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.get_json()["hits"], response.get_json()["misses"]), (2, 2))
+
+    @patch('api.services.versions.bump')
+    def test_post_vessels_equipments(self, mock_bump):
         uri = '/api/vessels/MV100/equipments'
         with patch('database.database.db.session.add'):
             with patch('database.database.db.session.commit'):
@@ -82,28 +155,40 @@ class AppTestVesselsEndpoints(unittest.TestCase):
                 })
                 self.assertEqual(response.status_code, 400)
 
-    def test_get_vessels_equipments(self):
+    def test_post_vessels_equipments_bulk(self):
+        uri = '/api/vessels/MV100/equipments'
+        equipments = [
+            {"code": "5310B9D1", "location": "Brazil", "name": "cleaner"},
+            {"code": "5310B9D2", "location": "Brazil", "name": "shooter"}
+        ]
         with patch('flask_sqlalchemy._QueryProperty.__get__') as mock:
-            mock.return_value.filter.return_value = [
-                VesselEquipment(
-                    code="5310B9D1",
-                    vessel_code="MV100",
-                    location="Brazil",
-                    name="shooter",
-                    equip_status="active"
-                ),
-                VesselEquipment(
-                    code="5310B9D2",
-                    vessel_code="MV100",
-                    location="Brazil",
-                    name="cleaner",
-                    equip_status="inactive"
-                )
+            mock.return_value.filter.return_value.first.return_value = Vessel(code="MV100")
+            with patch('database.database.db.session') as mock_session:
+                mock_session.query.return_value.filter.return_value = [("5310B9D2",)]
+                response = self.tester.post(uri, json=equipments)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.get_json(), {"created": ["5310B9D1"], "existing": ["5310B9D2"]})
+                self.assertEqual(mock_session.commit.call_count, 1)
+                response = self.tester.post(uri, json=[{"code": "5310B9D3"}])
+                self.assertEqual(response.status_code, 400)
+
+            mock.return_value.filter.return_value.first.return_value = None
+            response = self.tester.post(uri, json=equipments)
+            self.assertEqual(response.status_code, 404)
+
+    @patch('api.services.versions.current', return_value=(("global", 0), ("vessel:MV100", 4)))
+    def test_get_vessels_equipments(self, mock_versions):
+        with patch('flask_sqlalchemy._QueryProperty.__get__') as mock:
+            mock_filtered = mock.return_value.with_entities.return_value.filter.return_value
+            mock_filtered.order_by.return_value.limit.return_value.all.return_value = [
+                EquipmentRow("5310B9D1", "shooter", "Brazil", "active"),
+                EquipmentRow("5310B9D2", "cleaner", "Brazil", "inactive")
             ]
             response = self.tester.get('/api/vessels/MV100/equipments')
             self.assertEqual(response.status_code, 200)
             self.assertEqual(response.get_json(), {
                 'count': 2,
+                'next': None,
                 'equipments': [{
                     'code': '5310B9D1',
                     'location': 'Brazil',
@@ -133,6 +218,19 @@ class AppTestVesselsEndpoints(unittest.TestCase):
                 'name': 'shooter',
                 'status': 'active'
             })
+            response = self.tester.get('/api/vessels/MV101/equipments/5310B9D1')
+            self.assertEqual(response.status_code, 404)
+
+            with patch('database.database.db.session') as mock_session:
+                mock_session.query.return_value.filter.return_value.with_for_update.return_value = [
+                    ("5310B9D1", "active", "MV100")
+                ]
+                response = self.tester.patch('/api/equipments/status', json=["5310B9D1"])
+                self.assertEqual(response.status_code, 200)
+            mock.return_value.filter.return_value.first.return_value.status = "inactive"
+            response = self.tester.get('/api/vessels/MV100/equipments/5310B9D1')
+            self.assertEqual(response.get_json()["status"], "inactive")
+            self.assertEqual(mock.return_value.filter.return_value.first.call_count, 2)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,118 @@
+import unittest
+from unittest.mock import patch
+
+from database.database import db
+from api import write_behind
+from api.models.cost_rollups import EquipmentCostRollup
+from api.models.operation_orders import OperationOrder
+from api.services import ingestion
+from sqlite_case import SQLiteConfig, SQLiteTestCase, equipment, seed
+
+
+class WriteBehindConfig(SQLiteConfig):
+    ORDER_WRITE_BEHIND = True
+    ORDER_QUEUE_MAX_SIZE = 100
+    ORDER_FLUSH_BATCH_SIZE = 10
+    ORDER_FLUSH_INTERVAL_MS = 10
+
+
+class AppTestWriteBehind(SQLiteTestCase):
+    config = WriteBehindConfig
+
+    def seed_database(self):
+        seed(vessels=["MV100"], equipments=[equipment("EQ1", "MV100")])
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            write_behind.order_queue.stop()
+        super().tearDown()
+
+    def test_post_operation_orders_write_behind(self):
+        uri = '/api/equipments/orders'
+        written = write_behind.WRITTEN.value()
+        ids = []
+        for cost in range(1, 26):
+            response = self.tester.post(uri, json={"code": "EQ1", "type": "clean", "cost": cost})
+            self.assertEqual(response.status_code, 202)
+            ids.append(response.get_json()["id"])
+        self.assertEqual(self.tester.post(uri, json={"code": "EQ9", "type": "clean", "cost": 1}).status_code, 400)
+        self.assertEqual(self.tester.post(uri, json={"code": "EQ1", "type": "clean"}).status_code, 400)
+        with self.app.app_context():
+            write_behind.order_queue.flush()
+            self.assertEqual(
+                sorted(str(order_id) for order_id, in db.session.query(OperationOrder.id)), sorted(ids)
+            )
+            self.assertEqual(db.session.get(EquipmentCostRollup, "EQ1").total_cost, sum(range(1, 26)))
+        self.assertEqual(write_behind.WRITTEN.value(), written + 25)
+        self.assertGreaterEqual(write_behind.FLUSH_SIZE.count(), 3)
+        metrics = self.tester.get('/api/metrics').get_data(as_text=True)
+        self.assertIn("order_queue_depth 0", metrics)
+        self.assertIn("order_queue_flush_duration_seconds_count", metrics)
+
+    def test_invalid_orders_are_rejected_in_both_modes(self):
+        uri = '/api/equipments/orders'
+        invalid_orders = (
+            {"type": "clean", "cost": 1},
+            {"code": "EQ1", "cost": 1},
+            {"code": ["EQ1"], "type": "clean", "cost": 1},
+            {"code": "EQ1", "type": 7, "cost": 1},
+            {"code": "EQ1", "type": "clean", "cost": "a lot"},
+            {"code": "EQ1", "type": "clean", "cost": 1, "performed_at": "yesterday"},
+            ["EQ1", "clean", 1],
+        )
+        flusher = self.app.extensions["order_queue"]
+        for write_behind_enabled in (True, False):
+            self.app.extensions["order_queue"] = flusher if write_behind_enabled else None
+            for order in invalid_orders:
+                response = self.tester.post(uri, json=order)
+                self.assertEqual(response.status_code, 400, (write_behind_enabled, order))
+                self.assertIn("error", response.get_json())
+        self.app.extensions["order_queue"] = flusher
+        with self.app.app_context():
+            self.assertEqual(db.session.query(OperationOrder).count(), 0)
+
+    def test_bad_order_only_drops_itself(self):
+        flusher = self.app.extensions["order_queue"]
+        flusher.retries = 1
+        with self.app.app_context():
+            batch = [ingestion.parse_order({"code": "EQ1", "type": "clean", "cost": cost}) for cost in (1, 2, 3)]
+        # Slips past parse_order, e.g. enqueued by an older version: the batch insert fails on it
+        batch[1]["cost"] = "not a cost"
+        dropped = write_behind.DROPPED.value(reason="write-failed")
+        with patch('api.write_behind.time.sleep'):
+            flusher._write(batch)
+        with self.app.app_context():
+            self.assertEqual(sorted(cost for cost, in db.session.query(OperationOrder.cost)), [1, 3])
+        self.assertEqual(write_behind.DROPPED.value(reason="write-failed"), dropped + 1)
+
+    def test_flusher_survives_unexpected_errors(self):
+        uri = '/api/equipments/orders'
+        with patch.object(write_behind._Flusher, '_write', side_effect=[RuntimeError("boom"), None]):
+            for _ in range(2):
+                self.assertEqual(self.tester.post(uri, json={"code": "EQ1", "type": "clean", "cost": 1}).status_code, 202)
+                with self.app.app_context():
+                    write_behind.order_queue.flush()
+        self.assertTrue(self.app.extensions["order_queue"].thread.is_alive())
+
+    def test_queue_full(self):
+        uri = '/api/equipments/orders'
+        self.app.extensions["order_queue"].queue.maxsize = 2
+        # Without the flusher thread nothing leaves the queue
+        with patch.object(write_behind._Flusher, '_start'):
+            for _ in range(2):
+                self.assertEqual(self.tester.post(uri, json={"code": "EQ1", "type": "clean", "cost": 1}).status_code, 202)
+            response = self.tester.post(uri, json={"code": "EQ1", "type": "clean", "cost": 1})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+        # Queued orders are written when the process stops
+        with self.app.app_context():
+            write_behind.order_queue.stop()
+            self.assertEqual(db.session.query(OperationOrder).count(), 0)
+            self.app.extensions["order_queue"]._start()
+            write_behind.order_queue.stop()
+            self.assertEqual(db.session.query(OperationOrder).count(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()